@@ -92,21 +92,11 @@ IMPORT_INTERVAL = [_("Keep all slices"), _("Skip 1 for each 2 slices"),
                    _("Skip 2 for each 3 slices"), _("Skip 3 for each 4 slices"),
                    _("Skip 4 for each 5 slices"),_("Skip 5 for each 6 slices")]
 
-# Camera according to slice's orientation
-#CAM_POSITION = {"AXIAL":(0, 0, 1), "CORONAL":(0, -1, 0), "SAGITAL":(1, 0, 0)}
-#CAM_VIEW_UP =  {"AXIAL":(0, 1, 0), "CORONAL":(0, 0, 1), "SAGITAL":(0, 0, 1)}
-AXIAL_SLICE_CAM_POSITION = {"AXIAL":(0, 0, 1), "CORONAL":(0, -1, 0), "SAGITAL":(1, 0, 0)}
-AXIAL_SLICE_CAM_VIEW_UP =  {"AXIAL":(0, 1, 0), "CORONAL":(0, 0, 1), "SAGITAL":(0, 0, 1)}
+# Camera according to slice's orientation, the volume is in the
+# canonical layout (see data.reorientation)
+SLICE_CAM_POSITION = {"AXIAL":(0, 0, -1), "CORONAL":(0, -1, 0), "SAGITAL":(-1, 0, 0)}
+SLICE_CAM_VIEW_UP =  {"AXIAL":(0, -1, 0), "CORONAL":(0, 0, 1), "SAGITAL":(0, 0, 1)}
 
-SAGITAL_SLICE_CAM_POSITION = {"AXIAL":(0, 1, 0), "CORONAL":(1, 0, 0), "SAGITAL":(0, 0, -1)}
-SAGITAL_SLICE_CAM_VIEW_UP =  {"AXIAL":(-1, 0, 0), "CORONAL":(0, 1, 0), "SAGITAL":(0, 1, 0)}
-
-CORONAL_SLICE_CAM_POSITION = {"AXIAL":(0, 1, 0), "CORONAL":(0, 0, 1), "SAGITAL":(1, 0, 0)}
-CORONAL_SLICE_CAM_VIEW_UP =  {"AXIAL":(0, 0, -1), "CORONAL":(0, 1, 0), "SAGITAL":(0, 1, 0)}
-
-SLICE_POSITION = {AXIAL:[AXIAL_SLICE_CAM_VIEW_UP, AXIAL_SLICE_CAM_POSITION],
-                  SAGITAL:[SAGITAL_SLICE_CAM_VIEW_UP, SAGITAL_SLICE_CAM_POSITION],
-                  CORONAL:[CORONAL_SLICE_CAM_VIEW_UP, CORONAL_SLICE_CAM_POSITION]}
 #Project Status
 #NEW_PROJECT = 0
 #OPEN_PROJECT = 1
@@ -148,31 +138,14 @@ VOL_TOP = wx.NewId()
 VOL_BOTTOM = wx.NewId()
 VOL_ISO = wx.NewId()
 
-# Camera according to volume's orientation
-AXIAL_VOLUME_CAM_VIEW_UP = {VOL_FRONT:(0,0,1), VOL_BACK:(0,0,1), VOL_RIGHT:(0,0,1),\
-                            VOL_LEFT:(0,0,1), VOL_TOP:(0,1,0), VOL_BOTTOM:(0,-1,0),\
-                            VOL_ISO:(0,0,1)}
-AXIAL_VOLUME_CAM_POSITION = {VOL_FRONT:(0,-1,0), VOL_BACK:(0,1,0), VOL_RIGHT:(-1,0,0),\
-                             VOL_LEFT:(1,0,0), VOL_TOP:(0,0,1), VOL_BOTTOM:(0,0,-1),\
-                             VOL_ISO:(0.5,-1,0.5)}
-
-SAGITAL_VOLUME_CAM_VIEW_UP = {VOL_FRONT:(0,-1,0), VOL_BACK:(0,-1,0), VOL_RIGHT:(0,-1,1),\
-                              VOL_LEFT:(0,-1,1), VOL_TOP:(1,-1,0), VOL_BOTTOM:(-1,1,0),\
-                              VOL_ISO:(0,-1,0)}
-SAGITAL_VOLUME_CAM_POSITION = {VOL_FRONT:(-1,0,0), VOL_BACK:(1,0,0), VOL_RIGHT:(0,0,1),\
-                               VOL_LEFT:(0,0,-1), VOL_TOP:(0,-1,0), VOL_BOTTOM:(0,1,0),\
-                               VOL_ISO:(-1,-0.5,-0.5)}
-
-CORONAL_VOLUME_CAM_VIEW_UP = {VOL_FRONT:(0,-1,0), VOL_BACK:(0,-1,0), VOL_RIGHT:(0,-1,0),\
-                              VOL_LEFT:(0,-1,0), VOL_TOP:(0,1,0), VOL_BOTTOM:(0,-1,0),\
-                              VOL_ISO:(0,-1,0)}
-CORONAL_VOLUME_CAM_POSITION = {VOL_FRONT:(0,0,-1), VOL_BACK:(0,0,1), VOL_RIGHT:(-1,0,0),\
-                               VOL_LEFT:(1,0,0), VOL_TOP:(0,-1,0), VOL_BOTTOM:(0,1,0),\
-                               VOL_ISO:(0.5,-0.5,-1)}
-
-VOLUME_POSITION = {AXIAL: [AXIAL_VOLUME_CAM_VIEW_UP, AXIAL_VOLUME_CAM_POSITION],
-                 SAGITAL: [SAGITAL_VOLUME_CAM_VIEW_UP, SAGITAL_VOLUME_CAM_POSITION],
-                 CORONAL: [CORONAL_VOLUME_CAM_VIEW_UP, CORONAL_VOLUME_CAM_POSITION]}
+# Camera according to volume's view angle, the volume is in the
+# canonical layout (see data.reorientation)
+VOLUME_CAM_VIEW_UP = {VOL_FRONT:(0,0,1), VOL_BACK:(0,0,1), VOL_RIGHT:(0,0,1),\
+                      VOL_LEFT:(0,0,1), VOL_TOP:(0,1,0), VOL_BOTTOM:(0,-1,0),\
+                      VOL_ISO:(0,0,1)}
+VOLUME_CAM_POSITION = {VOL_FRONT:(0,-1,0), VOL_BACK:(0,1,0), VOL_RIGHT:(-1,0,0),\
+                       VOL_LEFT:(1,0,0), VOL_TOP:(0,0,1), VOL_BOTTOM:(0,0,-1),\
+                       VOL_ISO:(0.5,-1,0.5)}
 
 
 # Mask threshold options
@@ -182,6 +155,14 @@ THRESHOLD_PRESETS_INDEX = 0 #Bone
 THRESHOLD_HUE_RANGE = (0, 0.6667)
 THRESHOLD_INVALUE = 5000
 THRESHOLD_OUTVALUE = 0
+# Masks are unsigned char images with these values inside and outside
+MASK_INVALUE = 255
+MASK_OUTVALUE = 0
+# Most colours of the lookup table used to preview a threshold range, one
+# per scalar value of the volume up to this
+THRESHOLD_PREVIEW_COLOURS = 65536
+# Most bytes kept by the undo history of mask editions
+MASK_HISTORY_SIZE = 64 * 1024 * 1024
 
 # Mask properties
 MASK_NAME_PATTERN = _("Mask %d")
@@ -299,6 +280,12 @@ ID_TO_BMP = {VOL_FRONT: [_("Front"), os.path.join(ICON_DIR, "view_front.png")],
 # if 1, use vtkVolumeRaycastMapper, if 0, use vtkFixedPointVolumeRayCastMapper
 TYPE_RAYCASTING_MAPPER = 0
 
+# Raycasting pyramid: the volume downsampled by these factors (powers of
+# 2), built in background. Raycasting uses the coarsest level which has
+# as many voxels across as the screen has pixels, and the next one
+# while the volume is being rotated
+RAYCASTING_PYRAMID = (2, 4, 8)
+
 folder=RAYCASTING_PRESETS_DIRECTORY= os.path.abspath(os.path.join("..",
                                                                   "presets",
                                                                   "raycasting"))
@@ -346,6 +333,75 @@ LOG_FOLDER = os.path.join(os.path.expanduser('~'), '.invesalius', 'logs')
 if not os.path.isdir(LOG_FOLDER):
     os.makedirs(LOG_FOLDER)
 
+# If 1, parsed DICOM headers are kept in an index file, so importing the
+# same folder again only parses new or changed files
+DICOM_INDEX = 1
+DICOM_INDEX_FILE = os.path.join(os.path.expanduser('~'), '.invesalius',
+                                'dicom_index.sqlite')
+# Maximum number of files kept in the index
+DICOM_INDEX_MAX_ENTRIES = 200000
+
+# If 1, series of directories containing a DICOMDIR are read from it,
+# without scanning the directory
+DICOMDIR_FAST_PATH = 1
+
+# Number of processes used to parse DICOM headers (0: one per CPU core)
+DICOM_SCAN_PROCESSES = 0
+# Number of files parsed by each scanner task, progress is updated once
+# per batch
+DICOM_SCAN_BATCH = 64
+# If 1, files which surely aren't DICOM (checked by their first bytes)
+# are not parsed
+DICOM_SCAN_PREFILTER = 1
+# Files with these extensions (lower case) are never parsed
+DICOM_SCAN_IGNORED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp',
+                                 '.tif', '.tiff', '.pdf', '.txt', '.rtf',
+                                 '.doc', '.docx', '.xls', '.xml', '.htm',
+                                 '.html', '.css', '.js', '.ini', '.inf',
+                                 '.log', '.exe', '.dll', '.zip', '.db')
+# Files with these names (lower case) are never parsed
+DICOM_SCAN_IGNORED_NAMES = ('.ds_store',)
+
+# Number of masks a project is expected to have, used to estimate how much
+# memory it needs (see memory_budget)
+MEMORY_BUDGET_MASKS = 3
+# Fraction of the available memory a project may use
+MEMORY_BUDGET_USAGE = 0.8
+# Images are never downsampled to less than this size (pixels)
+MEMORY_BUDGET_MIN_SIZE = 128
+# If 1, projects which don't fit in memory are kept out of core (memory
+# mapped files in a folder created inside OUT_OF_CORE_FOLDER, None: the
+# system temporary folder) instead of being downsampled
+OUT_OF_CORE = 1
+OUT_OF_CORE_FOLDER = None
+
+# Thumbnails of the import panel previews: maximum width and height,
+# number kept in memory and number of processes creating them (0: one
+# per CPU core). They are saved in THUMBNAIL_FOLDER (None: not saved),
+# which keeps at most THUMBNAIL_FOLDER_SIZE of them (the least recently
+# used are removed).
+THUMBNAIL_SIZE = 128
+THUMBNAIL_CACHE_SIZE = 500
+THUMBNAIL_PROCESSES = 0
+THUMBNAIL_FOLDER = os.path.join(os.path.expanduser('~'), '.invesalius',
+                                'thumbnails')
+THUMBNAIL_FOLDER_SIZE = 20000
+
+# Auto-play of the DICOM preview: frames shown per second and number of
+# frames decoded ahead of the one being shown
+CINE_FRAME_RATE = 10
+CINE_BUFFER_SIZE = 32
+
+# If 1, a DICOM series is shown as soon as its central slices and a
+# subset of the others are loaded, the remaining are loaded in background
+PROGRESSIVE_LOADING = 1
+# Number of central slices and of slices of the whole series (strided)
+# loaded before the series is shown
+PROGRESSIVE_CENTER_SLICES = 16
+PROGRESSIVE_COARSE_SLICES = 32
+# The viewers are refreshed each time this number of slices is loaded
+PROGRESSIVE_BLOCK_SLICES = 32
+
 folder = os.path.join(os.path.expanduser('~'), '.invesalius', 'presets')
 if not os.path.isdir(folder):
     os.makedirs(folder)
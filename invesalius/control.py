@@ -27,8 +27,11 @@ import constants as const
 import data.imagedata_utils as utils
 import data.mask as msk
 import data.measures
+import data.reorientation as reorientation
 import data.surface as srf
 import data.volume as volume
+import data.volume_store as volume_store
+import data.vtk_utils as vtk_utils
 import gui.dialogs as dialog
 import project as prj
 import reader.analyze_reader as analyze
@@ -49,6 +52,11 @@ class Controller():
         self.frame = frame
         self.progress_dialog = None
         self.cancel_import = False
+        # DICOM series being loaded in background (progressive loading)
+        self.progressive_volume = None
+        self.progressive_project_path = None
+        # The user saved the project before the volume was loaded
+        self.progressive_save = False
         #Init session
         session = ses.Session()
         self.measure_manager = data.measures.MeasurementManager()
@@ -258,6 +266,17 @@ class Controller():
         else:
             dirpath, filename = session.project_path
 
+        if self.progressive_volume:
+            # Only the preview is loaded: the project is saved to this
+            # path once the volume is (see OnVolumeLoaded)
+            debug("Project saved when the volume is loaded")
+            self.progressive_project_path = (dirpath, filename)
+            self.progressive_save = True
+            ps.Publisher().sendMessage('End busy cursor')
+            return
+
+        # Masks still being thresholded in background are saved whole
+        ps.Publisher().sendMessage('Wait mask threshold')
         proj = prj.Project()
         prj.Project().SavePlistProject(dirpath, filename)
 
@@ -265,6 +284,12 @@ class Controller():
         ps.Publisher().sendMessage('End busy cursor')
 
     def CloseProject(self):
+        if self.progressive_volume:
+            self.progressive_volume.Stop()
+            self.progressive_volume = None
+            self.progressive_project_path = None
+            self.progressive_save = False
+
         proj = prj.Project()
         proj.Close()
 
@@ -288,6 +313,9 @@ class Controller():
         data = evt.data
         if (data):
             message = _("Loading file %d of %d")%(data[0],data[1])
+            # Files which aren't DICOM, not parsed
+            if len(data) > 2 and data[2]:
+                message += _(" (%d skipped)") % data[2]
 
         if (data):
             if not(self.progress_dialog):
@@ -331,8 +359,9 @@ class Controller():
 
         if len(patients_groups):
             group = dcm.SelectLargerDicomGroup(patients_groups)
-            imagedata, dicom = self.OpenDicomGroup(group, 0, gui=True)
-            self.CreateDicomProject(imagedata, dicom)
+            imagedata, dicom, direction = self.OpenDicomGroup(group, 0,
+                                                              gui=True)
+            self.CreateDicomProject(imagedata, dicom, direction)
         # OPTION 2: ANALYZE?
         else:
             imagedata = analyze.ReadDirectory(directory)
@@ -389,12 +418,14 @@ class Controller():
         proj.imagedata = imagedata
         #TODO: Verify if all Analyse are in AXIAL orientation
         proj.original_orientation =  const.AXIAL
+        proj.direction = reorientation.GetDirection(
+                                    reorientation.ANALYZE_DIRECTIONS)
         proj.threshold_range = imagedata.GetScalarRange()
         proj.window = proj.threshold_range[1] - proj.threshold_range[0]
         proj.level =  (0.5 * (proj.threshold_range[1] + proj.threshold_range[0]))
 
 
-    def CreateDicomProject(self, imagedata, dicom):
+    def CreateDicomProject(self, imagedata, dicom, direction):
         name_to_const = {"AXIAL":const.AXIAL,
                          "CORONAL":const.CORONAL,
                          "SAGITTAL":const.SAGITAL}
@@ -407,6 +438,7 @@ class Controller():
         proj.dicom_sample = dicom
         proj.original_orientation =\
                     name_to_const[dicom.image.orientation_label]
+        proj.direction = direction
         proj.window = float(dicom.image.window)
         proj.level = float(dicom.image.level)
         proj.threshold_range = imagedata.GetScalarRange()
@@ -419,16 +451,62 @@ class Controller():
         filename = filename.replace("/", "") #Fix problem case other/Skull_DICOM
 
         dirpath = session.CreateProject(filename)
-        proj.SavePlistProject(dirpath, filename)
+        if self.progressive_volume:
+            # Saved when all slices are loaded (see OnVolumeLoaded)
+            self.progressive_project_path = (dirpath, filename)
+        else:
+            proj.SavePlistProject(dirpath, filename)
 
     def OnOpenDicomGroup(self, pubsub_evt):
         group, interval = pubsub_evt.data
-        imagedata, dicom = self.OpenDicomGroup(group, interval, gui=True)
-        self.CreateDicomProject(imagedata, dicom)
+        imagedata, dicom, direction = self.OpenDicomGroup(group, interval,
+                                    gui=True,
+                                    progressive=const.PROGRESSIVE_LOADING)
+        self.CreateDicomProject(imagedata, dicom, direction)
         self.LoadProject()
         ps.Publisher().sendMessage("Enable state project", True)
+        if self.progressive_volume:
+            self.progressive_volume.LoadRemaining(self.OnVolumeRangeLoaded,
+                                                  self.OnVolumeLoaded)
+
+    def OnVolumeRangeLoaded(self, zstart, zend):
+        debug("Slices %d to %d loaded" % (zstart, zend))
+        ps.Publisher().sendMessage('Update slice viewer')
+
+    def OnVolumeLoaded(self):
+        proj = prj.Project()
+        imagedata = self.progressive_volume.imagedata
+        self.progressive_volume = None
+
+        # Representations created from the preview are outdated
+        store = volume_store.VolumeStore()
+        store.Modified()
+        # The range of the preview may be narrower
+        proj.threshold_range = store.GetScalarRange()
+        ps.Publisher().sendMessage('Update threshold limits list',
+                                   proj.threshold_range)
+        ps.Publisher().sendMessage('Volume loaded', imagedata)
+        ps.Publisher().sendMessage('Update slice viewer')
+        ps.Publisher().sendMessage('Render volume viewer')
+
+        dirpath, filename = self.progressive_project_path
+        self.progressive_project_path = None
+        if self.progressive_save:
+            self.progressive_save = False
+            self.SaveProject(os.path.join(dirpath, filename))
+        else:
+            proj.SavePlistProject(dirpath, filename)
 
-    def OpenDicomGroup(self, dicom_group, interval, gui=True):
+    def OpenDicomGroup(self, dicom_group, interval, gui=True,
+                       progressive=False):
+
+        # Series from a DICOMDIR are parsed only now
+        if gui:
+            message = _("Reading DICOM files...")
+            update_progress = vtk_utils.ShowProgress(1)
+            dicom_group.Load(lambda value: update_progress(value, message))
+        else:
+            dicom_group.Load()
 
         # Retrieve general DICOM headers
         dicom = dicom_group.GetDicomSample()
@@ -440,6 +518,15 @@ class Controller():
             debug("Not used the IPPSorter")
             filelist = [i.image.file for i in dicom_group.GetHandSortedList()[::interval]]
 
+        # Directions of the volume axes, given by its first and last
+        # slices, so it's reoriented as it's loaded (see reorientation)
+        dicoms = dict((d.image.file, d) for d in dicom_group.GetList())
+        first, last = dicoms[filelist[0]], dicoms[filelist[-1]]
+        directions = reorientation.GetDicomDirections(first.image.orientation,
+                                                      first.image.position,
+                                                      last.image.position)
+        direction = reorientation.GetDirection(directions)
+
         zspacing = dicom_group.zspacing * interval
         size = dicom.image.size
         bits = dicom.image.bits_allocad
@@ -451,11 +538,20 @@ class Controller():
         else:
             use_dcmspacing = 0
 
+        tilt_value = dicom.acquisition.tilt
+
+        # The gantry tilt is fixed on the whole volume, so there is no
+        # progressive loading in this case
+        if progressive and not tilt_value:
+            self.progressive_volume = utils.CreateProgressiveImageData(filelist,
+                                            zspacing, xyspacing, size, bits,
+                                            use_dcmspacing, directions)
+            return self.progressive_volume.imagedata, dicom, direction
+
         imagedata = utils.CreateImageData(filelist, zspacing, xyspacing,size,
-                                          bits, use_dcmspacing)
+                                          bits, use_dcmspacing, directions)
 
         # 1(a): Fix gantry tilt, if any
-        tilt_value = dicom.acquisition.tilt
         if (tilt_value) and (gui):
             # Tell user gantry tilt and fix, according to answer
             message = _("Fix gantry tilt applying the degrees below")
@@ -466,7 +562,7 @@ class Controller():
             tilt_value = -1*tilt_value
             imagedata = utils.FixGantryTilt(imagedata, tilt_value)
 
-        return imagedata, dicom
+        return imagedata, dicom, direction
 
     def LoadImagedataInfo(self):
         proj = prj.Project()
@@ -0,0 +1,136 @@
+#--------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+#--------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+#--------------------------------------------------------------------------
+"""
+Cine playback of a DICOM series.
+
+The frames (images with window and level applied) are decoded ahead of
+the one being shown by a background thread and kept in a ring buffer,
+so the GUI only shows frames which are ready. If a frame isn't ready
+when it's time to show it, it's a dropped frame: the GUI keeps the last
+one and asks again in the next tick.
+
+How to use:
+    frames = FrameBuffer(dicom_list)
+    frames.Start(0)
+    ...
+    frame = frames.GetFrame(index) # None if it's not decoded yet
+    ...
+    frames.Stop()
+"""
+
+import threading
+
+import vtk
+import vtkgdcm
+
+import constants as const
+
+
+def DecodeFrame(dicom):
+    """
+    Return the RGB vtkImageData of given dicom.Dicom with its window and
+    level applied.
+    """
+    reader = vtkgdcm.vtkGDCMImageReader()
+    reader.SetFileName(dicom.image.file)
+
+    colorer = vtk.vtkImageMapToWindowLevelColors()
+    colorer.SetInput(reader.GetOutput())
+    colorer.SetWindow(float(dicom.image.window))
+    colorer.SetLevel(float(dicom.image.level))
+    colorer.SetOutputFormatToRGB()
+    colorer.Update()
+
+    # Detached from the pipeline, it's used by the GUI thread
+    frame = vtk.vtkImageData()
+    frame.DeepCopy(colorer.GetOutput())
+    return frame
+
+
+class FrameBuffer(object):
+    """
+    Ring buffer with at most size (const.CINE_BUFFER_SIZE) frames of
+    given list of dicom.Dicom, starting at the frame to be shown next.
+    Each frame taken by GetFrame frees its place to the decoding of the
+    next one.
+    """
+
+    def __init__(self, dicom_list, size=None):
+        if size is None:
+            size = const.CINE_BUFFER_SIZE
+        self.dicom_list = dicom_list
+        self.size = min(size, len(dicom_list))
+        self.frames = {}
+        # Next frame to be decoded
+        self.next_index = 0
+        self.running = False
+        self.thread = None
+        self.condition = threading.Condition()
+
+    def Start(self, index):
+        """
+        Start decoding frames from given index on (wrapping around at the
+        end of the series), dropping the frames decoded before.
+        """
+        self.Stop()
+        if not self.dicom_list:
+            return
+        self.next_index = index % len(self.dicom_list)
+        self.running = True
+        self.thread = threading.Thread(target=self._Decode)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def Stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.frames = {}
+
+    def GetFrame(self, index):
+        """
+        Return the frame of given index and free its place in the buffer,
+        or None if it wasn't decoded yet.
+        """
+        with self.condition:
+            frame = self.frames.pop(index, None)
+            if frame is not None:
+                self.condition.notify_all()
+            return frame
+
+    def _Decode(self):
+        nframes = len(self.dicom_list)
+        while 1:
+            with self.condition:
+                while self.running and len(self.frames) >= self.size:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                index = self.next_index
+                self.next_index = (index + 1) % nframes
+
+            frame = DecodeFrame(self.dicom_list[index])
+
+            with self.condition:
+                if not self.running:
+                    return
+                self.frames[index] = frame
@@ -17,13 +17,63 @@
 #    detalhes.
 #--------------------------------------------------------------------------
 
+import collections
 from  math import *
 
+import numpy
 import vtk
 import wx.lib.pubsub as ps
-from project import Project
 import constants as const
-import utils
+
+# Number of brush stencils kept (see GetStencil)
+STENCIL_CACHE_SIZE = 16
+
+# Brush stencils, least recently used first
+_stencils = collections.OrderedDict()
+
+
+def _GetStencilAxes(orientation):
+    """
+    Return the volume axes (0: x, 1: y, 2: z) of the horizontal and
+    vertical directions of the slices of given orientation (the volume
+    is in the canonical layout, see reorientation).
+    """
+    axes = {"AXIAL": (0, 1),
+            "CORONAL": (0, 2),
+            "SAGITAL": (1, 2)}
+    return axes[orientation]
+
+
+def GetStencil(shape, size, spacing, orientation):
+    """
+    Return the voxels covered by a brush of given shape
+    (const.BRUSH_CIRCLE or const.BRUSH_SQUARE), size (diameter or side,
+    in mm), volume spacing and slice orientation, as offsets from the
+    brush center: an int array (n, 3) of x, y, z. Stencils are computed
+    once and kept in a small LRU cache.
+    """
+    key = (shape, size, tuple(spacing), orientation)
+    stencil = _stencils.pop(key, None)
+    if stencil is None:
+        axis_h, axis_v = _GetStencilAxes(orientation)
+        spacing_h, spacing_v = spacing[axis_h], spacing[axis_v]
+        half = size / 2.0
+        nh, nv = int(half / spacing_h), int(half / spacing_v)
+        v, h = numpy.mgrid[-nv:nv+1, -nh:nh+1]
+        if shape == const.BRUSH_CIRCLE:
+            inside = (h * spacing_h)**2 + (v * spacing_v)**2 <= half**2
+        else:
+            inside = numpy.ones(h.shape, bool)
+
+        stencil = numpy.zeros((inside.sum(), 3), int)
+        stencil[:, axis_h] = h[inside]
+        stencil[:, axis_v] = v[inside]
+        stencil.flags.writeable = False
+    # Most recently used goes to the end
+    _stencils[key] = stencil
+    while len(_stencils) > STENCIL_CACHE_SIZE:
+        _stencils.popitem(last=False)
+    return stencil
 
 class CursorCircle:
    # TODO: Think and try to change this class to an actor
@@ -44,7 +94,6 @@ class CursorCircle:
         self.property = vtk.vtkProperty()
         
         self.__build_actor()
-        self.__calculate_area_pixels()
         
     def __build_actor(self):
         """
@@ -86,60 +135,11 @@ class CursorCircle:
         self.segment.AddInput(ls.GetOutput())
         self.xa, self.ya = x, y
         
-    def __calculate_area_pixels(self):
-        """
-        Return the cursor's pixels.
-        This method scans the circle line by line.
-        Extracted equation. 
-        http://www.mathopenref.com/chord.html
-        """
-        xc = 0.0
-        yc = 0.0
-        z = 0.0
-        xs, ys, zs = self.spacing 
-        
-        proj = Project()
-        orig_orien = proj.original_orientation
-        
-        xy = (xs, ys)
-        yz = (ys, zs)
-        xz = (xs, zs)
-        
-        if (orig_orien == const.SAGITAL):
-            orientation_based_spacing = {"SAGITAL" : xy,
-                                     "AXIAL" : yz,
-                                     "CORONAL" : xz}
-        elif(orig_orien == const.CORONAL):
-            orientation_based_spacing = {"CORONAL" : xy,
-                                         "AXIAL" : xz,
-                                         "SAGITAL" : yz}
-        else:
-            orientation_based_spacing = {"AXIAL" : xy,
-                                         "SAGITAL" : yz,
-                                         "CORONAL" : xz}
-        
-        xs, ys = orientation_based_spacing[self.orientation]
-        self.pixel_list = []
-        radius = self.radius
-        for i in utils.frange(yc - radius, yc + radius, ys):
-            # distance from the line to the circle's center
-            d = yc - i
-            # line size
-            line = sqrt(radius**2 - d**2) * 2
-            # line initial x
-            xi = xc - line/2.0
-            # line final
-            xf = line/2.0 + xc
-            yi = i
-            for k in utils.frange(xi,xf,xs):
-                self.pixel_list.append((k, yi))
-
     def SetSize(self, diameter):
         radius = self.radius = diameter/2.0
         #self.disk.SetInnerRadius(radius-1) # filled = self.radius
         #self.disk.SetOuterRadius(radius) # filled = 0
         self.__build_actor()
-        self.__calculate_area_pixels()
         
         
         
@@ -149,23 +149,10 @@ class CursorCircle:
 
     def SetOrientation(self, orientation):
         self.orientation = orientation
-        proj = Project() 
-        orig_orien = proj.original_orientation
-        if (orig_orien == const.SAGITAL):
-            if orientation == "CORONAL":
-                self.actor.RotateY(90)
-            if orientation == "AXIAL":
-                self.actor.RotateX(90)
-        elif(orig_orien == const.CORONAL):
-            if orientation == "AXIAL":
-                self.actor.RotateX(270)
-            if orientation == "SAGITAL":
-                self.actor.RotateY(90)
-        else:
-            if orientation == "CORONAL":
-                self.actor.RotateX(90)
-            if orientation == "SAGITAL":
-                self.actor.RotateY(90)
+        if orientation == "CORONAL":
+            self.actor.RotateX(90)
+        if orientation == "SAGITAL":
+            self.actor.RotateY(90)
 
     def SetPosition(self, position):
         self.position = position
@@ -176,7 +163,6 @@ class CursorCircle:
 
     def SetSpacing(self, spacing):
         self.spacing = spacing
-        self.__calculate_area_pixels()
 
     def Show(self, value=1):
         if value:
@@ -185,38 +171,13 @@ class CursorCircle:
             self.actor.VisibilityOff()
 
     def GetPixels(self):
-        px, py, pz = self.edition_position
-        orient = self.orientation
-        xs, ys, zs = self.spacing
-        proj = Project()
-        orig_orien = proj.original_orientation
-        xy1 = lambda x,y: (px + x / xs, py+(y/ys), pz)
-        xy2 = lambda x,y: (px+(x/xs), py, pz+(y/zs))
-        xy3 = lambda x,y: (px, py+(x/ys), pz+(y/zs))
-        
-        if (orig_orien == const.SAGITAL):
-            abs_pixel = {"SAGITAL": xy1,
-                         "AXIAL": xy2,
-                         "CORONAL": xy3}
-        elif(orig_orien == const.CORONAL):
-            abs_pixel = {"CORONAL": xy1,
-                         "SAGITAL": xy3,
-                         "AXIAL": xy2}
-        else:
-            abs_pixel = {"AXIAL": xy1,
-                        "CORONAL": xy2,
-                        "SAGITAL": xy3}
-            
-        function_orientation = abs_pixel[orient]
-        
-        for pixel_0,pixel_1 in self.pixel_list:
-            # The position of the pixels in this list is relative (based only on
-            # the area, and not the cursor position).
-            # Let's calculate the absolute position
-            # TODO: Optimize this!!!!
-            yield function_orientation(pixel_0, pixel_1)
-            
-
+        """
+        Return the voxels (int array (n, 3) of x, y, z) under the
+        cursor, which may be out of the volume.
+        """
+        stencil = GetStencil(const.BRUSH_CIRCLE, self.radius * 2,
+                             self.spacing, self.orientation)
+        return stencil + numpy.round(self.edition_position).astype(int)
 
 
 class CursorRectangle:
@@ -235,7 +196,6 @@ class CursorRectangle:
         self.spacing = (1, 1, 1)
                 
         self.__build_actor()
-        self.__calculate_area_pixels()
         
     def SetSize(self, size):
         self.x_length = size
@@ -243,7 +203,6 @@ class CursorRectangle:
         retangle = self.retangle
         retangle.SetXLength(size)
         retangle.SetYLength(size)        
-        self.__calculate_area_pixels()
         
     def SetOrientation(self, orientation):
         self.orientation = orientation
@@ -254,23 +213,10 @@ class CursorRectangle:
 
     def SetOrientation(self, orientation):
         self.orientation = orientation
-        proj = Project() 
-        orig_orien = proj.original_orientation
-        if (orig_orien == const.SAGITAL):
-            if orientation == "CORONAL":
-                self.actor.RotateY(90)
-            if orientation == "AXIAL":
-                self.actor.RotateX(90)
-        elif(orig_orien == const.CORONAL):
-            if orientation == "AXIAL":
-                self.actor.RotateX(270)
-            if orientation == "SAGITAL":
-                self.actor.RotateY(90)
-        else:
-            if orientation == "CORONAL":
-                self.actor.RotateX(90)
-            if orientation == "SAGITAL":
-                self.actor.RotateY(90)
+        if orientation == "CORONAL":
+            self.actor.RotateX(90)
+        if orientation == "SAGITAL":
+            self.actor.RotateY(90)
 
     def SetPosition(self, position):
         x,y,z = position
@@ -310,68 +256,11 @@ class CursorRectangle:
         actor.GetProperty().SetColor(self.colour) 
         actor.SetVisibility(0)
 
-    def __calculate_area_pixels(self):
-        xc = 0
-        yc = 0
-        z = 0
-        xs, ys, zs = self.spacing 
-        
-        proj = Project()
-        orig_orien = proj.original_orientation
-        
-        xy = (xs, ys)
-        yz = (ys, zs)
-        xz = (xs, zs)
-        
-        if (orig_orien == const.SAGITAL):
-            orientation_based_spacing = {"SAGITAL" : xy,
-                                     "AXIAL" : yz,
-                                     "CORONAL" : xz}
-        elif(orig_orien == const.CORONAL):
-            orientation_based_spacing = {"CORONAL" : xy,
-                                         "AXIAL" : xz,
-                                         "SAGITAL" : yz}
-        else:
-            orientation_based_spacing = {"AXIAL" : xy,
-                                         "SAGITAL" : yz,
-                                         "CORONAL" : xz}
-        
-        xs, ys = orientation_based_spacing[self.orientation]
-        self.pixel_list = []
-        for i in utils.frange(yc - self.y_length/2, yc + self.y_length/2, ys):
-            for k in utils.frange(xc - self.x_length/2, xc + self.x_length/2, xs):
-                self.pixel_list.append((k, i))
-
-
     def GetPixels(self):
         """
-        Return the points of the rectangle
+        Return the voxels (int array (n, 3) of x, y, z) under the
+        cursor, which may be out of the volume.
         """
-        px, py, pz = self.edition_position
-        orient = self.orientation
-        xs, ys, zs = self.spacing
-        proj = Project()
-        orig_orien = proj.original_orientation
-        xy1 = lambda x,y: (px + x / xs, py+(y/ys), pz)
-        xy2 = lambda x,y: (px+(x/xs), py, pz+(y/zs))
-        xy3 = lambda x,y: (px, py+(x/ys), pz+(y/zs))
-        
-        if (orig_orien == const.SAGITAL):
-            abs_pixel = {"SAGITAL": xy1,
-                         "AXIAL": xy2,
-                         "CORONAL": xy3}
-        elif(orig_orien == const.CORONAL):
-            abs_pixel = {"CORONAL": xy1,
-                         "SAGITAL": xy3,
-                         "AXIAL": xy2}
-        else:
-            abs_pixel = {"AXIAL": xy1,
-                        "CORONAL": xy2,
-                        "SAGITAL": xy3}
-        function_orientation = abs_pixel[orient]
-        for pixel_0,pixel_1 in self.pixel_list:
-            # The position of the pixels in this list is relative (based only on
-            # the area, and not the cursor position).
-            # Let's calculate the absolute position
-            # TODO: Optimize this!!!!
-            yield function_orientation(pixel_0, pixel_1)
+        stencil = GetStencil(const.BRUSH_SQUARE, self.x_length,
+                             self.spacing, self.orientation)
+        return stencil + numpy.round(self.edition_position).astype(int)
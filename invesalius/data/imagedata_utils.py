@@ -17,15 +17,28 @@
 #    detalhes.
 #--------------------------------------------------------------------------
 
+import ctypes
+import itertools
 import math
+import multiprocessing
 import os
+import threading
+
+import numpy
 import vtk
 import vtkgdcm
+import wx
 import wx.lib.pubsub as ps
 
+from multiprocessing.pool import ThreadPool
+from vtk.util import numpy_support
+
 import constants as const
 from data import vtk_utils
+import memory_budget
+import reorientation
 import utils
+import volume_store
 
 # TODO: Test cases which are originally in sagittal/coronal orientation
 # and have gantry
@@ -92,11 +105,20 @@ def ResampleImage2D(imagedata, px, py,
 
     return resample.GetOutput()
 
+
+# Maximum number of slices sheared at once by FixGantryTilt, the
+# temporary arrays are about 3 times the size of the chunk (float32).
+GANTRY_TILT_CHUNK = 16
+
 def FixGantryTilt(imagedata, tilt):
     """
-    Fix gantry tilt given a vtkImageData and the tilt value. Return new
-    vtkImageData.
+    Fix gantry tilt given a vtkImageData and the tilt value. Each slice
+    is translated in y (shear), using linear interpolation. The volume
+    is changed in place and returned.
     """
+    # The tilt is given for rows from bottom to top, the canonical y
+    # axis (see reorientation) goes from top to bottom.
+    tilt = -tilt
 
     # Retrieve data from original imagedata
     extent = [int(value) for value in imagedata.GetExtent()]
@@ -107,44 +129,71 @@ def FixGantryTilt(imagedata, tilt):
     new_zspacing = math.cos(tilt*(math.acos(-1.0)/180.0)) * spacing[2] #zspacing
     translate_coef = math.tan(tilt*math.pi/180.0)*new_zspacing*(n_slices-1)
 
-    # Class responsible for translating data
-    reslice = vtk.vtkImageReslice()
-    reslice.SetInput(imagedata)
-    reslice.SetInterpolationModeToLinear()
+    volume = ImageDataToArray(imagedata)
+    # Translation (in pixels) of each slice
+    shifts = (math.tan(tilt*math.pi/180.0) * new_zspacing *
+              numpy.arange(volume.shape[0]) - translate_coef) / spacing[1]
     # Translation will create new pixels. Let's set new pixels' colour to black.
-    reslice.SetBackgroundLevel(imagedata.GetScalarRange()[0])
-
-    # Class responsible for append translated data
-    append = vtk.vtkImageAppend()
-    append.SetAppendAxis(2)
-
-    # Translate and append each slice
-    for i in xrange(n_slices+1):
-        slice_imagedata = vtk.vtkImageData()
-        value = math.tan(tilt*math.pi/180.0) * new_zspacing * i
-        new_origin1 = origin[1] + value - translate_coef
-        # Translate data
-        reslice.SetOutputOrigin(origin[0], new_origin1, origin[2])
-        reslice.SetOutputExtent(extent[0], extent[1], extent[2], extent[3], i,i)
-        reslice.Update()
-        # Append data
-        slice_imagedata.DeepCopy(reslice.GetOutput())
-        slice_imagedata.UpdateInformation()
-
-        append.AddInput(slice_imagedata)
-
-    append.Update()
-
-    # Final imagedata
-    imagedata = vtk.vtkImageData()
-    imagedata.DeepCopy(append.GetOutput())
+    background = imagedata.GetScalarRange()[0]
+
+    # numpy releases the GIL while computing, so chunks of slices are
+    # sheared by threads sharing the volume memory.
+    nthreads = multiprocessing.cpu_count()
+    chunksize = max(1, min(GANTRY_TILT_CHUNK, volume.shape[0] / nthreads))
+    chunks = [(z, min(z + chunksize, volume.shape[0]))
+              for z in xrange(0, volume.shape[0], chunksize)]
+
+    if len(chunks) > 1 and nthreads > 1:
+        pool = ThreadPool(nthreads)
+        try:
+            pool.map(lambda chunk: _ShearSlices(volume, shifts, chunk,
+                                                background), chunks)
+        finally:
+            pool.terminate()
+    else:
+        for chunk in chunks:
+            _ShearSlices(volume, shifts, chunk, background)
+
+    imagedata.GetPointData().GetScalars().Modified()
     imagedata.SetSpacing(spacing[0], spacing[1], new_zspacing)
-    imagedata.SetExtent(extent)
+    # Same origin of the first translated slice
+    imagedata.SetOrigin(origin[0], origin[1] - translate_coef, origin[2])
     imagedata.UpdateInformation()
 
     return imagedata
 
 
+def _ShearSlices(volume, shifts, chunk, background):
+    """
+    Translate in y the slices from chunk (start, end) of volume by
+    shifts (pixels), in place. Pixels coming from outside the slice are
+    set to background.
+    """
+    start, end = chunk
+    slices = volume[start:end]
+    nz, ny = slices.shape[:2]
+
+    # Row of the original slice sampled by each row of the translated one
+    rows = numpy.arange(ny, dtype='float32') + \
+            shifts[start:end, numpy.newaxis].astype('float32')
+    inside = (rows >= 0) & (rows <= ny - 1)
+    lower = numpy.floor(rows)
+    weight = rows - lower
+    lower = lower.clip(0, ny - 1).astype('intp')
+    upper = numpy.minimum(lower + 1, ny - 1)
+
+    z = numpy.arange(nz)[:, numpy.newaxis]
+    # Weight broadcasts through x (and components)
+    weight = weight.reshape(weight.shape + (1,) * (slices.ndim - 2))
+    sheared = slices[z, lower] * (1 - weight)
+    sheared += slices[z, upper] * weight
+    sheared[~inside] = background
+
+    if slices.dtype.kind in 'iu':
+        numpy.floor(sheared + 0.5, sheared)
+    slices[:] = sheared
+
+
 def BuildEditedImage(imagedata, points):
     """
     Editing the original image in accordance with the edit
@@ -221,6 +270,56 @@ def Import(filename):
 
     return reader.GetOutput()
 
+def ImportVolume(filename):
+    """
+    Import the volume of a project (see Import). If the project doesn't
+    fit in the available memory (see memory_budget), its voxels are
+    moved to a memory mapped file (see volume_store.CreateArray), so
+    the masks and derived volumes are kept out of core too. The file
+    is read whole before it's moved, so opening the project still needs
+    the memory of the volume once.
+    """
+    imagedata = Import(filename)
+    array = ImageDataToArray(imagedata)
+    nx, ny, nz = imagedata.GetDimensions()
+    factor, working_set = memory_budget.ChooseResampleFactor(
+            (nx, ny), nz, array.dtype.itemsize * 8)
+    utils.debug("Open project: %s" % working_set)
+    if not working_set.out_of_core:
+        return imagedata
+
+    volume = volume_store.CreateArray(array.shape, array.dtype, True)
+    for z in xrange(nz):
+        volume[z] = array[z]
+    spacing = imagedata.GetSpacing()
+    origin = imagedata.GetOrigin()
+    del array, imagedata
+    return ArrayToImageData(volume, spacing, origin)
+
+def ReorientImage(imagedata, directions):
+    """
+    Return given vtkImageData reoriented to the canonical layout given
+    the directions of its x, y and z axes (see reorientation). The
+    voxels are copied one slice at a time, into a volume out of core if
+    the given one is.
+    """
+    reorient = reorientation.Reorientation(directions,
+                                           imagedata.GetDimensions())
+    if reorient.IsIdentity():
+        return imagedata
+
+    array = ImageDataToArray(imagedata)
+    volume = volume_store.CreateArray(reorient.GetShape(array.shape),
+                                      array.dtype,
+                                      volume_store.IsOutOfCore(array))
+    view = reorient.GetAcquisitionView(volume)
+    for z in xrange(array.shape[0]):
+        view[z] = array[z]
+
+    spacing = imagedata.GetSpacing()
+    return ArrayToImageData(volume, reorient.GetSpacing(spacing),
+                            reorient.GetOrigin(imagedata.GetOrigin(), spacing))
+
 def View(imagedata):
     viewer = vtk.vtkImageViewer()
     viewer.SetInput(imagedata)
@@ -255,10 +354,390 @@ def ExtractVOI(imagedata,xi,xf,yi,yf,zi,zf):
     voi.Update()
     return voi.GetOutput()
 
-def CreateImageData(filelist, zspacing, xyspacing,size,
-                                bits, use_dcmspacing):
-    message = _("Generating multiplanar visualization...")
+def ReadSlice(filename, xyspacing=None, resample_to=None):
+    """
+    Decode a single DICOM file, returning a (2D) vtkImageData. If
+    xyspacing is given, it overrides the spacing read from the file. If
+    resample_to (px, py) is given, the slice is resampled to it.
 
+    Rows are kept in the order they are stored (from top to bottom), the
+    volume is reoriented as a whole (see VolumeAssembler).
+    """
+    reader = vtkgdcm.vtkGDCMImageReader()
+    reader.SetFileName(filename)
+    reader.FileLowerLeftOn()
+    reader.Update()
+
+    image = vtk.vtkImageData()
+    image.ShallowCopy(reader.GetOutput())
+    if xyspacing:
+        image.SetSpacing(xyspacing[0], xyspacing[1], 1.0)
+
+    if resample_to:
+        px, py = resample_to
+        image = ResampleImage2D(image, px, py)
+    return image
+
+
+def _KeepAlive(vtk_object, array):
+    """
+    Keep a reference to given numpy array until vtk_object is deleted:
+    the DeleteEvent observer (a Python callable holding the array) is
+    released only with the vtk object.
+    """
+    vtk_object.AddObserver('DeleteEvent', lambda obj, event: array)
+
+
+def ArrayToImageData(array, spacing=(1.0, 1.0, 1.0), origin=(0.0, 0.0, 0.0)):
+    """
+    Return a vtkImageData using the memory of given numpy array (z, y, x
+    [, components]) - there is no copy. The vtk scalars don't own this
+    memory, so they keep a reference to the array until they are deleted
+    (see _KeepAlive), even if the caller drops the array.
+    """
+    if array.ndim == 4:
+        nz, ny, nx, ncomponents = array.shape
+        flat = array.reshape(-1, ncomponents)
+    else:
+        nz, ny, nx = array.shape
+        ncomponents = 1
+        flat = array.reshape(-1)
+    # numpy_to_vtk would use a temporary contiguous copy otherwise
+    flat = numpy.ascontiguousarray(flat)
+
+    scalars = numpy_support.numpy_to_vtk(flat, deep=0)
+    _KeepAlive(scalars, flat)
+
+    imagedata = vtk.vtkImageData()
+    imagedata.SetDimensions(nx, ny, nz)
+    imagedata.SetWholeExtent(0, nx-1, 0, ny-1, 0, nz-1)
+    imagedata.SetSpacing(spacing)
+    imagedata.SetOrigin(origin)
+    imagedata.SetScalarType(numpy_support.get_vtk_array_type(array.dtype))
+    imagedata.SetNumberOfScalarComponents(ncomponents)
+    imagedata.GetPointData().SetScalars(scalars)
+    imagedata.UpdateInformation()
+    return imagedata
+
+
+def ImageDataToArray(imagedata):
+    """
+    Return a numpy array (z, y, x [, components]) which is a view of
+    given vtkImageData scalars - there is no copy, changes to the array
+    change the vtkImageData.
+    """
+    nx, ny, nz = imagedata.GetDimensions()
+    ncomponents = imagedata.GetNumberOfScalarComponents()
+    array = numpy_support.vtk_to_numpy(imagedata.GetPointData().GetScalars())
+    if ncomponents > 1:
+        return array.reshape(nz, ny, nx, ncomponents)
+    return array.reshape(nz, ny, nx)
+
+
+# Volume being assembled by the slice decoder processes (see
+# VolumeAssembler), set by _InitSliceDecoder in each process.
+_assembly = {}
+
+def _InitSliceDecoder(buffer_, dtype, shape, xyspacing, resample_to,
+                      path, reorient):
+    if path:
+        volume = numpy.memmap(path, dtype, 'r+', shape=shape)
+    else:
+        volume = numpy.frombuffer(buffer_, dtype).reshape(shape)
+    # Slices are decoded into the view with the axes of the files
+    _assembly['volume'] = reorient.GetAcquisitionView(volume)
+    _assembly['xyspacing'] = xyspacing
+    _assembly['resample_to'] = resample_to
+
+def _DecodeSlice(item):
+    """
+    Decode a file straight into its z planes of the shared volume (more
+    than one if it's multi-frame), returning its index.
+    """
+    index, z, filename = item
+    volume = _assembly['volume']
+    image = ReadSlice(filename, _assembly['xyspacing'],
+                      _assembly['resample_to'])
+    nframes = image.GetDimensions()[2]
+    scalars = numpy_support.vtk_to_numpy(image.GetPointData().GetScalars())
+    volume[z:z + nframes] = scalars.reshape((nframes,) + volume.shape[1:])
+    return index
+
+def ReadNumberOfFrames(filename):
+    """
+    Return the number of frames (z planes) of given DICOM file, reading
+    only its header.
+    """
+    reader = vtkgdcm.vtkGDCMImageReader()
+    reader.SetFileName(filename)
+    reader.UpdateInformation()
+    extent = reader.GetDataExtent()
+    return extent[5] - extent[4] + 1
+
+class VolumeAssembler(object):
+    """
+    Volume stacking the slices in filelist (see ReadSlice about
+    xyspacing and resample_to), reoriented to the canonical layout
+    given the directions of its x, y and z axes (see reorientation).
+    zspacing, if given, overrides the spacing read from the files.
+
+    The volume is allocated only once, in shared memory, and a pool of
+    processes decode the slices directly into their z plane, so memory
+    used is about the size of the volume. The vtkImageData (imagedata
+    attribute) is a view of this memory (no copy). The volume attribute
+    is a view of it with the axes of the files, so the slices are
+    reoriented as they are decoded, without another pass. Slices may be
+    decoded in any order and in more than one call to Decode.
+
+    Multi-frame files fill as many z planes as they have frames: file i
+    is decoded into the planes offsets[i] to offsets[i + 1] - 1. Frames
+    of the other files are only read if the first one is multi-frame.
+
+    If out_of_core, the volume is a memory mapped file instead (see
+    volume_store.CreateArray), which the processes map too.
+    """
+
+    def __init__(self, filelist, xyspacing=None, resample_to=None,
+                 out_of_core=False, zspacing=None, directions=None):
+        self.filelist = filelist
+
+        # First slice gives dimensions, scalar type and spacing
+        first = ReadSlice(filelist[0], xyspacing, resample_to)
+        nx, ny, nframes = first.GetDimensions()
+        ncomponents = first.GetNumberOfScalarComponents()
+        first_array = numpy_support.vtk_to_numpy(first.GetPointData().GetScalars())
+        dtype = first_array.dtype
+
+        if nframes > 1:
+            frames = [nframes] + [ReadNumberOfFrames(filename)
+                                  for filename in filelist[1:]]
+        else:
+            frames = [1] * len(filelist)
+        self.offsets = numpy.concatenate(([0], numpy.cumsum(frames)))
+        nz = int(self.offsets[-1])
+
+        if ncomponents > 1:
+            shape = (nz, ny, nx, ncomponents)
+        else:
+            shape = (nz, ny, nx)
+
+        self.reorientation = reorientation.Reorientation(
+                directions or reorientation.IDENTITY, (nx, ny, nz))
+        canonical_shape = self.reorientation.GetShape(shape)
+
+        if out_of_core:
+            buffer_ = None
+            canonical = volume_store.CreateArray(canonical_shape, dtype, True,
+                                                 keep_file=True)
+            self.path = canonical.filename
+        else:
+            nbytes = dtype.itemsize
+            for n in shape:
+                nbytes *= n
+            buffer_ = multiprocessing.RawArray(ctypes.c_char, nbytes)
+            canonical = numpy.frombuffer(buffer_, dtype).reshape(canonical_shape)
+            self.path = None
+        self.volume = self.reorientation.GetAcquisitionView(canonical)
+        self.volume[:nframes] = first_array.reshape((nframes,) + shape[1:])
+
+        self.decoded = numpy.zeros(len(filelist), bool)
+        self.decoded[0] = True
+
+        spacing = first.GetSpacing()
+        if zspacing:
+            spacing = (spacing[0], spacing[1], zspacing)
+        self.imagedata = ArrayToImageData(canonical,
+                            self.reorientation.GetSpacing(spacing),
+                            self.reorientation.GetOrigin(first.GetOrigin(),
+                                                         spacing))
+
+        initargs = (buffer_, dtype.str, canonical_shape, xyspacing,
+                    resample_to, self.path, self.reorientation)
+        self.pool = None
+        if len(filelist) > 2 and multiprocessing.cpu_count() > 1:
+            try:
+                self.pool = multiprocessing.Pool(multiprocessing.cpu_count(),
+                                                 _InitSliceDecoder, initargs)
+            except OSError, e:
+                utils.debug("Not possible to create the decoder pool: %s" % e)
+        if not self.pool:
+            _InitSliceDecoder(*initargs)
+
+    def Decode(self, zs):
+        """
+        Decode the files of given indexes, yielding each index as soon
+        as its file is decoded (not necessarily in the given order).
+        """
+        items = [(i, int(self.offsets[i]), self.filelist[i]) for i in zs]
+        if self.pool:
+            chunksize = max(1, len(items) / (8 * multiprocessing.cpu_count()))
+            decoded = self.pool.imap_unordered(_DecodeSlice, items, chunksize)
+        else:
+            decoded = itertools.imap(_DecodeSlice, items)
+
+        for i in decoded:
+            self.decoded[i] = True
+            yield i
+
+    def FillMissing(self):
+        """
+        Copy the nearest decoded slice into each slice not decoded yet.
+        """
+        planes = numpy.repeat(self.decoded, numpy.diff(self.offsets))
+        decoded = numpy.flatnonzero(planes)
+        missing = numpy.flatnonzero(~planes)
+        if not len(missing):
+            return
+
+        after = numpy.searchsorted(decoded, missing).clip(0, len(decoded) - 1)
+        before = (after - 1).clip(0, len(decoded) - 1)
+        nearest = numpy.where(abs(decoded[before] - missing) <=
+                              abs(decoded[after] - missing),
+                              decoded[before], decoded[after])
+        for z, source in itertools.izip(missing, nearest):
+            self.volume[z] = self.volume[source]
+        self.imagedata.GetPointData().GetScalars().Modified()
+
+    def Close(self):
+        if self.pool:
+            if self.decoded.all():
+                self.pool.close()
+                self.pool.join()
+            else:
+                self.pool.terminate()
+            self.pool = None
+        _assembly.clear()
+        if self.path:
+            # No other process is going to open it
+            volume_store.RemoveFile(self.path)
+            self.path = None
+
+
+def AssembleVolume(filelist, xyspacing=None, resample_to=None,
+                   update_progress=None, running=None, out_of_core=False,
+                   zspacing=None, directions=None):
+    """
+    Create a vtkImageData stacking the slices in filelist, see
+    VolumeAssembler.
+
+    update_progress is called with the fraction of slices decoded and
+    running (a function) may return False to cancel. In this case None
+    is returned.
+    """
+    assembler = VolumeAssembler(filelist, xyspacing, resample_to,
+                                out_of_core, zspacing, directions)
+    try:
+        ndecoded = 1
+        for z in assembler.Decode(xrange(1, len(filelist))):
+            ndecoded += 1
+            if running and not running():
+                return None
+            if update_progress:
+                update_progress(ndecoded / float(len(filelist)))
+    finally:
+        assembler.Close()
+
+    return assembler.imagedata
+
+
+class ProgressiveVolume(object):
+    """
+    Volume loaded in two steps, so it may be shown before all slices
+    are decoded.
+
+    LoadPreview decodes the central slices and a strided subset of the
+    others, filling the gaps with the nearest decoded slice. Then
+    LoadRemaining decodes the other slices in a background thread,
+    blocks of slices from the center outwards, notifying (in the main
+    thread) each block loaded and the end.
+
+    How to use:
+        volume = ProgressiveVolume(filelist)
+        imagedata = volume.LoadPreview()
+        # show imagedata
+        volume.LoadRemaining(range_loaded, loaded)
+    """
+
+    def __init__(self, filelist, xyspacing=None, resample_to=None,
+                 out_of_core=False, zspacing=None, directions=None):
+        self.assembler = VolumeAssembler(filelist, xyspacing, resample_to,
+                                         out_of_core, zspacing, directions)
+        self.imagedata = self.assembler.imagedata
+        self.running = True
+
+    def LoadPreview(self, update_progress=None):
+        nslices = len(self.assembler.filelist)
+        center = nslices / 2
+        half = const.PROGRESSIVE_CENTER_SLICES / 2
+        stride = max(1, nslices / const.PROGRESSIVE_COARSE_SLICES)
+
+        if self.assembler.pool:
+            zs = set(xrange(max(1, center - half),
+                            min(nslices, center + half + 1)))
+            zs.update(xrange(stride, nslices, stride))
+        else:
+            # Without decoder processes, slices would be decoded by the
+            # background thread using vtk, so all are decoded now.
+            zs = set(xrange(1, nslices))
+
+        ndecoded = 0
+        for z in self.assembler.Decode(sorted(zs)):
+            ndecoded += 1
+            if update_progress:
+                update_progress(ndecoded / float(len(zs)))
+        self.assembler.FillMissing()
+
+        utils.debug("Progressive loading: %d of %d slices in preview" %
+                    (ndecoded + 1, nslices))
+        return self.imagedata
+
+    def LoadRemaining(self, range_loaded=None, loaded=None):
+        """
+        Decode the slices not decoded by LoadPreview in a background
+        thread. range_loaded(zstart, zend) is called after each block of
+        slices is decoded and loaded() after the last one.
+        """
+        missing = numpy.flatnonzero(~self.assembler.decoded)
+        center = len(self.assembler.filelist) / 2
+        size = const.PROGRESSIVE_BLOCK_SLICES
+        blocks = [missing[i:i+size] for i in xrange(0, len(missing), size)]
+        blocks.sort(key=lambda block: abs(block[len(block)/2] - center))
+
+        thread = threading.Thread(target=self._LoadBlocks,
+                                  args=(blocks, range_loaded, loaded))
+        thread.setDaemon(True)
+        thread.start()
+
+    def _LoadBlocks(self, blocks, range_loaded, loaded):
+        try:
+            for block in blocks:
+                for z in self.assembler.Decode(block):
+                    if not self.running:
+                        return
+                offsets = self.assembler.offsets
+                wx.CallAfter(self._RangeLoaded, int(offsets[block[0]]),
+                             int(offsets[block[-1] + 1]) - 1, range_loaded)
+        finally:
+            self.assembler.Close()
+        if loaded:
+            wx.CallAfter(self._Loaded, loaded)
+
+    def _RangeLoaded(self, zstart, zend, range_loaded):
+        if self.running:
+            self.imagedata.GetPointData().GetScalars().Modified()
+            self.imagedata.Modified()
+            if range_loaded:
+                range_loaded(zstart, zend)
+
+    def _Loaded(self, loaded):
+        if self.running:
+            loaded()
+
+    def Stop(self):
+        self.running = False
+
+
+def _SetVtkOutput():
     if not const.VTK_WARNING:
         log_path = os.path.join(const.LOG_FOLDER, 'vtkoutput.txt')
         fow = vtk.vtkFileOutputWindow()
@@ -266,90 +745,72 @@ def CreateImageData(filelist, zspacing, xyspacing,size,
         ow = vtk.vtkOutputWindow()
         ow.SetInstance(fow)
 
-    x,y = size
-    px, py = utils.predict_memory(len(filelist), x, y, bits)
 
+def _GetResampleSize(filelist, size, bits):
+    """
+    Return the size (px, py) the slices must be resampled to fit in the
+    available memory, or None if there is no need to resample, and if
+    the volume must be kept out of core.
+    """
+    x,y = size
+    px, py, out_of_core = memory_budget.PredictSize(size, len(filelist),
+                                                    bits)
     utils.debug("Image Resized to >>> %f x %f" % (px, py))
 
     if (x == px) and (y == py):
         const.REDUCE_IMAGEDATA_QUALITY = 0
+        return None, out_of_core
     else:
         const.REDUCE_IMAGEDATA_QUALITY = 1
+        # Resample image in x,y dimension
+        return (px, py), out_of_core
 
-    if not(const.REDUCE_IMAGEDATA_QUALITY):
-        update_progress= vtk_utils.ShowProgress(1, dialog_type = "ProgressDialog")
-
-        array = vtk.vtkStringArray()
-        for x in xrange(len(filelist)):
-            array.InsertValue(x,filelist[x])
-
-        reader = vtkgdcm.vtkGDCMImageReader()
-        reader.SetFileNames(array)
-        reader.AddObserver("ProgressEvent", lambda obj,evt:
-                     update_progress(reader,message))
-        reader.Update()
-
-        # The zpacing is a DicomGroup property, so we need to set it
-        imagedata = vtk.vtkImageData()
-        imagedata.DeepCopy(reader.GetOutput())
-        if (use_dcmspacing):
-            spacing = xyspacing
-            spacing[2] = zspacing
-        else:
-            spacing = imagedata.GetSpacing()
 
-        imagedata.SetSpacing(spacing[0], spacing[1], zspacing)
-    else:
-
-        update_progress= vtk_utils.ShowProgress(2*len(filelist),
-                                            dialog_type = "ProgressDialog")
+def CreateImageData(filelist, zspacing, xyspacing,size,
+                                bits, use_dcmspacing, directions=None):
+    message = _("Generating multiplanar visualization...")
 
-        # Reformat each slice and future append them
-        appender = vtk.vtkImageAppend()
-        appender.SetAppendAxis(2) #Define Stack in Z
+    _SetVtkOutput()
+    resample_to, out_of_core = _GetResampleSize(filelist, size, bits)
 
+    if (use_dcmspacing):
+        spacing = xyspacing
+    else:
+        spacing = None
 
-        # Reformat each slice
-        for x in xrange(len(filelist)):
-            # TODO: We need to check this automatically according
-            # to each computer's architecture
-            # If the resolution of the matrix is too large
-            reader = vtkgdcm.vtkGDCMImageReader()
-            reader.SetFileName(filelist[x])
-            reader.AddObserver("ProgressEvent", lambda obj,evt:
-                         update_progress(reader,message))
-            reader.Update()
+    update_progress= vtk_utils.ShowProgress(1, dialog_type = "ProgressDialog")
+    # The zpacing is a DicomGroup property, so it's given to the volume
+    imagedata = AssembleVolume(filelist, spacing, resample_to,
+                               lambda value: update_progress(value, message),
+                               out_of_core=out_of_core, zspacing=zspacing,
+                               directions=directions)
 
-            if (use_dcmspacing):
-                spacing = xyspacing
-                spacing[2] = zspacing
-            else:
-                spacing = reader.GetOutput().GetSpacing()
+    return imagedata
 
-            tmp_image = vtk.vtkImageData()
-            tmp_image.DeepCopy(reader.GetOutput())
-            tmp_image.SetSpacing(spacing[0], spacing[1], zspacing)
-            tmp_image.Update()
 
-            #Resample image in x,y dimension
-            slice_imagedata = ResampleImage2D(tmp_image, px, py, update_progress)
-            #Stack images in Z axes
-            appender.AddInput(slice_imagedata)
-            #appender.AddObserver("ProgressEvent", lambda obj,evt:update_progress(appender))
-            appender.Update()
+def CreateProgressiveImageData(filelist, zspacing, xyspacing, size,
+                               bits, use_dcmspacing, directions=None):
+    """
+    Same as CreateImageData, but return a ProgressiveVolume whose
+    preview is already loaded (see ProgressiveVolume).
+    """
+    message = _("Generating multiplanar visualization...")
 
-        spacing = appender.GetOutput().GetSpacing()
+    _SetVtkOutput()
+    resample_to, out_of_core = _GetResampleSize(filelist, size, bits)
 
-        # The zpacing is a DicomGroup property, so we need to set it
-        imagedata = vtk.vtkImageData()
-        imagedata.DeepCopy(appender.GetOutput())
-        imagedata.SetSpacing(spacing[0], spacing[1], zspacing)
+    if (use_dcmspacing):
+        spacing = xyspacing
+    else:
+        spacing = None
 
-    imagedata.AddObserver("ProgressEvent", lambda obj,evt:
-                 update_progress(imagedata,message))
-    imagedata.Update()
+    update_progress= vtk_utils.ShowProgress(1, dialog_type = "ProgressDialog")
+    # The zpacing is a DicomGroup property, so it's given to the volume
+    volume = ProgressiveVolume(filelist, spacing, resample_to, out_of_core,
+                               zspacing, directions)
+    volume.LoadPreview(lambda value: update_progress(value, message))
 
-    return imagedata
+    return volume
 
 
 class ImageCreator:
@@ -361,91 +822,23 @@ class ImageCreator:
         utils.debug("Canceling")
         self.running = False
 
-    def CreateImageData(self, filelist, zspacing, size, bits):
+    def CreateImageData(self, filelist, zspacing, size, bits,
+                        directions=None):
         message = _("Generating multiplanar visualization...")
 
-        if not const.VTK_WARNING:
-            log_path = os.path.join(const.LOG_FOLDER, 'vtkoutput.txt')
-            fow = vtk.vtkFileOutputWindow()
-            fow.SetFileName(log_path)
-            ow = vtk.vtkOutputWindow()
-            ow.SetInstance(fow)
-
-        x,y = size
-        px, py = utils.predict_memory(len(filelist), x, y, bits)
-        utils.debug("Image Resized to >>> %f x %f" % (px, py))
+        _SetVtkOutput()
+        resample_to, out_of_core = _GetResampleSize(filelist, size,
+                                                    bits)
 
-        if (x == px) and (y == py):
-            const.REDUCE_IMAGEDATA_QUALITY = 0
-        else:
-            const.REDUCE_IMAGEDATA_QUALITY = 1
-
-        if not(const.REDUCE_IMAGEDATA_QUALITY):
-            update_progress= vtk_utils.ShowProgress(1, dialog_type = "ProgressDialog")
-
-            array = vtk.vtkStringArray()
-            for x in xrange(len(filelist)):
-                if not self.running:
-                    return False
-                array.InsertValue(x,filelist[x])
-
-            if not self.running:
-                return False
-            reader = vtkgdcm.vtkGDCMImageReader()
-            reader.SetFileNames(array)
-            reader.AddObserver("ProgressEvent", lambda obj,evt:
-                         update_progress(reader,message))
-            reader.Update()
-
-            if not self.running:
-                reader.AbortExecuteOn()
-                return False
-            # The zpacing is a DicomGroup property, so we need to set it
-            imagedata = vtk.vtkImageData()
-            imagedata.DeepCopy(reader.GetOutput())
-            spacing = imagedata.GetSpacing()
-            imagedata.SetSpacing(spacing[0], spacing[1], zspacing)
-        else:
+        if not self.running:
+            return False
 
-            update_progress= vtk_utils.ShowProgress(2*len(filelist),
-                                                dialog_type = "ProgressDialog")
-
-            # Reformat each slice and future append them
-            appender = vtk.vtkImageAppend()
-            appender.SetAppendAxis(2) #Define Stack in Z
-
-
-            # Reformat each slice
-            for x in xrange(len(filelist)):
-                # TODO: We need to check this automatically according
-                # to each computer's architecture
-                # If the resolution of the matrix is too large
-                if not self.running:
-                    return False
-                reader = vtkgdcm.vtkGDCMImageReader()
-                reader.SetFileName(filelist[x])
-                reader.AddObserver("ProgressEvent", lambda obj,evt:
-                             update_progress(reader,message))
-                reader.Update()
-
-                #Resample image in x,y dimension
-                slice_imagedata = ResampleImage2D(reader.GetOutput(), px, py, update_progress)
-                #Stack images in Z axes
-                appender.AddInput(slice_imagedata)
-                #appender.AddObserver("ProgressEvent", lambda obj,evt:update_progress(appender))
-                appender.Update()
-
-            # The zpacing is a DicomGroup property, so we need to set it
-            if not self.running:
-                return False
-            imagedata = vtk.vtkImageData()
-            imagedata.DeepCopy(appender.GetOutput())
-            spacing = imagedata.GetSpacing()
-
-            imagedata.SetSpacing(spacing[0], spacing[1], zspacing)
-
-        imagedata.AddObserver("ProgressEvent", lambda obj,evt:
-                     update_progress(imagedata,message))
-        imagedata.Update()
+        update_progress= vtk_utils.ShowProgress(1, dialog_type = "ProgressDialog")
+        imagedata = AssembleVolume(filelist, None, resample_to,
+                                   lambda value: update_progress(value, message),
+                                   lambda: self.running, out_of_core,
+                                   zspacing, directions)
+        if imagedata is None:
+            return False
 
         return imagedata
@@ -21,11 +21,34 @@ import os
 import plistlib
 import random
 
+import numpy
 import vtk
 
 import constants as const
 import imagedata_utils as iu
 
+
+def ConvertMaskImage(imagedata):
+    """
+    Return given mask image as unsigned char (const.MASK_INVALUE and
+    const.MASK_OUTVALUE). Masks saved by older versions have the scalar
+    type of the volume, with its minimum value outside and its maximum
+    inside.
+    """
+    if imagedata.GetScalarType() == vtk.VTK_UNSIGNED_CHAR:
+        return imagedata
+    array = iu.ImageDataToArray(imagedata)
+    minimum, maximum = array.min(), array.max()
+    if minimum == maximum:
+        inside = array > 0
+    else:
+        inside = array > minimum
+    mask = numpy.where(inside, numpy.uint8(const.MASK_INVALUE),
+                       numpy.uint8(const.MASK_OUTVALUE))
+    return iu.ArrayToImageData(mask, imagedata.GetSpacing(),
+                               imagedata.GetOrigin())
+
+
 class Mask():
     general_index = -1
     def __init__(self):
@@ -68,7 +91,7 @@ class Mask():
             if key == 'imagedata':
                 filepath = os.path.split(mask[key]["$vti"])[-1]
                 path = os.path.join(dirpath, filepath)
-                self.imagedata = iu.Import(path)
+                self.imagedata = ConvertMaskImage(iu.Import(path))
             elif key == 'edited_points':
                 edited_points = {}
                 for p in mask[key]:
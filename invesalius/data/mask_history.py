@@ -0,0 +1,268 @@
+#--------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+#--------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+#--------------------------------------------------------------------------
+"""
+Undo and redo history of mask editions.
+
+A brush stroke is kept as a sparse delta: the xor of the mask before
+and after the stroke inside the bounding box of the voxels stamped,
+compressed with zlib, so the same delta undoes and redoes it. A
+threshold change keeps only the threshold ranges and the edited points
+the mask had, because a mask is its threshold with its edited points
+drawn over it. The history holds at most const.MASK_HISTORY_SIZE bytes,
+the oldest entries are dropped.
+
+How to use:
+    history = MaskHistory()
+    stroke = StrokeEntry(mask)
+    stroke.AddStamp(coords, keys) # before each stamp
+    if stroke.Close():
+        history.Push(stroke)
+    ...
+    entry = history.Undo()
+    if entry:
+        entry.Undo()
+"""
+
+import zlib
+
+import numpy
+
+import constants as const
+import imagedata_utils as iu
+from volume_store import VolumeStore
+
+# Edited points which didn't exist are kept as NaN
+NOT_EDITED = float('nan')
+
+
+def _Pack(array):
+    return zlib.compress(numpy.ascontiguousarray(array).tostring(), 1)
+
+
+def _Unpack(data, dtype, shape):
+    return numpy.fromstring(zlib.decompress(data), dtype).reshape(shape)
+
+
+def DrawEditedPoints(mask):
+    """
+    Threshold the voxels of given mask.Mask by its threshold range and
+    draw its edited points over them.
+    """
+    array = iu.ImageDataToArray(mask.imagedata)
+    store = VolumeStore()
+    store.Threshold(mask.threshold_range, array)
+    if mask.edited_points:
+        x, y, z = numpy.array(mask.edited_points.keys()).round().astype(int).T
+        colours = numpy.array(mask.edited_points.values())
+        # Drawn points have the volume maximum, erased ones its minimum
+        colour_min, colour_max = store.GetScalarRange()
+        array[z, y, x] = numpy.where(colours > colour_min,
+                                     numpy.uint8(const.MASK_INVALUE),
+                                     numpy.uint8(const.MASK_OUTVALUE))
+    mask.imagedata.Modified()
+
+
+class StrokeEntry(object):
+    """
+    Brush stroke over a mask: the stamps (see Slice.StampMask) from the
+    mouse button press to its release.
+    """
+    def __init__(self, mask):
+        self.mask = mask
+        self.nbytes = 0
+        self._coords = []
+        self._values = []
+        self._points = []
+
+    def AddStamp(self, coords, keys):
+        """
+        Keep the mask voxels and the edited points of a stamp before it
+        is applied, given its coordinates (an int array (n, 3) of x, y,
+        z) and the keys of its edited points.
+        """
+        x, y, z = coords.T
+        array = iu.ImageDataToArray(self.mask.imagedata)
+        points = self.mask.edited_points
+        self._coords.append(coords)
+        self._values.append(array[z, y, x])
+        self._points.append(numpy.array([points.get(key, NOT_EDITED)
+                                         for key in keys], float))
+
+    def Close(self):
+        """
+        Compress the stroke, once all its stamps were applied. Return
+        False if it changed nothing, so it's not worth keeping.
+        """
+        if not self._coords:
+            return False
+        coords = numpy.concatenate(self._coords)
+        values = numpy.concatenate(self._values)
+        points_before = numpy.concatenate(self._points)
+        self._coords = self._values = self._points = None
+
+        # Voxels stamped more than once are kept with the value they
+        # had before the first stamp
+        array = iu.ImageDataToArray(self.mask.imagedata)
+        nz, ny, nx = array.shape
+        linear = (coords[:, 2] * ny + coords[:, 1]) * nx + coords[:, 0]
+        linear, first = numpy.unique(linear, return_index=True)
+        coords = coords[first]
+        values = values[first]
+        points_before = points_before[first]
+
+        lower = coords.min(0)
+        upper = coords.max(0) + 1
+        # Arrays are (z, y, x)
+        self.box = tuple([slice(l, u) for l, u in zip(lower, upper)][::-1])
+        after = array[self.box]
+        before = after.copy()
+        x, y, z = (coords - lower).T
+        before[z, y, x] = values
+        delta = before ^ after
+
+        points = self.mask.edited_points
+        points_after = numpy.array([points[key] for key in
+                                    map(tuple, coords.astype(float).tolist())],
+                                   float)
+        if not delta.any() and (points_before == points_after).all():
+            return False
+
+        self.shape = delta.shape
+        self.delta = _Pack(delta)
+        self.points = _Pack(numpy.column_stack((coords, points_before,
+                                                points_after)))
+        self.npoints = len(coords)
+        self.nbytes = len(self.delta) + len(self.points)
+        return True
+
+    def Undo(self):
+        self.__apply(3)
+
+    def Redo(self):
+        self.__apply(4)
+
+    def __apply(self, column):
+        array = iu.ImageDataToArray(self.mask.imagedata)
+        array[self.box] ^= _Unpack(self.delta, numpy.uint8, self.shape)
+        self.mask.imagedata.Modified()
+
+        table = _Unpack(self.points, float, (self.npoints, 5))
+        points = self.mask.edited_points
+        for x, y, z, value in table[:, (0, 1, 2, column)].tolist():
+            if value != value:
+                points.pop((x, y, z), None)
+            else:
+                points[(x, y, z)] = value
+
+
+class ThresholdEntry(object):
+    """
+    Change of the threshold range of a mask, which drops its edited
+    points.
+    """
+    def __init__(self, mask, threshold_range):
+        self.mask = mask
+        self.range_before = mask.threshold_range
+        self.range_after = threshold_range
+
+        points = mask.edited_points
+        self.npoints = len(points)
+        table = numpy.empty((self.npoints, 4))
+        if points:
+            table[:, :3] = points.keys()
+            table[:, 3] = points.values()
+        self.points = _Pack(table)
+        self.nbytes = len(self.points)
+
+    def Undo(self):
+        table = _Unpack(self.points, float, (self.npoints, 4))
+        self.mask.threshold_range = self.range_before
+        self.mask.edited_points = dict(zip(map(tuple, table[:, :3].tolist()),
+                                           table[:, 3].tolist()))
+        DrawEditedPoints(self.mask)
+
+    def Redo(self):
+        self.mask.threshold_range = self.range_after
+        self.mask.edited_points = {}
+        DrawEditedPoints(self.mask)
+
+
+class MaskHistory(object):
+    """
+    Undo and redo stacks of the editions (StrokeEntry and
+    ThresholdEntry) of all masks, holding at most size bytes.
+    """
+    def __init__(self, size=None):
+        if size is None:
+            size = const.MASK_HISTORY_SIZE
+        self.size = size
+        self.Clear()
+
+    def Clear(self):
+        self.undo = []
+        self.redo = []
+        self.nbytes = 0
+
+    def Push(self, entry):
+        """
+        Add an edition just done. Editions undone before it can't be
+        redone anymore.
+        """
+        for old_entry in self.redo:
+            self.nbytes -= old_entry.nbytes
+        self.redo = []
+
+        self.undo.append(entry)
+        self.nbytes += entry.nbytes
+        while self.nbytes > self.size and self.undo:
+            self.nbytes -= self.undo.pop(0).nbytes
+
+    def CanUndo(self):
+        return bool(self.undo)
+
+    def CanRedo(self):
+        return bool(self.redo)
+
+    def Undo(self):
+        """
+        Return the last edition to be undone (calling its Undo), None if
+        there isn't one.
+        """
+        if not self.undo:
+            return None
+        entry = self.undo.pop()
+        self.redo.append(entry)
+        return entry
+
+    def Redo(self):
+        """
+        Return the last edition undone to be redone (calling its Redo),
+        None if there isn't one.
+        """
+        if not self.redo:
+            return None
+        entry = self.redo.pop()
+        self.undo.append(entry)
+        return entry
+
+    def RemoveMask(self, mask):
+        "Drop the editions of given mask (eg. it was removed)."
+        self.undo = [entry for entry in self.undo if entry.mask is not mask]
+        self.redo = [entry for entry in self.redo if entry.mask is not mask]
+        self.nbytes = sum([entry.nbytes for entry in self.undo + self.redo])
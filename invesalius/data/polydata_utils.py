@@ -101,6 +101,27 @@ def Merge(polydata_list):
 
     return append.GetOutput()
 
+def ApplyTransform(polydata, transform):
+    """
+    Return given vtkPolyData with its points transformed by given
+    vtkTransform. If the transform is a mirror, the triangles are
+    reversed, otherwise they would be turned inside out.
+    """
+    transformer = vtk.vtkTransformPolyDataFilter()
+    transformer.SetInput(polydata)
+    transformer.SetTransform(transform)
+    output = transformer.GetOutput()
+
+    if transform.GetMatrix().Determinant() < 0:
+        # Normals are already mirrored by vtkTransformPolyDataFilter
+        reverse = vtk.vtkReverseSense()
+        reverse.SetInput(output)
+        reverse.ReverseCellsOn()
+        output = reverse.GetOutput()
+
+    output.Update()
+    return output
+
 def Export(polydata, filename, bin=False):
     writer = vtk.vtkXMLPolyDataWriter()
     writer.SetFileName(filename)
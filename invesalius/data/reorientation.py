@@ -0,0 +1,197 @@
+#--------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+#--------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+#--------------------------------------------------------------------------
+"""
+Canonical voxel layout of the project volume.
+
+Whatever the acquisition orientation, volumes are reoriented once, when
+they are imported, so that their x, y and z axes point to the patient's
+left, posterior and superior (LPS, as the DICOM patient coordinates).
+Viewers, surfaces and raycasting then use the volume as it is, without
+flips or tables per acquisition orientation. The direction (patient
+coordinates) of each axis is recorded in the project (direction), as
+image axes are not exactly the patient axes in oblique acquisitions.
+
+The reorientation of a volume is a permutation of its axes, some of them
+reversed, so it's done while the slices are copied: the volume is read
+into a view (see Reorientation.GetAcquisitionView) of the canonical one.
+"""
+
+import numpy
+
+import constants as const
+
+IDENTITY = ((1.0, 0.0, 0.0),
+            (0.0, 1.0, 0.0),
+            (0.0, 0.0, 1.0))
+
+# Directions of the x, y and z axes of the volumes of projects saved
+# before the reorientation (rows from bottom to top, slices sorted by
+# position but coronal ones), by their original orientation.
+LEGACY_DIRECTIONS = {const.AXIAL: ((1, 0, 0), (0, -1, 0), (0, 0, 1)),
+                     const.CORONAL: ((1, 0, 0), (0, 0, 1), (0, 1, 0)),
+                     const.SAGITAL: ((0, 1, 0), (0, 0, 1), (-1, 0, 0))}
+
+# Analyze volumes are taken as axial, their x, y and z axes pointing to
+# the left, anterior (rows from bottom to top) and superior.
+ANALYZE_DIRECTIONS = ((1, 0, 0), (0, -1, 0), (0, 0, 1))
+
+
+def GetDicomDirections(orientation, first_position, last_position):
+    """
+    Return the directions (patient coordinates) of the x, y and z axes
+    of a volume read from DICOM files (rows from top to bottom) given
+    the image orientation (6 cosines) and the positions of its first and
+    last slices.
+    """
+    row = numpy.array(orientation[:3], float)
+    column = numpy.array(orientation[3:6], float)
+    normal = numpy.cross(row, column)
+    step = numpy.array(last_position[:3], float) - \
+            numpy.array(first_position[:3], float)
+    if numpy.dot(step, normal) < 0:
+        normal = -normal
+    return row.tolist(), column.tolist(), normal.tolist()
+
+
+def GetDirection(directions):
+    """
+    Return the directions (columns of a 3x3 matrix, as nested lists) of
+    the canonical axes of a volume whose axes have given directions.
+    """
+    return Reorientation(directions, (1, 1, 1)).direction
+
+
+class Reorientation(object):
+    """
+    Reorientation of a volume whose x, y and z axes have given
+    directions (patient coordinates) and given dimensions (nx, ny, nz)
+    to the canonical layout. Each axis of the volume becomes the
+    canonical axis (axes) nearest to its direction, reversed if signs
+    is -1.
+    """
+
+    def __init__(self, directions, dimensions):
+        self.dimensions = tuple(int(n) for n in dimensions)
+        self.axes = [0, 1, 2]
+        self.signs = [1, 1, 1]
+
+        # Nearest pairs first, so two axes of an oblique volume don't
+        # become the same canonical one
+        pairs = sorted(((abs(directions[axis][canonical]), axis, canonical)
+                        for axis in xrange(3) for canonical in xrange(3)),
+                       reverse=True)
+        done, taken = set(), set()
+        for value, axis, canonical in pairs:
+            if axis in done or canonical in taken:
+                continue
+            self.axes[axis] = canonical
+            self.signs[axis] = 1 if directions[axis][canonical] >= 0 else -1
+            done.add(axis)
+            taken.add(canonical)
+
+        # Columns are the directions of the canonical axes
+        self.direction = [[0.0] * 3 for i in xrange(3)]
+        for axis in xrange(3):
+            for i in xrange(3):
+                self.direction[i][self.axes[axis]] = \
+                        self.signs[axis] * float(directions[axis][i])
+
+    def IsIdentity(self):
+        return self.axes == [0, 1, 2] and self.signs == [1, 1, 1]
+
+    def _Permute(self, values):
+        permuted = [0] * 3
+        for axis in xrange(3):
+            permuted[self.axes[axis]] = values[axis]
+        return permuted
+
+    def GetDimensions(self):
+        "Canonical dimensions (nx, ny, nz)."
+        return tuple(self._Permute(self.dimensions))
+
+    def GetShape(self, shape):
+        """
+        Canonical shape of a numpy array (z, y, x [, components]) with
+        the dimensions of the volume.
+        """
+        nx, ny, nz = self.GetDimensions()
+        return (nz, ny, nx) + tuple(shape[3:])
+
+    def GetSpacing(self, spacing):
+        return tuple(float(value) for value in self._Permute(spacing))
+
+    def GetOrigin(self, origin, spacing):
+        """
+        Canonical origin. Reversed axes are mirrored about the origin, as
+        the points (see ReorientPoint).
+        """
+        origin = list(origin)
+        for axis in xrange(3):
+            if self.signs[axis] < 0:
+                origin[axis] = -(origin[axis] + (self.dimensions[axis] - 1) *
+                                 spacing[axis])
+        return tuple(float(value) for value in self._Permute(origin))
+
+    def GetAcquisitionView(self, array):
+        """
+        Return a view of given canonical numpy array (z, y, x [,
+        components]) with the axes of the volume as read, so copying
+        the volume into it reorients the volume.
+        """
+        # Numpy axis of each axis of the volume: 2 - axis
+        order = [2 - self.axes[2 - i] for i in xrange(3)]
+        view = array.transpose(order + range(3, array.ndim))
+        steps = [self.signs[2 - i] for i in xrange(3)]
+        return view[tuple(slice(None, None, step) for step in steps)]
+
+    def ReorientPoint(self, point):
+        "Canonical coordinates of given point (x, y, z)."
+        return self._Permute([self.signs[axis] * point[axis]
+                              for axis in xrange(3)])
+
+    def ReorientIndex(self, index):
+        "Canonical voxel of given voxel (x, y, z) of the volume."
+        reoriented = []
+        for axis in xrange(3):
+            if self.signs[axis] < 0:
+                reoriented.append(self.dimensions[axis] - 1 - index[axis])
+            else:
+                reoriented.append(index[axis])
+        return self._Permute(reoriented)
+
+    def ReorientSliceNumber(self, axis, number):
+        """
+        Canonical number of given slice across given canonical axis (0:
+        sagittal, 1: coronal, 2: axial).
+        """
+        for source in xrange(3):
+            if self.axes[source] == axis and self.signs[source] < 0:
+                return self.dimensions[source] - 1 - number
+        return number
+
+    def GetMatrix(self):
+        """
+        Return the (4x4, row major) matrix of the reorientation of
+        points, as used by vtkTransform.SetMatrix.
+        """
+        matrix = [0.0] * 16
+        for axis in xrange(3):
+            matrix[self.axes[axis] * 4 + axis] = float(self.signs[axis])
+        matrix[15] = 1.0
+        return matrix
@@ -16,16 +16,24 @@
 #    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
 #    detalhes.
 #--------------------------------------------------------------------------
+import itertools
+import math
+import threading
+
+import numpy
 import vtk
+import wx
 import wx.lib.pubsub as ps
 
 import constants as const
 import imagedata_utils as iu
 from mask import Mask
+import mask_history as mh
 import style as st
 from project import Project
 import session as ses
 import utils
+from volume_store import VolumeStore
 
 
 class Slice(object):
@@ -39,6 +47,19 @@ class Slice(object):
         self.current_mask = None
         self.blend_filter = None
 
+        # Slices shown by each viewer, thresholded before the rest of the
+        # volume (see SetMaskThreshold)
+        self.displayed_slices = {}
+        self.threshold_job = None
+        # Threshold range shown by the lookup table preview, None when
+        # the mask is shown (see SetThresholdPreview)
+        self.threshold_preview = None
+        self.lut_preview = None
+
+        # Undo history of mask editions and the brush stroke being drawn
+        self.history = mh.MaskHistory()
+        self.stroke = None
+
         self.num_gradient = 0
         self.interaction_style = st.StyleStateManager()
 
@@ -85,21 +106,102 @@ class Slice(object):
         ps.Publisher().subscribe(self.OnDisableStyle, 'Disable style')
 
         ps.Publisher().subscribe(self.OnRemoveMasks, 'Remove masks')
+        ps.Publisher().subscribe(self.OnVolumeLoaded, 'Volume loaded')
         ps.Publisher().subscribe(self.OnDuplicateMasks, 'Duplicate masks')
+        ps.Publisher().subscribe(self.OnSetDisplayedSlices,
+                                 'Set displayed slices')
+        ps.Publisher().subscribe(self.OnWaitMaskThreshold,
+                                 'Wait mask threshold')
+        ps.Publisher().subscribe(self.OnPreviewThreshold,
+                                 'Preview threshold values')
+        ps.Publisher().subscribe(self.OnEndStroke, 'End mask stroke')
+        ps.Publisher().subscribe(self.OnUndoMaskEdition, 'Undo mask edition')
+        ps.Publisher().subscribe(self.OnRedoMaskEdition, 'Redo mask edition')
 
     def OnRemoveMasks(self, pubsub_evt):
         selected_items = pubsub_evt.data
 
         proj = Project()
         for item in selected_items:
+            mask = proj.mask_dict[item]
+            if self.stroke and self.stroke.mask is mask:
+                self.stroke = None
+            self.history.RemoveMask(mask)
             proj.RemoveMask(item)
+        self.__update_undo_state()
 
         if not proj.mask_dict:
             self.blend_filter.SetOpacity(1, 0)
             self.blend_filter.Update()
             ps.Publisher().sendMessage('Update slice viewer')
 
+    def OnVolumeLoaded(self, pubsub_evt):
+        # Masks created (or edited) while the volume was being loaded
+        # were thresholded from the preview, where the slices not loaded
+        # are copies of their neighbours: all of them are thresholded
+        # again, keeping their edited points.
+        self.EndStroke()
+        self.ApplyThresholdPreview()
+        self.CancelThreshold()
+        for mask in Project().mask_dict.values():
+            self.__threshold_loaded_mask(mask)
+
+        # Strokes in the history were drawn over the preview masks
+        self.history.Clear()
+        self.__update_undo_state()
+        ps.Publisher().sendMessage('Update slice viewer')
+
+    def __threshold_loaded_mask(self, mask):
+        store = VolumeStore()
+        array = iu.ImageDataToArray(mask.imagedata)
+        if mask.edited_points:
+            # The mask has the edited points drawn or erased; their values
+            # are the range of the preview, which may be narrower
+            keys = mask.edited_points.keys()
+            x, y, z = numpy.array(keys).round().astype(int).T
+            edited = array[z, y, x]
+
+        store.Threshold(mask.threshold_range, array)
+
+        if mask.edited_points:
+            array[z, y, x] = edited
+            colour_min, colour_max = store.GetScalarRange()
+            colours = numpy.where(edited == const.MASK_INVALUE, colour_max,
+                                  colour_min)
+            mask.edited_points = dict(itertools.izip(keys, colours.tolist()))
+        mask.imagedata.Modified()
+
+    def OnSetDisplayedSlices(self, pubsub_evt):
+        orientation, axis, numbers = pubsub_evt.data
+        # Image axes are (x, y, z), the arrays (z, y, x)
+        self.displayed_slices[orientation] = (2 - axis, numbers)
+
+        job = self.threshold_job
+        if job and job.isAlive():
+            # Slices scrolled to are thresholded before the job gets there
+            VolumeStore().ThresholdSlices(job.threshold_range,
+                                          iu.ImageDataToArray(job.imagedata),
+                                          2 - axis, numbers)
+            job.imagedata.Modified()
+
+    def OnWaitMaskThreshold(self, pubsub_evt):
+        self.WaitThreshold()
+
+    def OnEndStroke(self, pubsub_evt):
+        self.EndStroke()
+
+    def OnUndoMaskEdition(self, pubsub_evt):
+        self.UndoMaskEdition()
+
+    def OnRedoMaskEdition(self, pubsub_evt):
+        self.RedoMaskEdition()
+
+    def OnPreviewThreshold(self, pubsub_evt):
+        if self.current_mask:
+            self.SetThresholdPreview(pubsub_evt.data)
+
     def OnDuplicateMasks(self, pubsub_evt):
+        self.WaitThreshold()
         selected_items = pubsub_evt.data
         proj = Project()
         mask_dict = proj.mask_dict
@@ -140,6 +242,13 @@ class Slice(object):
         self.CloseProject()
 
     def CloseProject(self):
+        self.CancelThreshold()
+        self.displayed_slices = {}
+        self.threshold_preview = None
+        self.lut_preview = None
+        self.history.Clear()
+        self.stroke = None
+        self.__update_undo_state()
         self.imagedata = None
         self.current_mask = None
         ps.Publisher().sendMessage('Select first item from slice menu')
@@ -190,6 +299,12 @@ class Slice(object):
     def __set_current_mask_threshold(self, evt_pubsub):
         threshold_range = evt_pubsub.data
         index = self.current_mask.index
+        self.EndStroke()
+        mask = self.current_mask
+        if tuple(threshold_range) != tuple(mask.threshold_range) or \
+                mask.edited_points:
+            self.history.Push(mh.ThresholdEntry(mask, threshold_range))
+            self.__update_undo_state()
         self.SetMaskThreshold(index, threshold_range)
         #Clear edited points
         self.current_mask.edited_points = {}
@@ -218,18 +333,15 @@ class Slice(object):
     #---------------------------------------------------------------------------
     def __erase_mask_pixel(self, pubsub_evt):
         positions = pubsub_evt.data
-        for position in positions:
-            self.ErasePixel(position)
+        self.StampMask(positions, const.BRUSH_ERASE)
 
     def __edit_mask_pixel(self, pubsub_evt):
         positions = pubsub_evt.data
-        for position in positions:
-            self.EditPixelBasedOnThreshold(position)
+        self.StampMask(positions, const.BRUSH_THRESH)
 
     def __add_mask_pixel(self, pubsub_evt):
         positions = pubsub_evt.data
-        for position in positions:
-            self.DrawPixel(position)
+        self.StampMask(positions, const.BRUSH_DRAW)
     #---------------------------------------------------------------------------
     # END PUBSUB_EVT METHODS
     #---------------------------------------------------------------------------
@@ -241,9 +353,8 @@ class Slice(object):
         proj.mask_dict[index].colour = colour
 
         (r,g,b) = colour
-        scalar_range = int(self.imagedata.GetScalarRange()[1])
         self.lut_mask.SetTableValue(0, 0, 0, 0, 0.0)
-        self.lut_mask.SetTableValue(scalar_range - 1, r, g, b, 1.0)
+        self.lut_mask.SetTableValue(1, r, g, b, 1.0)
 
         colour_wx = [r*255, g*255, b*255]
         ps.Publisher().sendMessage('Change mask colour in notebook',
@@ -278,15 +389,22 @@ class Slice(object):
         thresh_min, thresh_max = threshold_range
 
         if self.current_mask.index == index:
-            # Update pipeline (this must be here, so pipeline is not broken)
-            self.img_thresh_mask.SetInput(self.imagedata)
-            self.img_thresh_mask.ThresholdBetween(float(thresh_min),
-                                                  float(thresh_max))
-            self.img_thresh_mask.Update()
-
-            # Create imagedata copy so the pipeline is not broken
-            imagedata = self.img_thresh_mask.GetOutput()
-            self.current_mask.imagedata.DeepCopy(imagedata)
+            # The mask is thresholded in place, no other copy of the
+            # volume is created. Only the displayed slices are thresholded
+            # at once, the rest of the volume by a background job which
+            # is cancelled by the next threshold range (eg. while the
+            # slider is dragged).
+            self.CancelThreshold()
+            self.__end_threshold_preview()
+            imagedata = self.current_mask.imagedata
+            mask = iu.ImageDataToArray(imagedata)
+            store = VolumeStore()
+            for axis, numbers in self.displayed_slices.values():
+                store.ThresholdSlices(threshold_range, mask, axis, numbers)
+            imagedata.Modified()
+            self.threshold_job = ThresholdJob(imagedata, threshold_range,
+                                              self.__threshold_done)
+            self.threshold_job.start()
             self.current_mask.threshold_range = threshold_range
 
             # Update pipeline (this must be here, so pipeline is not broken)
@@ -307,6 +425,102 @@ class Slice(object):
         proj.mask_dict[self.current_mask.index].threshold_range = threshold_range
 
 
+    def CancelThreshold(self):
+        "Stop the background thresholding of the current mask, if any."
+        job = self.threshold_job
+        if job:
+            job.cancel.set()
+            # It stops after the block of slices being thresholded
+            job.join()
+            self.threshold_job = None
+
+    def WaitThreshold(self):
+        """
+        Wait the background thresholding of the current mask to finish,
+        before its voxels are read or edited. A threshold range being
+        previewed is applied first.
+        """
+        self.ApplyThresholdPreview()
+        job = self.threshold_job
+        if job:
+            job.join()
+            self.__threshold_done(job)
+
+    def __threshold_done(self, job):
+        # Jobs cancelled or already waited for are ignored
+        if job is self.threshold_job:
+            self.threshold_job = None
+            job.imagedata.Modified()
+            ps.Publisher().sendMessage('Update slice viewer')
+
+    def SetThresholdPreview(self, threshold_range):
+        """
+        Show the current mask as if it was thresholded by given range,
+        without thresholding it: the displayed slices of the volume are
+        mapped through a lookup table which has the mask colour inside
+        the range and is transparent on both sides of it. The mask is
+        thresholded by SetMaskThreshold (or ApplyThresholdPreview).
+        """
+        if self.threshold_preview is None:
+            # The mask is going to be thresholded again anyway
+            self.CancelThreshold()
+
+            store = VolumeStore()
+            scalar_min, scalar_max = store.GetScalarRange()
+            if store.array.dtype.kind == 'f':
+                ncolours = const.THRESHOLD_PREVIEW_COLOURS
+            else:
+                ncolours = min(int(scalar_max - scalar_min) + 1,
+                               const.THRESHOLD_PREVIEW_COLOURS)
+            step = (scalar_max - scalar_min) / max(ncolours - 1, 1)
+
+            # Each colour is centred on a scalar value, all of them
+            # transparent at first
+            lut = vtk.vtkLookupTable()
+            lut.SetNumberOfTableValues(ncolours)
+            lut.SetTableRange(scalar_min - step / 2.0,
+                              scalar_max + step / 2.0)
+            lut.SetAlphaRange(0.0, 0.0)
+            lut.Build()
+            self.lut_preview = lut
+            self.preview_scalars = (scalar_min, step, ncolours)
+            self.preview_colours = (0, -1)
+
+            self.img_colours_mask.SetInput(self.imagedata)
+            self.img_colours_mask.SetLookupTable(lut)
+        self.threshold_preview = threshold_range
+
+        thresh_min, thresh_max = threshold_range
+        scalar_min, step, ncolours = self.preview_scalars
+        first = max(int(math.ceil((thresh_min - scalar_min) / step)), 0)
+        last = min(int(math.floor((thresh_max - scalar_min) / step)),
+                   ncolours - 1)
+
+        # Only the colours which enter or leave the range are changed (so
+        # the table isn't built again)
+        lut = self.lut_preview
+        r, g, b = self.current_mask.colour
+        for i in _Difference(self.preview_colours, (first, last)):
+            lut.SetTableValue(i, 0, 0, 0, 0.0)
+        for i in _Difference((first, last), self.preview_colours):
+            lut.SetTableValue(i, r, g, b, 1.0)
+        self.preview_colours = (first, last)
+
+        ps.Publisher().sendMessage('Update slice viewer')
+
+    def ApplyThresholdPreview(self):
+        "Threshold the current mask by the range being previewed, if any."
+        if self.threshold_preview is not None:
+            ps.Publisher().sendMessage('Set threshold values',
+                                       self.threshold_preview)
+
+    def __end_threshold_preview(self):
+        if self.threshold_preview is not None:
+            self.threshold_preview = None
+            self.lut_preview = None
+            self.img_colours_mask.SetLookupTable(self.lut_mask)
+            self.img_colours_mask.SetInput(self.current_mask.imagedata)
+
     def ShowMask(self, index, value):
         "Show a mask given its index and 'show' value (0: hide, other: show)"
         proj = Project()
@@ -319,42 +533,121 @@ class Slice(object):
             self.blend_filter.Update()
             ps.Publisher().sendMessage('Update slice viewer')
     #---------------------------------------------------------------------------
-    def ErasePixel(self, position):
-        "Delete pixel, based on x, y and z position coordinates."
-        x, y, z = round(position[0],0), round(position[1],0),position[2]
-        colour = self.imagedata.GetScalarRange()[0]
+    def StampMask(self, positions, operation):
+        """
+        Apply a brush footprint to the current mask at once. positions
+        are the voxels (x, y, z) of the footprint, an array (n, 3) or a
+        sequence of them; positions out of the volume are ignored.
+        operation is const.BRUSH_ERASE, const.BRUSH_DRAW or
+        const.BRUSH_THRESH (draw where the volume is inside the mask
+        edition threshold range and erase elsewhere).
+        """
+        self.WaitThreshold()
+        if not isinstance(positions, numpy.ndarray):
+            positions = list(positions)
+        coords = numpy.round(numpy.asarray(positions, float).reshape(-1, 3))
+
+        store = VolumeStore()
+        nz, ny, nx = store.array.shape
+        inside_volume = ((coords >= 0) & (coords < (nx, ny, nz))).all(1)
+        coords = coords[inside_volume]
+        if not len(coords):
+            return
+        keys = map(tuple, coords.tolist())
+        int_coords = coords.astype(int)
+        x, y, z = int_coords.T
+
+        if operation == const.BRUSH_ERASE:
+            draw = numpy.zeros(len(coords), bool)
+        elif operation == const.BRUSH_DRAW:
+            draw = numpy.ones(len(coords), bool)
+        else:
+            thresh_min, thresh_max = self.current_mask.edition_threshold_range
+            values = store.array[z, y, x]
+            draw = (values >= thresh_min) & (values <= thresh_max)
+
+        # Stamps are kept until the stroke ends (see EndStroke)
+        if self.stroke is None:
+            self.stroke = mh.StrokeEntry(self.current_mask)
+        self.stroke.AddStamp(int_coords, keys)
+
         imagedata = self.current_mask.imagedata
-        imagedata.SetScalarComponentFromDouble(x, y, z, 0, colour)
-        self.current_mask.edited_points[(x, y, z)] = colour
+        mask = iu.ImageDataToArray(imagedata)
+        mask[z, y, x] = numpy.where(draw, numpy.uint8(const.MASK_INVALUE),
+                                    numpy.uint8(const.MASK_OUTVALUE))
+        imagedata.Modified()
+
+        # Surfaces are created from the volume with the edited points
+        # set to its minimum (erased) or maximum (drawn)
+        colour_min, colour_max = store.GetScalarRange()
+        colours = numpy.where(draw, colour_max, colour_min)
+        self.current_mask.edited_points.update(itertools.izip(keys,
+                                                       colours.tolist()))
 
         session = ses.Session()
         session.ChangeProject()
 
-
-    def DrawPixel(self, position, colour=None):
-        "Draw pixel, based on x, y and z position coordinates."
-        x, y, z = round(position[0],0), round(position[1],0),position[2]
-        colour = self.imagedata.GetScalarRange()[1]
-        imagedata = self.current_mask.imagedata
-        imagedata.SetScalarComponentFromDouble(x, y, z, 0, colour)
-        self.current_mask.edited_points[(x, y, z)] = colour
+    def EndStroke(self):
+        "Put the brush stroke being drawn, if any, in the undo history."
+        stroke = self.stroke
+        if stroke:
+            self.stroke = None
+            if stroke.Close():
+                self.history.Push(stroke)
+                self.__update_undo_state()
+
+    def UndoMaskEdition(self):
+        "Undo the last brush stroke or threshold change of the masks."
+        self.WaitThreshold()
+        self.EndStroke()
+        entry = self.history.Undo()
+        if entry:
+            self.__select_history_mask(entry)
+            entry.Undo()
+            self.__history_changed(entry)
+
+    def RedoMaskEdition(self):
+        "Redo the last mask edition undone."
+        self.WaitThreshold()
+        self.EndStroke()
+        entry = self.history.Redo()
+        if entry:
+            self.__select_history_mask(entry)
+            entry.Redo()
+            self.__history_changed(entry)
+
+    def __select_history_mask(self, entry):
+        if entry.mask is not self.current_mask:
+            self.SelectCurrentMask(entry.mask.index)
+
+    def __history_changed(self, entry):
+        mask = entry.mask
+        ps.Publisher().sendMessage('Set mask threshold in notebook',
+                                   (mask.index, mask.threshold_range))
+        ps.Publisher().sendMessage('Set threshold values in gradient',
+                                   mask.threshold_range)
+        ps.Publisher().sendMessage('Update slice viewer')
+        self.__update_undo_state()
 
         session = ses.Session()
         session.ChangeProject()
 
+    def __update_undo_state(self):
+        ps.Publisher().sendMessage('Update undo state',
+                                   (self.history.CanUndo(),
+                                    self.history.CanRedo()))
+
+    def ErasePixel(self, position):
+        "Delete pixel, based on x, y and z position coordinates."
+        self.StampMask([position], const.BRUSH_ERASE)
+
+    def DrawPixel(self, position):
+        "Draw pixel, based on x, y and z position coordinates."
+        self.StampMask([position], const.BRUSH_DRAW)
 
     def EditPixelBasedOnThreshold(self, position):
         "Erase or draw pixel based on edition threshold range."
-        x, y, z = round(position[0],0), round(position[1],0),position[2]
-        colour = self.imagedata.GetScalarComponentAsDouble(x, y, z, 0)
-        thresh_min, thresh_max = self.current_mask.edition_threshold_range
-        if (colour >= thresh_min) and (colour <= thresh_max):
-            self.DrawPixel(position, colour)
-        else:
-            self.ErasePixel(position)
-
-        session = ses.Session()
-        session.ChangeProject()
+        self.StampMask([position], const.BRUSH_THRESH)
 
 
     #---------------------------------------------------------------------------
@@ -366,6 +659,8 @@ class Slice(object):
         print "SelectCurrentMask"
         print "index:", index
         if self.current_mask and self.blend_filter and index > -1:
+            self.WaitThreshold()
+            self.EndStroke()
             proj = Project()
             future_mask = proj.GetMask(index)
             future_mask.is_shown = True
@@ -453,6 +748,7 @@ class Slice(object):
         thresh_min, thresh_max = imagedata.GetScalarRange()
         ps.Publisher().sendMessage('Update threshold limits list', (thresh_min,
                                     thresh_max))
+        self.bg_range = (thresh_min, thresh_max)
 
         # map scalar values into colors
         lut_bg = self.lut_bg = vtk.vtkLookupTable()
@@ -481,12 +777,24 @@ class Slice(object):
             window_level.SetWindow(window)
             window_level.SetLevel(level)
             window_level.SetOutputFormatToLuminance()
-            window_level.Update()
 
-            thresh_min, thresh_max = window_level.GetOutput().GetScalarRange()
-            self.lut_bg.SetTableRange(thresh_min, thresh_max)
+            # The output is computed only to the slices being shown, so
+            # its range is computed from the volume range
+            self.bg_range = self.__get_window_level_range(window, level)
+            self.lut_bg.SetTableRange(self.bg_range)
             self.img_colours_bg.SetInput(window_level.GetOutput())
 
+    def __get_window_level_range(self, window, level):
+        """
+        Return the range of the window and level output (luminance, 0 to
+        255) given the range of the volume.
+        """
+        scale = 255.0 / (window or 1)
+        shift = window / 2.0 - level
+        values = [min(max((value + shift) * scale, 0), 255)
+                  for value in VolumeStore().GetScalarRange()]
+        return int(min(values)), int(max(values))
+
     def UpdateColourTableBackground(self, pubsub_evt):
         values = pubsub_evt.data
 
@@ -497,20 +805,15 @@ class Slice(object):
         self.lut_bg.SetHueRange(values[2])
         self.lut_bg.SetValueRange(values[3])
 
-        thresh_min, thresh_max = self.window_level.GetOutput().GetScalarRange()
-        self.lut_bg.SetTableRange(thresh_min, thresh_max)
+        self.lut_bg.SetTableRange(self.bg_range)
 
 
     def InputImageWidget(self, pubsub_evt):
         widget = pubsub_evt.data
-
-        flip = vtk.vtkImageFlip()
-        flip.SetInput(self.window_level.GetOutput())
-        flip.SetFilteredAxis(1)
-        flip.FlipAboutOriginOn()
-        flip.Update()
-
-        widget.SetInput(flip.GetOutput())
+        # The volume is already in the canonical layout (see
+        # reorientation), the widgets share the window and level output
+        self.window_level.Update()
+        widget.SetInput(self.window_level.GetOutput())
 
 
     def CreateMask(self, imagedata=None, name=None, colour=None,
@@ -538,10 +841,12 @@ class Slice(object):
             future_mask.threshold_range = threshold_range
             future_mask.imagedata = self.__create_mask_threshold(self.imagedata, 
                                                     threshold_range)
+        elif imagedata is self.imagedata:
+            # First mask, the volume thresholded by the default range
+            future_mask.imagedata = self.__create_mask_threshold(imagedata,
+                                                future_mask.threshold_range)
         else:
-            future_mask.imagedata = vtk.vtkImageData()
-            future_mask.imagedata.DeepCopy(imagedata)
-            future_mask.imagedata.Update()
+            future_mask.imagedata = self.__copy_mask(imagedata)
 
 
         # when this is not the first instance, user will have defined a name
@@ -602,30 +907,18 @@ class Slice(object):
         current_mask = self.current_mask
 
         # properties to be inserted into pipeline
-        scalar_range = int(imagedata.GetScalarRange()[1])
         r,g,b = current_mask.colour
 
-        # map scalar values into colors
+        # map mask values (const.MASK_OUTVALUE and MASK_INVALUE) into
+        # transparent and the mask colour
         lut_mask = vtk.vtkLookupTable()
-        lut_mask.SetNumberOfTableValues(1)
-        lut_mask.SetNumberOfColors(1)
-        lut_mask.SetHueRange(const.THRESHOLD_HUE_RANGE)
-        lut_mask.SetSaturationRange(1, 1)
-        lut_mask.SetValueRange(1, 1)
-        lut_mask.SetNumberOfTableValues(scalar_range)
+        lut_mask.SetNumberOfTableValues(2)
+        lut_mask.SetTableRange(const.MASK_OUTVALUE, const.MASK_INVALUE)
+        lut_mask.SetTableValue(0, 0, 0, 0, 0.0)
         lut_mask.SetTableValue(1, r, g, b, 1.0)
-        lut_mask.SetTableValue(scalar_range - 1, r, g, b, 1.0)
-        lut_mask.SetRampToLinear()
-        lut_mask.Build()
         self.lut_mask = lut_mask
 
-        mask_thresh_imagedata = self.__create_mask_threshold(imagedata)
-
-        if create:
-            # threshold pipeline
-            current_mask.imagedata.DeepCopy(mask_thresh_imagedata)
-        else:
-            mask_thresh_imagedata = self.current_mask.imagedata
+        mask_thresh_imagedata = current_mask.imagedata
 
         # map the input image through a lookup table
         img_colours_mask = vtk.vtkImageMapToColors()
@@ -645,21 +938,17 @@ class Slice(object):
         else:
             thresh_min, thresh_max = threshold_range
 
-        # flexible threshold
-        img_thresh_mask = vtk.vtkImageThreshold()
-        img_thresh_mask.SetInValue(const.THRESHOLD_INVALUE)
-        img_thresh_mask.SetInput(imagedata)
-        img_thresh_mask.SetOutValue(const.THRESHOLD_OUTVALUE)
-        img_thresh_mask.ThresholdBetween(float(thresh_min), float(thresh_max))
-        img_thresh_mask.Update()
-        self.img_thresh_mask = img_thresh_mask
-
-        # copy of threshold output
-        imagedata_mask = vtk.vtkImageData()
-        imagedata_mask.DeepCopy(img_thresh_mask.GetOutput())
-        imagedata_mask.Update()
+        # The mask array is the only copy: no threshold filter output is
+        # kept
+        store = VolumeStore()
+        mask = store.Threshold((thresh_min, thresh_max))
+        return iu.ArrayToImageData(mask, store.spacing, store.origin)
 
-        return imagedata_mask
+    def __copy_mask(self, imagedata):
+        store = VolumeStore()
+        mask = store.CreateArray('uint8')
+        mask[:] = iu.ImageDataToArray(imagedata)
+        return iu.ArrayToImageData(mask, store.spacing, store.origin)
 
 
     def OnExportMask(self, pubsub_evt):
@@ -670,5 +959,32 @@ class Slice(object):
             iu.Export(imagedata, filename)
 
 
-
-
+def _Difference(interval, other):
+    """
+    Return the integers of interval (first, last) which are out of the
+    other interval. Empty intervals have first > last.
+    """
+    first, last = interval
+    return itertools.chain(xrange(first, min(last, other[0] - 1) + 1),
+                           xrange(max(first, other[1] + 1), last + 1))
+
+
+class ThresholdJob(threading.Thread):
+    """
+    Threshold the whole volume into the mask of given vtkImageData in
+    background. When it's done callback(job) is called in the GUI thread,
+    unless the job was cancelled (setting job.cancel) before.
+    """
+    def __init__(self, imagedata, threshold_range, callback):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.imagedata = imagedata
+        self.threshold_range = threshold_range
+        self.callback = callback
+        self.cancel = threading.Event()
+
+    def run(self):
+        mask = iu.ImageDataToArray(self.imagedata)
+        if VolumeStore().Threshold(self.threshold_range, mask,
+                                   self.cancel) is not None:
+            wx.CallAfter(self.callback, self)
@@ -423,24 +423,28 @@ class SurfaceManager():
         UpdateProgress = vu.ShowProgress(pipeline_size)
         UpdateProgress(0, _("Generating 3D surface..."))
 
+        # The volume is saved as raw data, which the surface process maps
+        # into memory instead of reading it: its pages are read only
+        # when they are used, so even volumes kept out of core fit.
         filename_img = tempfile.mktemp()
+        imagedata.Update()
+        array = iu.ImageDataToArray(imagedata)
+        array.tofile(filename_img)
+        image_info = (array.dtype.str, array.shape, imagedata.GetSpacing(),
+                      imagedata.GetOrigin())
 
-        writer = vtk.vtkXMLImageDataWriter()
-        writer.SetFileName(filename_img)
-        writer.SetInput(imagedata)
-        writer.Write()
+        # The copies (edited and resampled volumes) are released before
+        # the surface process runs; the original volume is kept by the
+        # VolumeStore.
+        array = imagedata = imagedata_tmp = None
 
         language = ses.Session().language
-        
-        if (prj.Project().original_orientation == const.CORONAL):
-            flip_image = False
-        else:
-            flip_image = True
-            
+
         pipe_in, pipe_out = multiprocessing.Pipe()
-        sp = surface_process.SurfaceProcess(pipe_in, filename_img, mode, min_value, max_value,
+        sp = surface_process.SurfaceProcess(pipe_in, filename_img, image_info,
+                 mode, min_value, max_value,
                  decimate_reduction, smooth_relaxation_factor,
-                 smooth_iterations, language, fill_holes, keep_largest, flip_image)
+                 smooth_iterations, language, fill_holes, keep_largest)
         sp.start()
 
         while 1:
@@ -450,6 +454,11 @@ class SurfaceManager():
             UpdateProgress(msg[0],msg[1])
 
         filename_polydata = pipe_out.recv()
+        sp.join()
+        try:
+            os.remove(filename_img)
+        except OSError:
+            pass
 
         reader = vtk.vtkXMLPolyDataReader()
         reader.SetFileName(filename_polydata)
@@ -552,10 +561,6 @@ class SurfaceManager():
                                     surface.colour, surface.volume,
                                     surface.transparency))
 
-        #Destroy Copy original imagedata
-        if(imagedata_tmp):
-            del imagedata_tmp
-
         ps.Publisher().sendMessage('End busy cursor')
 
     def RemoveActor(self, index):
@@ -2,18 +2,23 @@ import vtk
 import multiprocessing
 import tempfile
 
+import numpy
+
+from vtk.util import numpy_support
+
 import i18n
 
 class SurfaceProcess(multiprocessing.Process):
 
-    def __init__(self, pipe, filename, mode, min_value, max_value,
+    def __init__(self, pipe, filename, image_info, mode, min_value, max_value,
                  decimate_reduction, smooth_relaxation_factor,
-                 smooth_iterations, language,  fill_holes, keep_largest, 
-                 flip_image):
+                 smooth_iterations, language,  fill_holes, keep_largest):
 
         multiprocessing.Process.__init__(self)
         self.pipe = pipe
         self.filename = filename
+        # Raw data in filename: dtype, shape (z, y, x), spacing and origin
+        self.image_info = image_info
         self.mode = mode
         self.min_value = min_value
         self.max_value = max_value
@@ -23,7 +28,6 @@ class SurfaceProcess(multiprocessing.Process):
         self.language = language
         self.fill_holes = fill_holes
         self.keep_largest = keep_largest
-        self.flip_image = flip_image
 
 
     def run(self):
@@ -36,20 +40,22 @@ class SurfaceProcess(multiprocessing.Process):
     def CreateSurface(self):
         _ = i18n.InstallLanguage(self.language)
 
-        reader = vtk.vtkXMLImageDataReader()
-        reader.SetFileName(self.filename)
-        reader.Update()
-        
-        image = reader.GetOutput()
-        
-        if (self.flip_image):
-            # Flip original vtkImageData
-            flip = vtk.vtkImageFlip()
-            flip.SetInput(reader.GetOutput())
-            flip.SetFilteredAxis(1)
-            flip.FlipAboutOriginOn()
-            image = flip.GetOutput()
-            
+        # Mapped copy-on-write, so pages are read from the file only when
+        # they are used and the file is never changed
+        dtype, shape, spacing, origin = self.image_info
+        volume = numpy.memmap(self.filename, dtype, 'c', shape=shape)
+        nz, ny, nx = shape
+
+        image = vtk.vtkImageData()
+        image.SetDimensions(nx, ny, nz)
+        image.SetWholeExtent(0, nx-1, 0, ny-1, 0, nz-1)
+        image.SetSpacing(spacing)
+        image.SetOrigin(origin)
+        image.SetScalarType(numpy_support.get_vtk_array_type(volume.dtype))
+        image.SetNumberOfScalarComponents(1)
+        image.GetPointData().SetScalars(
+                numpy_support.numpy_to_vtk(volume.reshape(-1), deep=0))
+
         # Create vtkPolyData from vtkImageData
         if self.mode == "CONTOUR":
             contour = vtk.vtkContourFilter()
@@ -115,8 +121,6 @@ class SurfaceProcess(multiprocessing.Process):
                     self.SendProgress(obj, _("Generating 3D surface...")))
             polydata = filled_polydata.GetOutput()
 
-
-
         filename = tempfile.mktemp()
         writer = vtk.vtkXMLPolyDataWriter()
         writer.SetInput(polydata)
@@ -0,0 +1,253 @@
+#--------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+#--------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+#--------------------------------------------------------------------------
+"""
+Thumbnails of DICOM images, used by the import panel previews.
+
+Thumbnails are RGB images (at most const.THUMBNAIL_SIZE pixels wide or
+high) with the window and level of the image applied. They are created
+by a pool of worker processes, so no image is decoded by the GUI, kept
+in a bounded (LRU) memory cache and saved on disk, keyed by the
+SOPInstanceUID of the image. The folder they are saved in is pruned to
+its least recently used ones when the cache is created.
+
+How to use:
+    def callback(thumbnail):
+        width, height, rgb = thumbnail
+        ...
+    ThumbnailCache().Request(dicom, callback)
+"""
+
+import collections
+import hashlib
+import multiprocessing
+import os
+
+import vtk
+import vtkgdcm
+import wx
+
+from vtk.util import numpy_support
+
+import constants as const
+import utils
+
+
+def _MakeThumbnail(filename, window, level, size, path):
+    """
+    Return the thumbnail (width, height, rgb string, top to bottom) of
+    given DICOM file, reading it from path if it was already saved or
+    creating and saving it there, or None if the file couldn't be
+    read. This runs inside the worker processes.
+    """
+    # The pool has no error callback: an exception would leave the
+    # requests of this thumbnail pending
+    try:
+        return _CreateThumbnail(filename, window, level, size, path)
+    except Exception, e:
+        utils.debug("Thumbnail of %s not created: %s" % (filename, e))
+        return None
+
+
+def _CreateThumbnail(filename, window, level, size, path):
+    if path and os.path.isfile(path):
+        try:
+            thumbnail_file = open(path, 'rb')
+            try:
+                width, height = [int(i) for i in
+                                 thumbnail_file.readline().split()]
+                rgb = thumbnail_file.read()
+            finally:
+                thumbnail_file.close()
+            if len(rgb) == width * height * 3:
+                # Recently used, see ThumbnailCache.PruneFolder
+                os.utime(path, None)
+                return width, height, rgb
+        except (IOError, OSError, ValueError):
+            # Broken file, the thumbnail is created again
+            pass
+
+    reader = vtkgdcm.vtkGDCMImageReader()
+    reader.SetFileName(filename)
+    reader.Update()
+    image = reader.GetOutput()
+
+    width, height, z = image.GetDimensions()
+    if not (width and height):
+        return None
+    if z > 1:
+        # Multi-frame file, the first frame is shown
+        voi = vtk.vtkExtractVOI()
+        voi.SetInput(image)
+        voi.SetVOI(0, width - 1, 0, height - 1, 0, 0)
+        voi.Update()
+        image = voi.GetOutput()
+    factor = float(size) / max(width, height)
+    if factor < 1.0:
+        resample = vtk.vtkImageResample()
+        resample.SetInput(image)
+        resample.SetAxisMagnificationFactor(0, factor)
+        resample.SetAxisMagnificationFactor(1, factor)
+        resample.SetInterpolationModeToLinear()
+        resample.Update()
+        image = resample.GetOutput()
+
+    colorer = vtk.vtkImageMapToWindowLevelColors()
+    colorer.SetInput(image)
+    colorer.SetWindow(window)
+    colorer.SetLevel(level)
+    colorer.SetOutputFormatToRGB()
+    colorer.Update()
+
+    width, height, z = colorer.GetOutput().GetDimensions()
+    array = numpy_support.vtk_to_numpy(colorer.GetOutput().GetPointData().GetScalars())
+    # vtk images are bottom to top
+    rgb = array.reshape(height, width, 3)[::-1].tostring()
+
+    if path:
+        try:
+            tmp_path = "%s.%d" % (path, os.getpid())
+            thumbnail_file = open(tmp_path, 'wb')
+            try:
+                thumbnail_file.write("%d %d\n" % (width, height))
+                thumbnail_file.write(rgb)
+            finally:
+                thumbnail_file.close()
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp_path, path)
+        except (IOError, OSError):
+            # Other process may have saved it at the same time
+            pass
+
+    return width, height, rgb
+
+
+class ThumbnailCache(object):
+    # Only one pool and cache are used by all previews
+    __metaclass__= utils.Singleton
+
+    def __init__(self):
+        self.memory = collections.OrderedDict()
+        self.pending = {}
+        self.pool = None
+
+        self.folder = const.THUMBNAIL_FOLDER
+        if self.folder and not os.path.isdir(self.folder):
+            try:
+                os.makedirs(self.folder)
+            except OSError, e:
+                utils.debug("Thumbnails won't be saved: %s" % e)
+                self.folder = None
+        if self.folder:
+            self.PruneFolder(const.THUMBNAIL_FOLDER_SIZE)
+
+    def PruneFolder(self, size):
+        """
+        Remove the least recently used (modified) thumbnails saved in
+        the folder, so it keeps at most size of them.
+        """
+        try:
+            names = os.listdir(self.folder)
+        except OSError, e:
+            utils.debug("Thumbnails folder not pruned: %s" % e)
+            return
+        if len(names) <= size:
+            return
+
+        files = []
+        for name in names:
+            path = os.path.join(self.folder, name)
+            try:
+                files.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+        files.sort()
+        for mtime, path in files[:len(files) - size]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def GetKey(self, dicom):
+        """
+        Return the key of the thumbnail of given dicom.Dicom: its
+        SOPInstanceUID (or a hash of its file name when it's missing)
+        and window and level.
+        """
+        uid = getattr(dicom.image, 'sop_instance_uid', '').strip('\x00 ')
+        if not uid:
+            uid = hashlib.md5(dicom.image.file).hexdigest()
+        return "%s_%g_%g_%d" % (uid, float(dicom.image.window),
+                                float(dicom.image.level),
+                                const.THUMBNAIL_SIZE)
+
+    def Request(self, dicom, callback):
+        """
+        Call callback with the thumbnail (width, height, rgb) of given
+        dicom.Dicom, or None if it couldn't be created. If the thumbnail
+        is in memory it's called at once, otherwise (in the GUI thread)
+        when the thumbnail is ready.
+        """
+        key = self.GetKey(dicom)
+        thumbnail = self.memory.pop(key, None)
+        if thumbnail is not None:
+            # Most recently used goes to the end
+            self.memory[key] = thumbnail
+            callback(thumbnail)
+            return
+
+        if key in self.pending:
+            self.pending[key].append(callback)
+            return
+        self.pending[key] = [callback]
+
+        if self.folder:
+            path = os.path.join(self.folder, key + ".thumb")
+        else:
+            path = None
+        args = (dicom.image.file, float(dicom.image.window),
+                float(dicom.image.level), const.THUMBNAIL_SIZE, path)
+
+        pool = self.GetPool()
+        if pool:
+            # The pool callback runs in another thread
+            pool.apply_async(_MakeThumbnail, args,
+                    callback=lambda thumbnail: wx.CallAfter(self._Done,
+                                                            key, thumbnail))
+        else:
+            self._Done(key, _MakeThumbnail(*args))
+
+    def _Done(self, key, thumbnail):
+        if thumbnail is not None:
+            self.memory[key] = thumbnail
+            while len(self.memory) > const.THUMBNAIL_CACHE_SIZE:
+                self.memory.popitem(last=False)
+
+        for callback in self.pending.pop(key, []):
+            callback(thumbnail)
+
+    def GetPool(self):
+        if self.pool is None:
+            try:
+                self.pool = multiprocessing.Pool(const.THUMBNAIL_PROCESSES or
+                                                 multiprocessing.cpu_count())
+            except OSError, e:
+                utils.debug("Not possible to create the thumbnail pool: %s" % e)
+                self.pool = False
+        return self.pool
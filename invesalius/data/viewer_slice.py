@@ -19,8 +19,6 @@
 #    detalhes.
 #--------------------------------------------------------------------------
 
-import itertools
-
 import numpy
 
 import vtk
@@ -185,6 +183,7 @@ class Viewer(wx.Panel):
                             {
                             "MouseMoveEvent": self.OnBrushMove,
                             "LeftButtonPressEvent": self.OnBrushClick,
+                            "LeftButtonReleaseEvent": self.OnBrushRelease,
                             "EnterEvent": self.OnEnterInteractor,
                             "LeaveEvent": self.OnLeaveInteractor
                             },
@@ -639,14 +638,17 @@ class Viewer(wx.Panel):
                    const.BRUSH_THRESH: 'Edit mask pixel'}
         msg = evt_msg[self._brush_cursor_op]
 
-        pixels = itertools.ifilter(self.test_operation_position,
-                                   slice_data.cursor.GetPixels())
-        ps.Publisher().sendMessage(msg, pixels)
+        # Voxels out of the volume are dropped by the mask stamp
+        ps.Publisher().sendMessage(msg, slice_data.cursor.GetPixels())
 
         # FIXME: This is idiot, but is the only way that brush operations are
         # working when cross is disabled
         ps.Publisher().sendMessage('Update slice viewer')
 
+    def OnBrushRelease(self, evt, obj):
+        # The stamps since the click are undone as one stroke
+        ps.Publisher().sendMessage('End mask stroke')
+
     def OnBrushMove(self, evt, obj):
        
         self.__set_editor_cursor_visibility(1)
@@ -681,9 +683,8 @@ class Viewer(wx.Panel):
             evt_msg = 'Edit mask pixel'
             
         if (self.left_pressed):
-            pixels = itertools.ifilter(self.test_operation_position,
+            ps.Publisher().sendMessage(evt_msg,
                                        slice_data.cursor.GetPixels())
-            ps.Publisher().sendMessage(evt_msg, pixels)
             ps.Publisher().sendMessage('Update slice viewer')
 
         self.interactor.Render()
@@ -761,9 +762,6 @@ class Viewer(wx.Panel):
         # and the last, axial.
         x, y, z = coord
 
-        proj = project.Project()
-        orig_orien = proj.original_orientation
-
         # First we fix the position origin, based on vtkActor bounds
         bounds = self.actor.GetBounds()
         bound_xi, bound_xf, bound_yi, bound_yf, bound_zi, bound_zf = bounds
@@ -780,13 +778,9 @@ class Viewer(wx.Panel):
 
         x, y, z = self._assert_coord_into_image([x, y, z])
 
-        # Based on the current orientation, we define 3D position
-        # Sagita, coronal, axial
-        coordinates = {const.AXIAL: [x, y, z],
-                const.SAGITAL: [z, x, y],
-                const.CORONAL: [x, z, y]}
-
-        coord = [int(i) for i in coordinates[orig_orien]]
+        # The volume is in the canonical layout (see reorientation), so
+        # sagital, coronal and axial are x, y and z
+        coord = [int(i) for i in (x, y, z)]
 
         # According to vtkImageData extent, we limit min and max value
         # If this is not done, a VTK Error occurs when mouse is pressed outside
@@ -1169,44 +1163,6 @@ class Viewer(wx.Panel):
 
         pos = [j + 0.01 * i for i,j in zip(n_vCamera, (x, y, z))]
 
-        #yz = [x + abs(x * 0.001), y, z]
-        #xz = [x, y - abs(y * 0.001), z]
-        #xy = [x, y, z + abs(z * 0.001)]
-
-        proj = project.Project()
-        orig_orien = proj.original_orientation
-        #pos = [x, y, z]
-
-        #if (orig_orien == const.SAGITAL):
-        #    coordinates = {"SAGITAL": xy, "CORONAL": yz, "AXIAL": xz}
-        #elif(orig_orien == const.CORONAL):
-        #    #coordinates = {"SAGITAL": yz, "CORONAL": xy, "AXIAL": xz}
-        #    if orientation == "AXIAL":
-        #        pos[2] += abs(pos[2] * 0.001)
-        #    elif orientation == "SAGITAL":
-        #        pos[0] += abs(pos[0] * 0.001)
-        #    elif orientation == "CORONAL":
-        #        pos[1] -= abs(pos[1] * 0.001)
-        #else:
-        #    #coordinates = {"SAGITAL": yz, "CORONAL": xz, "AXIAL": xy}
-        #    print "AXIAL"
-        #    if orientation == "AXIAL":
-        #        pos[2] += abs(pos[2] * 0.001)
-        #    elif orientation == "SAGITAL":
-        #        pos[0] += abs(pos[0] * 0.001)
-        #    elif orientation == "CORONAL":
-        #        pos[1] -= abs(pos[1] * 0.001)
-
-
-        #pos = [x, y, z]
-        #if orientation == "AXIAL":
-        #    pos[2] += abs(pos[2] * 0.001)
-        #elif orientation == "SAGITAL":
-        #    pos[0] += abs(pos[0] * 0.001)
-        #elif orientation == "CORONAL":
-        #    pos[1] -= abs(pos[1] * 0.001)
-        #print ">POS", pos
-        #print
         self.cross.SetFocalPoint(pos)
 
         #print
@@ -1230,19 +1186,12 @@ class Viewer(wx.Panel):
             slice_number = slice_data.number
             actor_bound = slice_data.actor.GetBounds()
 
-            yz = [x + abs(x * 0.001), y, z]
+            # Moved a bit towards the camera (see const.SLICE_CAM_POSITION)
+            yz = [x - abs(x * 0.001), y, z]
             xz = [x, y - abs(y * 0.001), z]
-            xy = [x, y, z + abs(z * 0.001)]
-
-            proj = project.Project()
-            orig_orien = proj.original_orientation
+            xy = [x, y, z - abs(z * 0.001)]
 
-            if (orig_orien == const.SAGITAL):
-                coordinates = {"SAGITAL": xy, "CORONAL": yz, "AXIAL": xz}
-            elif(orig_orien == const.CORONAL):
-                coordinates = {"SAGITAL": yz, "CORONAL": xy, "AXIAL": xz}
-            else:
-                coordinates = {"SAGITAL": yz, "CORONAL": xz, "AXIAL": xy}
+            coordinates = {"SAGITAL": yz, "CORONAL": xz, "AXIAL": xy}
 
             slice_data.cursor.SetPosition(coordinates[self.orientation])
 
@@ -1268,13 +1217,11 @@ class Viewer(wx.Panel):
 
     def __update_camera(self, slice_data):
         orientation = self.orientation
-        proj = project.Project()
-        orig_orien = proj.original_orientation
 
         cam = slice_data.renderer.GetActiveCamera()
         cam.SetFocalPoint(0, 0, 0)
-        cam.SetViewUp(const.SLICE_POSITION[orig_orien][0][self.orientation])
-        cam.SetPosition(const.SLICE_POSITION[orig_orien][1][self.orientation])
+        cam.SetViewUp(const.SLICE_CAM_VIEW_UP[orientation])
+        cam.SetPosition(const.SLICE_CAM_POSITION[orientation])
         cam.ComputeViewPlaneNormal()
         cam.OrthogonalizeViewUp()
         cam.ParallelProjectionOn()
@@ -1284,24 +1231,19 @@ class Viewer(wx.Panel):
         slice_data.renderer.ResetCamera()
         #slice_data.renderer.Render()
 
+    def __get_slice_axis(self):
+        "Image axis (0: x, 1: y, 2: z) across the slices of this viewer"
+        axis = {"SAGITAL": 0, "CORONAL": 1, "AXIAL": 2}
+        return axis[self.orientation]
+
     def __update_display_extent(self, slice_data):
-        e = self.imagedata.GetWholeExtent()
-        proj = project.Project()
+        new_extent = list(self.imagedata.GetWholeExtent())
 
         pos = slice_data.number
+        axis = self.__get_slice_axis()
+        new_extent[2 * axis] = new_extent[2 * axis + 1] = pos
 
-        x = (pos, pos, e[2], e[3], e[4], e[5])
-        y = (e[0], e[1], pos, pos, e[4], e[5])
-        z = (e[0], e[1], e[2], e[3], pos, pos)
-
-        if (proj.original_orientation == const.AXIAL):
-            new_extent = {"SAGITAL": x, "CORONAL": y, "AXIAL": z}
-        elif(proj.original_orientation == const.SAGITAL):
-            new_extent = {"SAGITAL": z,"CORONAL": x,"AXIAL": y}
-        elif(proj.original_orientation == const.CORONAL):
-            new_extent = {"SAGITAL": x,"CORONAL": z,"AXIAL": y}
-
-        slice_data.actor.SetDisplayExtent(new_extent[self.orientation])
+        slice_data.actor.SetDisplayExtent(new_extent)
         slice_data.renderer.ResetCameraClippingRange()
 
     def UpdateRender(self, evt):
@@ -1323,17 +1265,7 @@ class Viewer(wx.Panel):
         self.OnScrollBar()
     
     def UpdateSlice3D(self, pos):
-        original_orientation = project.Project().original_orientation
         pos = self.scroll.GetThumbPosition()
-        if (self.orientation == "CORONAL") and \
-            (original_orientation == const.AXIAL):
-            pos = abs(self.scroll.GetRange() - pos)
-        elif(self.orientation == "AXIAL") and \
-            (original_orientation == const.CORONAL):
-                pos = abs(self.scroll.GetRange() - pos)
-        elif(self.orientation == "AXIAL") and \
-            (original_orientation == const.SAGITAL):            
-                pos = abs(self.scroll.GetRange() - pos)
         ps.Publisher().sendMessage('Change slice from slice plane',\
                                    (self.orientation, pos))
                 
@@ -1412,6 +1344,7 @@ class Viewer(wx.Panel):
                 renderer.RemoveActor(actor)
 
         self.renderers_by_slice_number = {}
+        displayed = []
 
         for n, slice_data in enumerate(self.slice_data_list):
             ren = slice_data.renderer
@@ -1427,6 +1360,7 @@ class Viewer(wx.Panel):
                     # actor.SetVisibility(1)
                 self.__update_display_extent(slice_data)
                 slice_data.Show()
+                displayed.append(pos)
             else:
                 slice_data.Hide()
 
@@ -1439,25 +1373,17 @@ class Viewer(wx.Panel):
             #        'Update cursor single position in slice',
             #        position[self.orientation])
 
+        # Mask thresholding computes the displayed slices first
+        ps.Publisher().sendMessage('Set displayed slices',
+                                   (self.orientation, self.__get_slice_axis(),
+                                    displayed))
+
     def ChangeSliceNumber(self, pubsub_evt):
         index = pubsub_evt.data
         self.set_slice_number(index)
         self.scroll.SetThumbPosition(index)
         self.interactor.Render()
 
-    def test_operation_position(self, coord):
-        """
-        Test if coord is into the imagedata limits.
-        """
-        x, y, z = coord
-        xi, yi, zi = 0, 0, 0
-        xf, yf, zf = self.imagedata.GetDimensions()
-        if xi <= x <= xf \
-           and yi <= y <= yf\
-           and zi <= z <= zf:
-            return True
-        return False
-
     def _assert_coord_into_image(self, coord):
         extent = self.imagedata.GetWholeExtent()
         extent_min = extent[0], extent[2], extent[4]
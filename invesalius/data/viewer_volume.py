@@ -29,9 +29,7 @@ from vtk.wx.wxVTKRenderWindowInteractor import wxVTKRenderWindowInteractor
 import wx.lib.pubsub as ps
 
 import constants as const
-import data.bases as bases
 import data.vtk_utils as vtku
-import project as prj
 import style as st
 import utils
 
@@ -75,6 +73,8 @@ class Viewer(wx.Panel):
         self.ren = ren
 
         self.raycasting_volume = False
+        self.interactive = False
+        ren.AddObserver("StartEvent", self.OnStartRender)
 
         self.onclick = False
 
@@ -200,8 +200,7 @@ class Viewer(wx.Panel):
         self.ball_reference.SetCenter(x, y, z)
 
     def SetBallReferencePositionBasedOnBound(self, pubsub_evt):
-        coord = pubsub_evt.data
-        x, y, z = bases.FlipX(coord)
+        x, y, z = pubsub_evt.data
         self.ball_reference.SetCenter(x, y, z)
 
     def OnStartSeed(self, pubsub_evt):
@@ -491,7 +490,7 @@ class Viewer(wx.Panel):
     def SetVolumeCamera(self, pubsub_evt):
         
         coord_camera = pubsub_evt.data
-        coord_camera = numpy.array(bases.FlipX(coord_camera))
+        coord_camera = numpy.array(coord_camera)
         
         cam = self.ren.GetActiveCamera()
         
@@ -571,6 +570,19 @@ class Viewer(wx.Panel):
         self.raycasting_volume = False
         self.text.Hide()
 
+    def OnStartRender(self, obj, evt):
+        # While the volume is rotated, zoomed and so on, the interactor
+        # style raises the desired update rate of the render window; it's
+        # set back to the still one (and rendered again) at the end.
+        if not self.raycasting_volume:
+            return
+        interactive = self.interactor.GetRenderWindow().GetDesiredUpdateRate()\
+                > self.interactor.GetStillUpdateRate()
+        if interactive != self.interactive:
+            self.interactive = interactive
+            ps.Publisher().sendMessage('Set raycasting interactive',
+                                       interactive)
+
     def OnSize(self, evt):
         self.UpdateRender()
         self.Refresh()
@@ -650,11 +662,8 @@ class Viewer(wx.Panel):
         cam = self.ren.GetActiveCamera()
         cam.SetFocalPoint(0,0,0)
 
-        proj = prj.Project()
-        orig_orien = proj.original_orientation
-
-        xv,yv,zv = const.VOLUME_POSITION[orig_orien][0][view]
-        xp,yp,zp = const.VOLUME_POSITION[orig_orien][1][view]
+        xv,yv,zv = const.VOLUME_CAM_VIEW_UP[view]
+        xp,yp,zp = const.VOLUME_CAM_POSITION[view]
 
         cam.SetViewUp(xv,yv,zv)
         cam.SetPosition(xp,yp,zp)
@@ -674,10 +683,10 @@ class Viewer(wx.Panel):
         cube.GetTextEdgesProperty().SetColor(0,0,0)
 
         # anatomic labelling
-        cube.SetXPlusFaceText ("A")
-        cube.SetXMinusFaceText("P")
-        cube.SetYPlusFaceText ("L")
-        cube.SetYMinusFaceText("R")
+        cube.SetXPlusFaceText ("L")
+        cube.SetXMinusFaceText("R")
+        cube.SetYPlusFaceText ("P")
+        cube.SetYMinusFaceText("A")
         cube.SetZPlusFaceText ("S")
         cube.SetZMinusFaceText("I")
 
@@ -767,8 +776,6 @@ class Viewer(wx.Panel):
 
 class SlicePlane:
     def __init__(self):
-        project = prj.Project()
-        self.original_orientation = project.original_orientation
         self.Create()
         self.__bind_evt()
         self.__bind_vtk_evt()
@@ -786,34 +793,13 @@ class SlicePlane:
     def PlaneEvent(self, obj, evt):
         number = obj.GetSliceIndex()
         plane_axis = obj.GetPlaneOrientation()
-        if (self.original_orientation == const.AXIAL):
-            if (plane_axis == 0):
-                orientation = "SAGITAL"
-            elif(plane_axis == 1):
-                orientation = "CORONAL"
-                dimen = obj.GetInput().GetDimensions()
-                number = abs(dimen[0] - (number + 1))
-            else:
-                orientation = "AXIAL"
-
-        elif(self.original_orientation == const.SAGITAL):
-            if (plane_axis == 0):
-                orientation = "CORONAL"
-            elif(plane_axis == 1):
-                orientation = "AXIAL"
-                dimen = obj.GetInput().GetDimensions()
-                number = abs(dimen[0] - (number + 1))
-            else:
-                orientation = "SAGITAL"
+        # The volume is in the canonical layout (see reorientation)
+        if (plane_axis == 0):
+            orientation = "SAGITAL"
+        elif(plane_axis == 1):
+            orientation = "CORONAL"
         else:
-            if (plane_axis == 0):
-                orientation = "SAGITAL"
-            elif(plane_axis == 1):
-                orientation = "AXIAL"
-                dimen = obj.GetInput().GetDimensions()
-                number = abs(dimen[0] - (number + 1))
-            else:
-                orientation = "CORONAL"
+            orientation = "AXIAL"
 
         if (obj.GetSlicePosition() != 0.0):
             ps.Publisher().sendMessage(('Set scroll position', \
@@ -856,36 +842,6 @@ class SlicePlane:
         cursor_property = plane_z.GetCursorProperty()
         cursor_property.SetOpacity(0) 
 
-        if(self.original_orientation == const.AXIAL):
-            prop3 = plane_z.GetPlaneProperty()
-            prop3.SetColor(1, 0, 0)
-
-            prop1 = plane_x.GetPlaneProperty()
-            prop1.SetColor(0, 0, 1)
-
-            prop2 = plane_y.GetPlaneProperty()
-            prop2.SetColor(0, 1, 0)
-
-        elif(self.original_orientation == const.SAGITAL):
-            prop3 = plane_y.GetPlaneProperty()
-            prop3.SetColor(1, 0, 0)
-
-            prop1 = plane_z.GetPlaneProperty()
-            prop1.SetColor(0, 0, 1)
-
-            prop2 = plane_x.GetPlaneProperty()
-            prop2.SetColor(0, 1, 0)
-
-        else:
-            prop3 = plane_y.GetPlaneProperty()
-            prop3.SetColor(1, 0, 0)
-
-            prop1 = plane_x.GetPlaneProperty()
-            prop1.SetColor(0, 0, 1)
-
-            prop2 = plane_z.GetPlaneProperty()
-            prop2.SetColor(0, 1, 0)
-
         ps.Publisher().sendMessage('Set Widget Interactor', plane_x)
         ps.Publisher().sendMessage('Set Widget Interactor', plane_y)
         ps.Publisher().sendMessage('Set Widget Interactor', plane_z)
@@ -896,32 +852,16 @@ class SlicePlane:
         if (evt_pubsub):
             label = evt_pubsub.data
 
-            if(self.original_orientation == const.AXIAL):
-                if(label == "Axial"):
-                    self.plane_z.On()
-                elif(label == "Coronal"):
-                    self.plane_y.On()
-                elif(label == "Sagital"):
-                    self.plane_x.On()
-                    a = self.plane_x.GetTexturePlaneProperty()
-                    a.SetBackfaceCulling(0)
-                    c = self.plane_x.GetTexture()
-                    c.SetRestrictPowerOf2ImageSmaller(1)
-
-            elif(self.original_orientation == const.SAGITAL):
-                if(label == "Axial"):
-                    self.plane_y.On()
-                elif(label == "Coronal"):
-                    self.plane_x.On()
-                elif(label == "Sagital"):
-                    self.plane_z.On()
-            else:
-                if(label == "Axial"):
-                    self.plane_y.On()
-                elif(label == "Coronal"):
-                    self.plane_z.On()
-                elif(label == "Sagital"):
-                    self.plane_x.On()
+            if(label == "Axial"):
+                self.plane_z.On()
+            elif(label == "Coronal"):
+                self.plane_y.On()
+            elif(label == "Sagital"):
+                self.plane_x.On()
+                a = self.plane_x.GetTexturePlaneProperty()
+                a.SetBackfaceCulling(0)
+                c = self.plane_x.GetTexture()
+                c.SetRestrictPowerOf2ImageSmaller(1)
 
         else:
             self.plane_z.On()
@@ -934,28 +874,12 @@ class SlicePlane:
         if (evt_pubsub):
             label = evt_pubsub.data
 
-            if(self.original_orientation == const.AXIAL):
-                if(label == "Axial"):
-                    self.plane_z.Off()
-                elif(label == "Coronal"):
-                    self.plane_y.Off()
-                elif(label == "Sagital"):
-                    self.plane_x.Off()
-
-            elif(self.original_orientation == const.SAGITAL):
-                if(label == "Axial"):
-                    self.plane_y.Off()
-                elif(label == "Coronal"):
-                    self.plane_x.Off()
-                elif(label == "Sagital"):
-                    self.plane_z.Off()
-            else:
-                if(label == "Axial"):
-                    self.plane_y.Off()
-                elif(label == "Coronal"):
-                    self.plane_z.Off()
-                elif(label == "Sagital"):
-                    self.plane_x.Off()
+            if(label == "Axial"):
+                self.plane_z.Off()
+            elif(label == "Coronal"):
+                self.plane_y.Off()
+            elif(label == "Sagital"):
+                self.plane_x.Off()
         else:
             self.plane_z.Off()
             self.plane_x.Off()
@@ -969,29 +893,12 @@ class SlicePlane:
     def ChangeSlice(self, pubsub_evt = None):
         orientation, number = pubsub_evt.data
 
-        if (self.original_orientation == const.AXIAL):
-            if (orientation == "CORONAL"):
-                self.SetSliceNumber(number, "Y")
-            elif(orientation == "SAGITAL"):
-                self.SetSliceNumber(number, "X")
-            else:
-                self.SetSliceNumber(number, "Z")
-
-        elif(self.original_orientation == const.SAGITAL):
-            if (orientation == "CORONAL"):
-                self.SetSliceNumber(number, "X")
-            elif(orientation == "SAGITAL"):
-                self.SetSliceNumber(number, "Z")
-            else:
-                self.SetSliceNumber(number, "Y")
-
+        if (orientation == "CORONAL"):
+            self.SetSliceNumber(number, "Y")
+        elif(orientation == "SAGITAL"):
+            self.SetSliceNumber(number, "X")
         else:
-            if (orientation == "CORONAL"):
-                self.SetSliceNumber(number, "Z")
-            elif(orientation == "SAGITAL"):
-                self.SetSliceNumber(number, "X")
-            else:
-                self.SetSliceNumber(number, "Y")
+            self.SetSliceNumber(number, "Z")
 
         self.Render()
 
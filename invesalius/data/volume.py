@@ -18,6 +18,7 @@
 #--------------------------------------------------------------------------
 import plistlib
 import os
+import threading
 
 import numpy
 import vtk
@@ -25,7 +26,10 @@ import wx
 import wx.lib.pubsub as ps
 
 import constants as const
+import imagedata_utils as iu
 import project as prj
+import utils
+import volume_store
 
 from data import vtk_utils
 from vtk.util import numpy_support
@@ -69,6 +73,46 @@ SHADING = {
 }
 
 
+def CreateRaycastingImage(store):
+    """
+    Return the volume of given VolumeStore as unsigned short, shifted by
+    the absolute value of its minimum. The same as vtkImageShiftScale,
+    but there is no intermediate copy of the volume: it's written a
+    slice at a time into the output.
+    """
+    volume = store.array
+    nz, ny, nx = volume.shape
+    shift = abs(store.GetScalarRange()[0])
+
+    output = store.CreateArray('uint16')
+    for z in xrange(nz):
+        output[z] = numpy.clip(volume[z] + shift, 0, 65535)
+
+    return iu.ArrayToImageData(output, store.spacing, store.origin)
+
+
+def DownsampleImage(imagedata):
+    """
+    Return given image downsampled by 2 in each axis, each voxel the
+    mean of a 2x2x2 block (an odd last slice, row or column is dropped).
+    It's computed a slice at a time, so there is no temporary array of
+    the size of the volume.
+    """
+    volume = iu.ImageDataToArray(imagedata)
+    nz, ny, nx = [n / 2 for n in volume.shape]
+
+    output = volume_store.CreateArray((nz, ny, nx), volume.dtype,
+                                      volume_store.VolumeStore().out_of_core)
+    for z in xrange(nz):
+        block = volume[2*z:2*z+2, :2*ny, :2*nx].astype('uint32').sum(0)
+        output[z] = block.reshape(ny, 2, nx, 2).sum(3).sum(1) / 8
+
+    spacing = [2 * i for i in imagedata.GetSpacing()]
+    origin = [o + i / 2.0 for o, i in zip(imagedata.GetOrigin(),
+                                          imagedata.GetSpacing())]
+    return iu.ArrayToImageData(output, spacing, origin)
+
+
 class Volume():
 
     def __init__(self):
@@ -82,6 +126,8 @@ class Volume():
         self.plane = None
         self.plane_on = False
         self.volume = None
+        self.pyramid = {}
+        self.interactive = False
         self.__bind_events()
 
     def __bind_events(self):
@@ -100,12 +146,23 @@ class Volume():
         ps.Publisher().subscribe(self.OnEnableTool,
                                  'Enable raycasting tool')
         ps.Publisher().subscribe(self.OnCloseProject, 'Close project data')
+        ps.Publisher().subscribe(self.OnVolumeLoaded, 'Volume loaded')
+        ps.Publisher().subscribe(self.OnSetInteractive,
+                                 'Set raycasting interactive')
         ps.Publisher().subscribe(self.ChangeBackgroundColour,
                         'Change volume viewer background colour')
 
     def OnCloseProject(self, pubsub_evt):
         self.CloseProject()
 
+    def OnVolumeLoaded(self, pubsub_evt):
+        # Raycasting was created from the preview of the volume (see
+        # control.OnVolumeLoaded)
+        if self.exist:
+            self.imagedata = self.GetRaycastingImage()
+            self.BuildPyramid(self.imagedata)
+            self.__load_preset()
+
     def CloseProject(self):
         #if self.plane:
         #    self.plane = None
@@ -119,6 +176,8 @@ class Volume():
             self.exist = None
             ps.Publisher().sendMessage('Remove surface actor from viewer', self.volume)
             ps.Publisher().sendMessage('Disable volume cut menu')
+        self.pyramid = {}
+        self.interactive = False
 
     def OnLoadVolume(self, pubsub_evt):
         label = pubsub_evt.data
@@ -177,8 +236,9 @@ class Volume():
         self.__update_colour_table()
 
         # Update convolution filter
-        original_imagedata = self.imagedata.GetOutput()
-        imagedata = self.ApplyConvolution(original_imagedata)
+        imagedata = self.ApplyConvolution(self.GetStillImage())
+        self.final_imagedata = imagedata
+        self.interactive = False
         self.volume_mapper.SetInput(imagedata)
 
         # Update other information
@@ -445,43 +505,99 @@ class Volume():
                 #convolve.GetOutput().ReleaseDataFlagOn()
         return imagedata
 
-    def LoadVolume(self):
-        proj = prj.Project()
-        image = proj.imagedata
+    def GetRaycastingImage(self):
+        """
+        Return the unsigned short volume used by raycasting, created
+        (only once) from the VolumeStore.
+        """
+        return volume_store.VolumeStore().GetDerived('raycasting',
+                                                     CreateRaycastingImage)
 
-        number_filters = len(self.config['convolutionFilters'])
-        
-        if (prj.Project().original_orientation == const.AXIAL):
-            flip_image = True
-        else:
-            flip_image = False
-        
-        if (flip_image):    
-            update_progress= vtk_utils.ShowProgress(2 + number_filters) 
-            # Flip original vtkImageData
-            flip = vtk.vtkImageFlip()
-            flip.SetInput(image)
-            flip.SetFilteredAxis(1)
-            flip.FlipAboutOriginOn()
-            flip.AddObserver("ProgressEvent", lambda obj,evt:
-                                update_progress(flip, "Rendering..."))
-            flip.Update()
-            image = flip.GetOutput()
+    def BuildPyramid(self, imagedata):
+        """
+        Build the levels of the raycasting pyramid of given image (see
+        const.RAYCASTING_PYRAMID), each one from the previous. Levels
+        finer than the one used to render are built at once and the
+        others in a background thread.
+        """
+        self.pyramid = pyramid = {1: imagedata}
+        still_factor = self.GetStillFactor()
+        if still_factor > 1:
+            self._BuildPyramid(pyramid, imagedata, still_factor)
+        thread = threading.Thread(target=self._BuildPyramid,
+                                  args=(pyramid, imagedata))
+        thread.setDaemon(True)
+        thread.start()
+
+    def _BuildPyramid(self, pyramid, imagedata, last_factor=None):
+        factor = 1
+        for level in const.RAYCASTING_PYRAMID:
+            if last_factor and level > last_factor:
+                break
+            if level in pyramid:
+                imagedata, factor = pyramid[level], level
+                continue
+            while factor < level:
+                if min(imagedata.GetDimensions()) < 2:
+                    return
+                imagedata = DownsampleImage(imagedata)
+                factor *= 2
+            pyramid[level] = imagedata
+        utils.debug("Raycasting pyramid: levels %s" % sorted(pyramid))
+
+    def GetStillFactor(self):
+        """
+        Return the pyramid level matching the screen: the coarsest one
+        that still has as many voxels across as the screen has pixels.
+        """
+        screen = max(wx.GetDisplaySize())
+        size = max(self.pyramid[1].GetDimensions())
+        factor = 1
+        for level in const.RAYCASTING_PYRAMID:
+            if size / level < screen:
+                break
+            factor = level
+        return factor
+
+    def GetStillImage(self):
+        return self.pyramid.get(self.GetStillFactor(), self.pyramid[1])
+
+    def GetInteractiveImage(self):
+        """
+        Return the pyramid level used while the volume is rotated: the
+        first one built coarser than the still one, or None.
+        """
+        still_factor = self.GetStillFactor()
+        for level in const.RAYCASTING_PYRAMID:
+            if level > still_factor and level in self.pyramid:
+                return self.pyramid[level]
+        return None
+
+    def OnSetInteractive(self, pubsub_evt):
+        interactive = pubsub_evt.data
+        if not self.exist or interactive == self.interactive:
+            return
+        if interactive:
+            imagedata = self.GetInteractiveImage()
+            if imagedata is None:
+                return
+            self.volume_mapper.SetInput(imagedata)
         else:
-            update_progress= vtk_utils.ShowProgress(1 + number_filters)
-        
-        scale = image.GetScalarRange()
+            self.volume_mapper.SetInput(self.final_imagedata)
+        self.interactive = interactive
+
+    def LoadVolume(self):
+        number_filters = len(self.config['convolutionFilters'])
+        update_progress= vtk_utils.ShowProgress(1 + number_filters)
+
+        scale = volume_store.VolumeStore().GetScalarRange()
         self.scale = scale
 
-        cast = vtk.vtkImageShiftScale()
-        cast.SetInput(image)
-        cast.SetShift(abs(scale[0]))
-        cast.SetOutputScalarTypeToUnsignedShort()
-        cast.AddObserver("ProgressEvent", lambda obj,evt:
-                            update_progress(cast, "Rendering..."))
-        cast.Update()
-        image2 = cast
-        self.imagedata = image2
+        self.imagedata = self.GetRaycastingImage()
+        self.BuildPyramid(self.imagedata)
+        self.interactive = False
+        image2 = self.GetStillImage()
+        update_progress(1.0, "Rendering...")
         if self.config['advancedCLUT']:
             self.Create16bColorTable(scale)
             self.CreateOpacityTable(scale)
@@ -489,7 +605,7 @@ class Volume():
             self.Create8bColorTable(scale)
             self.Create8bOpacityTable(scale)
 
-        image2 = self.ApplyConvolution(image2.GetOutput(), update_progress)
+        image2 = self.ApplyConvolution(image2, update_progress)
         self.final_imagedata = image2
 
         # Changed the vtkVolumeRayCast to vtkFixedPointVolumeRayCastMapper
@@ -0,0 +1,265 @@
+#--------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+#--------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+#--------------------------------------------------------------------------
+"""
+The voxels of the project volume, kept in a single buffer.
+
+VolumeStore holds the volume as a numpy array (z, y, x) with its
+geometry, and every module which needs the volume (project, slice,
+masks, raycasting, surfaces) takes it from here: the vtkImageData and
+the arrays given are views of the same memory, never copies.
+Representations derived from the volume (eg. the unsigned short volume
+used by raycasting) are created only when they are asked for, kept
+while they are used and dropped with the volume.
+
+Volumes larger than the memory budget are kept out of core: their
+voxels are in a memory mapped file (see CreateArray), so are the masks
+and derived volumes, and only the pages in use are in memory.
+
+How to use:
+    store = VolumeStore()
+    store.SetImageData(imagedata)
+    axial = store.GetSlice(const.AXIAL, 10) # read-only view
+    raycasting = store.GetDerived(key, builder)
+"""
+
+import atexit
+import mmap
+import os
+import shutil
+import tempfile
+import weakref
+
+import numpy
+
+import constants as const
+import imagedata_utils as iu
+import utils
+
+# Number of slices thresholded at a time (see Threshold), so there is no
+# temporary array of the size of the volume
+THRESHOLD_BLOCK = 16
+
+# Folder of the files of the arrays kept out of core, created when the
+# first one is needed and removed at exit
+_folder = None
+# Memory addresses of the arrays kept out of core, with a weak reference
+# to each array which drops its address once the array is freed
+_mapped = {}
+
+
+def _GetFolder():
+    global _folder
+    if _folder is None:
+        _folder = tempfile.mkdtemp('_invesalius', dir=const.OUT_OF_CORE_FOLDER)
+        atexit.register(shutil.rmtree, _folder, True)
+    return _folder
+
+
+def CreateArray(shape, dtype, out_of_core, keep_file=False):
+    """
+    Return a new (not initialized) array of given shape and dtype. If
+    out_of_core, it's a memory mapped file: the system reads its pages
+    when they are used and writes back and drops the least recently
+    used ones when memory is short, so the array may be larger than the
+    memory. The file is removed at once, unless keep_file (eg. other
+    processes are going to open it, see RemoveFile).
+    """
+    if not out_of_core:
+        return numpy.empty(shape, dtype)
+
+    fd, path = tempfile.mkstemp('.raw', dir=_GetFolder())
+    os.close(fd)
+    array = numpy.memmap(path, dtype, 'w+', shape=shape)
+    address = array.ctypes.data
+    def Unmapped(ref):
+        if _mapped.get(address) is ref:
+            del _mapped[address]
+    _mapped[address] = weakref.ref(array, Unmapped)
+    if not keep_file:
+        RemoveFile(path)
+    return array
+
+
+def RemoveFile(path):
+    """
+    Remove the file of an array created by CreateArray, its memory map
+    is still valid. Where mapped files can't be removed (Windows), it's
+    removed at exit.
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def IsOutOfCore(array):
+    """
+    Tell if given array (or a view of its whole buffer) is out of core,
+    eg. created by CreateArray.
+    """
+    base = array
+    while base is not None:
+        if isinstance(base, (numpy.memmap, mmap.mmap)):
+            return True
+        base = getattr(base, 'base', None)
+    # Arrays taken from a vtkImageData (see iu.ImageDataToArray) don't
+    # reference the memory map, only its memory
+    ref = _mapped.get(array.ctypes.data)
+    return ref is not None and ref() is not None
+
+
+class VolumeStore(object):
+    # Only one volume is loaded per time
+    __metaclass__= utils.Singleton
+
+    def __init__(self):
+        self.Clear()
+
+    def Clear(self):
+        """
+        Drop the volume and everything derived from it.
+        """
+        self.imagedata = None
+        self.array = None
+        self.spacing = (1.0, 1.0, 1.0)
+        self.origin = (0.0, 0.0, 0.0)
+        self.scalar_range = None
+        self.derived = {}
+        self.out_of_core = False
+
+    def SetImageData(self, imagedata):
+        """
+        Make the voxel buffer of given vtkImageData the volume of the
+        project. Its memory is used as it is, there is no copy.
+        """
+        self.Clear()
+        if not imagedata:
+            return
+        self.imagedata = imagedata
+        self.array = iu.ImageDataToArray(imagedata)
+        self.spacing = imagedata.GetSpacing()
+        self.origin = imagedata.GetOrigin()
+        # Masks and derived volumes are kept out of core as the volume
+        self.out_of_core = IsOutOfCore(self.array)
+
+    def CreateArray(self, dtype=None):
+        """
+        Return a new array with the shape of the volume and given dtype
+        (the volume dtype by default), out of core if the volume is.
+        """
+        if dtype is None:
+            dtype = self.array.dtype
+        return CreateArray(self.array.shape, dtype, self.out_of_core)
+
+    def Modified(self):
+        """
+        Tell the voxels were changed (eg. more slices were loaded), so
+        the scalar range and the derived representations are computed
+        again next time they are asked for.
+        """
+        self.scalar_range = None
+        self.derived = {}
+        if self.imagedata:
+            self.imagedata.Modified()
+
+    def GetImageData(self):
+        """
+        Return the vtkImageData of the volume, None if there is no volume.
+        """
+        return self.imagedata
+
+    def GetArray(self):
+        """
+        Return a read-only view (z, y, x) of the volume.
+        """
+        view = self.array.view()
+        view.flags.writeable = False
+        return view
+
+    def GetSlice(self, orientation, index):
+        """
+        Return a read-only view of the slice of given orientation
+        (const.AXIAL, const.CORONAL or const.SAGITAL) and index.
+        """
+        if orientation == const.AXIAL:
+            image = self.array[index]
+        elif orientation == const.CORONAL:
+            image = self.array[:, index, :]
+        else:
+            image = self.array[:, :, index]
+        view = image.view()
+        view.flags.writeable = False
+        return view
+
+    def GetScalarRange(self):
+        if self.scalar_range is None:
+            self.scalar_range = (float(self.array.min()),
+                                 float(self.array.max()))
+        return self.scalar_range
+
+    def GetDerived(self, key, builder):
+        """
+        Return the representation of the volume identified by key,
+        calling builder(store) to create it the first time it's asked
+        for.
+        """
+        if key not in self.derived:
+            self.derived[key] = builder(self)
+        return self.derived[key]
+
+    def ReleaseDerived(self, key):
+        self.derived.pop(key, None)
+
+    def Threshold(self, threshold_range, out=None, cancel=None):
+        """
+        Return the mask (unsigned char) of the voxels inside
+        threshold_range (min, max): const.MASK_INVALUE inside and
+        const.MASK_OUTVALUE outside. If out (an array with the shape of
+        the volume) is given, the mask is written there. If cancel (a
+        threading.Event) is given, it's checked before each block of
+        slices and None is returned once it's set.
+        """
+        if out is None:
+            out = self.CreateArray('uint8')
+
+        for z in xrange(0, self.array.shape[0], THRESHOLD_BLOCK):
+            if cancel is not None and cancel.isSet():
+                return None
+            selection = slice(z, z + THRESHOLD_BLOCK)
+            out[selection] = self.__threshold(self.array[selection],
+                                              threshold_range)
+        return out
+
+    def ThresholdSlices(self, threshold_range, out, axis, indices):
+        """
+        Write into out the mask (as Threshold) of only the slices of
+        given indices across given array axis (0: z, 1: y, 2: x).
+        """
+        for index in indices:
+            selection = [slice(None)] * 3
+            selection[axis] = index
+            selection = tuple(selection)
+            out[selection] = self.__threshold(self.array[selection],
+                                              threshold_range)
+
+    def __threshold(self, block, threshold_range):
+        thresh_min, thresh_max = threshold_range
+        inside = (block >= thresh_min) & (block <= thresh_max)
+        return numpy.where(inside, numpy.uint8(const.MASK_INVALUE),
+                           numpy.uint8(const.MASK_OUTVALUE))
@@ -134,7 +134,7 @@ class ProgressDialog(object):
 WILDCARD_OPEN = "InVesalius 3 project (*.inv3)|*.inv3|"\
                 "All files (*.*)|*.*"
 
-WILDCARD_ANALYZE = "Analyze (*.hdr)|*.hdr|"\
+WILDCARD_ANALYZE = "Analyze/NIfTI (*.hdr;*.nii;*.nii.gz)|*.hdr;*.nii;*.nii.gz|"\
                 "All files (*.*)|*.*"
 
 def ShowOpenProjectDialog():
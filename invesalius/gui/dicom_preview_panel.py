@@ -26,11 +26,12 @@ import time
 import wx
 import vtk
 
-from vtk.util import  numpy_support
 from vtk.wx.wxVTKRenderWindowInteractor import wxVTKRenderWindowInteractor
 
 import constants as const
 from reader import dicom_reader
+import data.cine as cine
+import data.thumbnails as thumbnails
 import data.vtk_utils as vtku
 import utils
 
@@ -47,6 +48,7 @@ STR_SPC = _("Spacing: %.2f")
 STR_LOCAL = _("Location: %.2f")
 STR_PATIENT = "%s\n%s"
 STR_ACQ = _("%s %s\nMade in InVesalius")
+STR_CINE = _("%.1f fps, %d dropped frames")
 
 myEVT_PREVIEW_CLICK = wx.NewEventType()
 EVT_PREVIEW_CLICK = wx.PyEventBinder(myEVT_PREVIEW_CLICK, 1)
@@ -93,35 +95,29 @@ class SerieEvent(PreviewEvent):
 
 class DicomInfo(object):
     """
-    Keep the informations and the image used by preview.
+    Keep the informations used by preview.
     """
     def __init__(self, id, dicom, title, subtitle):
         self.id = id
         self.dicom = dicom
         self.title = title
         self.subtitle = subtitle
-        self._preview = None
         self.selected = False
 
-    @property
-    def preview(self):
-        if self._preview:
-            return self._preview
-        else:
-            colorer = vtk.vtkImageMapToWindowLevelColors()
-            colorer.SetInput(self.dicom.image.imagedata)
-            colorer.SetWindow(float(self.dicom.image.window))
-            colorer.SetLevel(float(self.dicom.image.level))
-            colorer.SetOutputFormatToRGB()
-            colorer.Update()
-
-            width, height, z = colorer.GetOutput().GetDimensions()
-
-            r = colorer.GetOutput().GetPointData().GetScalars()
-            ni = numpy_support.vtk_to_numpy(r)
-            self.img = wx.ImageFromBuffer(width, height, ni)
-            self._preview = self.img.Mirror(False)
-            return self._preview
+    def LoadPreview(self, callback):
+        """
+        Call callback with this DicomInfo and its preview (wx.Image, or
+        None if the image couldn't be read), as soon as the thumbnail is
+        ready. Images are decoded by the thumbnail workers and only the
+        most recently used thumbnails are kept in memory.
+        """
+        def set_preview(thumbnail):
+            if thumbnail is None:
+                callback(self, None)
+            else:
+                width, height, rgb = thumbnail
+                callback(self, wx.ImageFromData(width, height, rgb))
+        thumbnails.ThumbnailCache().Request(self.dicom, set_preview)
 
 
 class DicomPaintPanel(wx.Panel):
@@ -152,14 +148,15 @@ class DicomPaintPanel(wx.Panel):
 
     def SetImage(self, image):
         self.image = image
-        r_img = self._image_resize(image)
-        self.bmp = self._build_bitmap(r_img)
+        if image is not None:
+            r_img = self._image_resize(image)
+            self.bmp = self._build_bitmap(r_img)
         self.Refresh()
 
     def OnPaint(self, evt):
+        dc = wx.PaintDC(self)
+        dc.Clear()
         if self.image:
-            dc = wx.PaintDC(self)
-            dc.Clear()
             dc.DrawBitmap(self.bmp, 0, 0)
 
     def OnSize(self, evt):
@@ -239,13 +236,19 @@ class Preview(wx.Panel):
         self.SetSubtitle(dicom_info.subtitle)
         self.ID = dicom_info.id
         dicom_info.size = self.image_viewer.GetSize()
-        image = dicom_info.preview
-        self.image_viewer.SetImage(image)
+        # Until the thumbnail is ready the preview is blank
+        self.image_viewer.SetImage(None)
+        dicom_info.LoadPreview(self.OnPreviewLoaded)
         self.data = dicom_info.id
         self.select_on = dicom_info.selected
         self.Select()
         self.Update()
 
+    def OnPreviewLoaded(self, dicom_info, image):
+        # This preview may be showing another image already (scroll)
+        if dicom_info is self.dicom_info:
+            self.image_viewer.SetImage(image)
+
     def SetTitle(self, title):
         self.title.SetLabel(title)
 
@@ -614,8 +617,11 @@ class SingleImagePreview(wx.Panel):
         self.__init_vtk()
         self.__bind_evt_gui()
         self.dicom_list = []
+        self.pixels = None
+        self.frames = None
         self.nimages = 1
         self.current_index = 0
+        self.ischecked = False
         self.window_width = const.WINDOW_LEVEL[_("Bone")][0]
         self.window_level = const.WINDOW_LEVEL[_("Bone")][1]
 
@@ -651,12 +657,21 @@ class SingleImagePreview(wx.Panel):
         text_acquisition.SetSize(const.TEXT_SIZE_SMALL)
         self.text_acquisition = text_acquisition
 
+        text_cine = vtku.Text()
+        text_cine.SetJustificationToCentered()
+        text_cine.SetVerticalJustificationToBottom()
+        text_cine.SetPosition(const.TEXT_POS_HCENTRE_DOWN)
+        text_cine.SetValue("")
+        text_cine.SetSize(const.TEXT_SIZE_SMALL)
+        self.text_cine = text_cine
+
         renderer = vtk.vtkRenderer()
         renderer.AddActor(actor)
         renderer.AddActor(text_image_size.actor)
         renderer.AddActor(text_image_location.actor)
         renderer.AddActor(text_patient.actor)
         renderer.AddActor(text_acquisition.actor)
+        renderer.AddActor(text_cine.actor)
         self.renderer = renderer
 
         style = vtk.vtkInteractorStyleImage()
@@ -691,6 +706,8 @@ class SingleImagePreview(wx.Panel):
         checkbox = wx.CheckBox(self, -1, _("Auto-play"))
         self.checkbox = checkbox
 
+        self.timer = wx.Timer(self)
+
         in_sizer = wx.BoxSizer(wx.HORIZONTAL)
         in_sizer.Add(slider, 1, wx.GROW|wx.EXPAND)
         in_sizer.Add(checkbox, 0)
@@ -708,46 +725,92 @@ class SingleImagePreview(wx.Panel):
     def __bind_evt_gui(self):
         self.slider.Bind(wx.EVT_SLIDER, self.OnSlider)
         self.checkbox.Bind(wx.EVT_CHECKBOX, self.OnCheckBox)
+        self.Bind(wx.EVT_TIMER, self.OnTimer, self.timer)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self.OnDestroy)
 
     def OnSlider(self, evt):
         pos = evt.GetInt()
         self.ShowSlice(pos)
+        if self.ischecked:
+            # Frames decoded ahead of the old position are useless
+            self.StartCine()
         evt.Skip()
 
     def OnCheckBox(self, evt):
         self.ischecked = evt.IsChecked()
         if evt.IsChecked():
-            wx.CallAfter(self.OnRun)
+            self.StartCine()
+        else:
+            self.StopCine()
         evt.Skip()
 
-    def OnRun(self):
-        pos = self.slider.GetValue()
-        pos += 1
-        if not (self.nimages- pos):
+    def OnDestroy(self, evt):
+        # The window is going away, there's nothing to render
+        if evt.GetEventObject() is self:
+            self.__stop_cine()
+        evt.Skip()
+
+    def StartCine(self):
+        """
+        Play the series from the slice being shown on, at
+        const.CINE_FRAME_RATE frames per second.
+        """
+        if not self.frames:
+            return
+        self.frames.Start(self.slider.GetValue() + 1)
+        self.nshown = 0
+        self.ndropped = 0
+        self.cine_start = time.time()
+        self.timer.Start(1000 / const.CINE_FRAME_RATE)
+
+    def StopCine(self):
+        self.__stop_cine()
+        self.text_cine.SetValue("")
+        self.interactor.Render()
+
+    def __stop_cine(self):
+        self.timer.Stop()
+        if self.frames:
+            self.frames.Stop()
+
+    def OnTimer(self, evt):
+        pos = self.slider.GetValue() + 1
+        if not (self.nimages - pos):
             pos = 0
-        self.slider.SetValue(pos)
-        self.ShowSlice(pos)
-        time.sleep(0.2)
-        if self.ischecked:
-            try:
-                wx.Yield()
-            #TODO: temporary fix necessary in the Windows XP 64 Bits
-            #BUG in wxWidgets http://trac.wxwidgets.org/ticket/10896
-            except(wx._core.PyAssertionError):
-                utils.debug("wx._core.PyAssertionError")
-            finally:
-                wx.CallAfter(self.OnRun)
+        frame = self.frames.GetFrame(pos)
+        if frame is None:
+            # Not decoded yet, the current one is kept
+            self.ndropped += 1
+        else:
+            self.nshown += 1
+        elapsed = time.time() - self.cine_start
+        if elapsed:
+            self.text_cine.SetValue(STR_CINE % (self.nshown / elapsed,
+                                                self.ndropped))
+        if frame is None:
+            self.interactor.Render()
+        else:
+            self.ShowSlice(pos, frame)
 
     def SetDicomGroup(self, group):
         self.dicom_list = group.GetHandSortedList()
         self.current_index = 0
         self.nimages = len(self.dicom_list)
+        if self.frames:
+            self.frames.Stop()
+        self.frames = cine.FrameBuffer(self.dicom_list)
         # GUI
         self.slider.SetMax(self.nimages-1)
         self.slider.SetValue(0)
         self.ShowSlice()
+        if self.ischecked:
+            self.StartCine()
 
-    def ShowSlice(self, index = 0):
+    def ShowSlice(self, index = 0, frame = None):
+        """
+        Show the slice of given index. If frame is given it's the slice
+        already decoded with its window and level applied (cine).
+        """
         dicom = self.dicom_list[index]
 
         # UPDATE GUI
@@ -771,16 +834,25 @@ class SingleImagePreview(wx.Panel):
                             dicom.acquisition.time)
         self.text_acquisition.SetValue(value)
 
-        # ADJUST CONTRAST
-        window_level = dicom.image.level
-        window_width = dicom.image.window
-        colorer = vtk.vtkImageMapToWindowLevelColors()
-        colorer.SetInput(dicom.image.imagedata)
-        colorer.SetWindow(float(window_width))
-        colorer.SetLevel(float(window_level))
+        # Only the image being shown is kept decoded
+        if self.pixels and self.pixels is not dicom.image.pixels:
+            self.pixels.Release()
+            self.pixels = None
+
+        if frame is None:
+            # ADJUST CONTRAST
+            window_level = dicom.image.level
+            window_width = dicom.image.window
+            self.pixels = dicom.image.pixels
+
+            colorer = vtk.vtkImageMapToWindowLevelColors()
+            colorer.SetInput(self.pixels.GetImageData())
+            colorer.SetWindow(float(window_width))
+            colorer.SetLevel(float(window_level))
+            frame = colorer.GetOutput()
 
         # PLOT IMAGE INTO VIEWER
-        self.actor.SetInput(colorer.GetOutput())
+        self.actor.SetInput(frame)
         self.renderer.ResetCamera()
         self.interactor.Render()
 
@@ -306,6 +306,10 @@ class Frame(wx.Frame):
             self.ShowSaveAsProject()
         elif id == const.ID_PROJECT_CLOSE:
             self.CloseProject()
+        elif id == const.ID_EDIT_UNDO:
+            self.UndoMaskEdition()
+        elif id == const.ID_EDIT_REDO:
+            self.RedoMaskEdition()
         elif id == const.ID_EXIT:
             self.OnClose(None)
         elif id == const.ID_ABOUT:
@@ -332,6 +336,18 @@ class Frame(wx.Frame):
         """
         ps.Publisher().sendMessage('Show save dialog', False)
 
+    def UndoMaskEdition(self):
+        """
+        Undo the last mask edition (brush stroke or threshold).
+        """
+        ps.Publisher().sendMessage('Undo mask edition')
+
+    def RedoMaskEdition(self):
+        """
+        Redo the last mask edition undone.
+        """
+        ps.Publisher().sendMessage('Redo mask edition')
+
     def ShowGettingStarted(self):
         """
         Show getting started window.
@@ -387,6 +403,9 @@ class MenuBar(wx.MenuBar):
         self.__bind_events()
 
         self.SetStateProjectClose()
+        # Enabled while there are mask editions (see OnUpdateUndoState)
+        self.Enable(const.ID_EDIT_UNDO, False)
+        self.Enable(const.ID_EDIT_REDO, False)
 
     def __bind_events(self):
         """
@@ -398,6 +417,7 @@ class MenuBar(wx.MenuBar):
         # mail list in Oct 20 2008
         sub = ps.Publisher().subscribe
         sub(self.OnEnableState, "Enable state project")
+        sub(self.OnUpdateUndoState, "Update undo state")
 
     def __init_items(self):
         """
@@ -429,10 +449,10 @@ class MenuBar(wx.MenuBar):
         app(const.ID_EXIT, _("Exit"))
 
         # EDIT
-        #file_edit = wx.Menu()
-        #app = file_edit.Append
-        #app(wx.ID_UNDO, "Undo\tCtrl+Z")
-        #app(wx.ID_REDO, "Redo\tCtrl+Y")
+        file_edit = wx.Menu()
+        app = file_edit.Append
+        app(const.ID_EDIT_UNDO, _("Undo\tCtrl+Z"))
+        app(const.ID_EDIT_REDO, _("Redo\tCtrl+Y"))
         #app(const.ID_EDIT_LIST, "Show Undo List...")
 
         # VIEW
@@ -489,12 +509,21 @@ class MenuBar(wx.MenuBar):
 
         # Add all menus to menubar
         self.Append(file_menu, _("File"))
-        #self.Append(file_edit, "Edit")
+        self.Append(file_edit, _("Edit"))
         #self.Append(view_menu, "View")
         #self.Append(tools_menu, "Tools")
         #self.Append(options_menu, "Options")
         self.Append(help_menu, _("Help"))
 
+    def OnUpdateUndoState(self, pubsub_evt):
+        """
+        Enable undo and redo items if there are mask editions to be
+        undone or redone.
+        """
+        can_undo, can_redo = pubsub_evt.data
+        self.Enable(const.ID_EDIT_UNDO, can_undo)
+        self.Enable(const.ID_EDIT_REDO, can_redo)
+
     def OnEnableState(self, pubsub_evt):
         """
         Based on given state, enables or disables menu items which
@@ -24,6 +24,7 @@ import wx.lib.splitter as spl
 import constants as const
 import gui.dialogs as dlg
 import dicom_preview_panel as dpp
+import memory_budget
 import reader.dicom_grouper as dcm
 
 myEVT_SELECT_SERIE = wx.NewEventType()
@@ -101,9 +102,14 @@ class InnerPanel(wx.Panel):
                                      style=wx.CB_DROPDOWN|wx.CB_READONLY)
         self.combo_interval.SetSelection(0)
 
+        # Memory estimate of the selected series
+        self.txt_memory = wx.StaticText(panel, -1, "")
+
         inner_sizer = wx.BoxSizer(wx.HORIZONTAL)
         inner_sizer.AddSizer(btnsizer, 0, wx.LEFT|wx.TOP, 5)
         inner_sizer.Add(self.combo_interval, 0, wx.LEFT|wx.RIGHT|wx.TOP, 5)
+        inner_sizer.Add(self.txt_memory, 0, wx.ALIGN_CENTER_VERTICAL|
+                        wx.LEFT|wx.RIGHT|wx.TOP, 5)
         panel.SetSizer(inner_sizer)
         inner_sizer.Fit(panel)
 
@@ -126,6 +132,10 @@ class InnerPanel(wx.Panel):
 
     def _bind_pubsubevt(self):
         ps.Publisher().subscribe(self.ShowDicomPreview, "Load import panel")
+        ps.Publisher().subscribe(self.OnLoadGroup,
+                                 'Load group into import panel')
+        ps.Publisher().subscribe(self.OnLoadGroup,
+                                 'Load patient into import panel')
 
     def _bind_events(self):
         self.Bind(EVT_SELECT_SERIE, self.OnSelectSerie)
@@ -133,6 +143,7 @@ class InnerPanel(wx.Panel):
         self.Bind(EVT_SELECT_PATIENT, self.OnSelectPatient)
         self.btn_ok.Bind(wx.EVT_BUTTON, self.OnClickOk)
         self.btn_cancel.Bind(wx.EVT_BUTTON, self.OnClickCancel)
+        self.combo_interval.Bind(wx.EVT_COMBOBOX, self.OnSelectInterval)
         self.text_panel.Bind(EVT_SELECT_SERIE_TEXT, self.OnDblClickTextPanel)
 
     def ShowDicomPreview(self, pubsub_evt):
@@ -148,6 +159,46 @@ class InnerPanel(wx.Panel):
                 for group in patient.GetGroups():
                     if serie_number == group.GetDicomSample().acquisition.serie_number:
                         self.image_panel.SetSerie(group)
+                        self.ShowMemoryEstimate(group)
+
+    def OnLoadGroup(self, pubsub_evt):
+        self.ShowMemoryEstimate(pubsub_evt.data)
+
+    def OnSelectInterval(self, evt):
+        group = self.text_panel.GetSelection()
+        if group:
+            self.ShowMemoryEstimate(group)
+        evt.Skip()
+
+    def ShowMemoryEstimate(self, group):
+        """
+        Show how much memory the project created from the given group
+        (or the largest group of a patient) is going to use, and if
+        its images will be downsampled to fit in the available memory.
+        """
+        if not isinstance(group, dcm.DicomGroup):
+            group = max(group.GetGroups(), key=lambda g: g.nslices)
+
+        interval = self.combo_interval.GetSelection() + 1
+        image = group.GetDicomSample().image
+        nslices = len(range(0, group.nslices, interval))
+
+        available = memory_budget.GetAvailableMemory()
+        factor, working_set = memory_budget.ChooseResampleFactor(
+                image.size, nslices, image.bits_allocad, available)
+        text = _("Memory: %s of %s available") % \
+                (memory_budget.FormatBytes(working_set.GetTotal()),
+                 memory_budget.FormatBytes(available))
+        if factor > 1.0:
+            text += _(" (images reduced to %dx%d)") % working_set.size
+        if working_set.out_of_core:
+            text += _(" (%s kept on disk)") % \
+                    memory_budget.FormatBytes(working_set.disk)
+        self.txt_memory.SetLabel(text)
+        self.txt_memory.SetToolTipString("\n".join("%s: %s" %
+                                (name, memory_budget.FormatBytes(value))
+                                for name, value in working_set.GetItems()))
+        self.txt_memory.GetParent().Layout()
 
     def OnSelectSlice(self, evt):
         pass
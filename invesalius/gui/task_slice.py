@@ -377,7 +377,10 @@ class MaskProperties(wx.Panel):
             self.combo_mask_name.Delete(i)
 
     def __bind_events_wx(self):
-        self.Bind(grad.EVT_THRESHOLD_CHANGE, self.OnSlideChanged, self.gradient)
+        self.Bind(grad.EVT_THRESHOLD_CHANGE, self.OnSlideChanging,
+                  self.gradient)
+        self.Bind(grad.EVT_THRESHOLD_CHANGED, self.OnSlideChanged,
+                  self.gradient)
         self.combo_thresh.Bind(wx.EVT_COMBOBOX, self.OnComboThresh)
         self.combo_mask_name.Bind(wx.EVT_COMBOBOX, self.OnComboName)
         self.button_colour.Bind(csel.EVT_COLOURSELECT, self.OnSelectColour)
@@ -480,6 +483,14 @@ class MaskProperties(wx.Panel):
         self.gradient.SetMaxValue(thresh_max)
         self.OnSlideChanged(None)
 
+    def OnSlideChanging(self, evt):
+        # Only the overlay is updated while the slider is dragged, the
+        # mask is thresholded when it's released (OnSlideChanged)
+        thresh_min = self.gradient.GetMinValue()
+        thresh_max = self.gradient.GetMaxValue()
+        ps.Publisher().sendMessage('Preview threshold values',
+                                    (thresh_min, thresh_max))
+
     def OnSlideChanged(self, evt):
         thresh_min = self.gradient.GetMinValue()
         thresh_max = self.gradient.GetMaxValue()
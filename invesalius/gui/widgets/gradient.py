@@ -31,9 +31,17 @@ PUSH_WIDTH = 7
 myEVT_SLIDER_CHANGE = wx.NewEventType()
 EVT_SLIDER_CHANGE = wx.PyEventBinder(myEVT_SLIDER_CHANGE, 1)
 
+# Sent once the user has finished changing the values (eg. released the
+# slider), while the CHANGE events are sent at each step
+myEVT_SLIDER_CHANGED = wx.NewEventType()
+EVT_SLIDER_CHANGED = wx.PyEventBinder(myEVT_SLIDER_CHANGED, 1)
+
 myEVT_THRESHOLD_CHANGE = wx.NewEventType()
 EVT_THRESHOLD_CHANGE = wx.PyEventBinder(myEVT_THRESHOLD_CHANGE, 1)
 
+myEVT_THRESHOLD_CHANGED = wx.NewEventType()
+EVT_THRESHOLD_CHANGED = wx.PyEventBinder(myEVT_THRESHOLD_CHANGED, 1)
+
 class SliderEvent(wx.PyCommandEvent):
     def __init__(self , evtType, id, minRange, maxRange, minValue, maxValue):
         wx.PyCommandEvent.__init__(self, evtType, id,)
@@ -61,6 +69,7 @@ class GradientSlider(wx.Panel):
         self.maximun = maxValue
         self.colour = colour
         self.selected = 0
+        self._pressed_values = None
 
         self.CalculateControlPositions()
 
@@ -204,10 +213,19 @@ class GradientSlider(wx.Panel):
             self._delta = x - self.max_position
         elif self.selected == 3:
             self._delta = x - self.min_position
+        if self.selected:
+            self._pressed_values = (self.minimun, self.maximun)
+            # So the release is known even out of this widget
+            self.CaptureMouse()
         evt.Skip()
 
     def OnRelease(self, evt):
-        self.selected = 0
+        if self.HasCapture():
+            self.ReleaseMouse()
+        if self.selected:
+            self.selected = 0
+            if (self.minimun, self.maximun) != self._pressed_values:
+                self._generate_event(myEVT_SLIDER_CHANGED)
         evt.Skip()
 
     def OnSize(self, evt):
@@ -294,8 +312,8 @@ class GradientSlider(wx.Panel):
     def GetMinValue(self):
         return self.minimun
 
-    def _generate_event(self):
-        evt = SliderEvent(myEVT_SLIDER_CHANGE, self.GetId(), self.min_range,
+    def _generate_event(self, evt_type=myEVT_SLIDER_CHANGE):
+        evt = SliderEvent(evt_type, self.GetId(), self.min_range,
                           self.max_range, self.minimun, self.maximun)
         self.GetEventHandler().ProcessEvent(evt)
 
@@ -342,6 +360,7 @@ class GradientCtrl(wx.Panel):
 
     def _bind_events_wx(self):
         self.gradient_slider.Bind(EVT_SLIDER_CHANGE, self.OnSlider)
+        self.gradient_slider.Bind(EVT_SLIDER_CHANGED, self.OnSliderChanged)
 
         # self.spin_min.Bind(wx.lib.intctrl.EVT_INT, self.ChangeMinValue)
         self.spin_min.Bind(wx.EVT_KILL_FOCUS, self._FireSpinMinChange)
@@ -360,12 +379,16 @@ class GradientCtrl(wx.Panel):
         self.maximun = evt.maximun
         self._GenerateEvent()
 
+    def OnSliderChanged(self, evt):
+        self._GenerateEvent(myEVT_THRESHOLD_CHANGED)
+
     def _FireSpinMinChange(self, evt):
         value = int(self.spin_min.GetValue())
         if value != self.GetMinValue():
             self.gradient_slider.SetMinimun(value)
             self.minimun = value
             self._GenerateEvent()
+            self._GenerateEvent(myEVT_THRESHOLD_CHANGED)
 
     def _FireSpinMaxChange(self, evt):
         value = int(self.spin_max.GetValue())
@@ -373,6 +396,7 @@ class GradientCtrl(wx.Panel):
             self.gradient_slider.SetMaximun(value)
             self.maximun = value
             self._GenerateEvent()
+            self._GenerateEvent(myEVT_THRESHOLD_CHANGED)
 
     def OnMinMouseWheel(self, e):
         v = self.GetMinValue() + e.GetWheelRotation()/e.GetWheelDelta()
@@ -431,7 +455,7 @@ class GradientCtrl(wx.Panel):
     def GetMinValue(self):
         return self.minimun
 
-    def _GenerateEvent(self):
-        evt = SliderEvent(myEVT_THRESHOLD_CHANGE, self.GetId(), self.min_range,
+    def _GenerateEvent(self, evt_type=myEVT_THRESHOLD_CHANGE):
+        evt = SliderEvent(evt_type, self.GetId(), self.min_range,
                           self.max_range, self.minimun, self.maximun)
         self.GetEventHandler().ProcessEvent(evt)
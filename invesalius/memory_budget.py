@@ -0,0 +1,198 @@
+#--------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+#--------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+#--------------------------------------------------------------------------
+"""
+Memory budget of a project.
+
+The memory used by a project is a multiple of its volume: every mask
+is a copy of it, the raycasting and the surface creation work on their
+own copies, and so on. WorkingSet estimates each of these items given
+the volume dimensions and its sample size, and ChooseResampleFactor
+finds the minimum downsampling (in x and y) which makes the working set
+fit in the available memory.
+
+If const.OUT_OF_CORE is set, volumes which don't fit are not
+downsampled but kept out of core (see volume_store.CreateArray): the
+volume, masks and derived volumes are memory mapped files, only the
+pages in use are in memory. Saved projects are not downsampled when
+they are opened, and their volume and masks are read whole into memory
+before the volume is moved out of core (see iu.ImportVolume).
+
+How to use:
+    factor, working_set = ChooseResampleFactor((512, 512), 900, 16)
+    utils.debug(str(working_set))
+"""
+
+import platform
+
+import constants as const
+import utils
+
+# Address space a 32 bits process can actually use
+ADDRESS_SPACE_32BITS = 2 * 1024**3
+
+# Bytes of each voxel of the RGBA images (background, mask and blend)
+# created to show a slice
+RGBA_SIZE = 4
+
+# The downsampling factor is searched in these steps
+FACTOR_STEP = 0.25
+
+
+class WorkingSet(object):
+    """
+    Memory (in bytes) used by a project whose volume has the given
+    size (x, y), number of slices and bits allocated per sample,
+    after it's downsampled by factor in x and y. If out_of_core, the
+    items kept in files are counted in disk, not in the total.
+    """
+
+    def __init__(self, size, nslices, bits, factor=1.0, nmasks=None,
+                 out_of_core=False):
+        if nmasks is None:
+            nmasks = const.MEMORY_BUDGET_MASKS
+
+        x, y = size
+        self.size = (int(round(x / factor)), int(round(y / factor)))
+        self.nslices = nslices
+        self.factor = factor
+        self.nmasks = nmasks
+        self.out_of_core = out_of_core
+
+        nx, ny = self.size
+        nvoxels = nx * ny * nslices
+        # DICOM without (0028,0100) is read as 16 bits
+        sample = max(1, (bits or 16) / 8)
+
+        self.volume = nvoxels * sample
+        # Masks are unsigned char (see VolumeStore.Threshold)
+        self.masks = nmasks * nvoxels
+        # Window and level and the RGBA images are computed only to the
+        # slice being shown in each of the 3 orientations
+        plane = max(nx * ny, nx * nslices, ny * nslices)
+        self.slice = 3 * (1 + 3 * RGBA_SIZE) * plane
+        # Raycasting uses an unsigned short copy of the volume and its
+        # pyramid (1/8 + 1/64 + ... of it)
+        self.raycasting = nvoxels * 2 * 8 / 7
+        # Surface creation: the copy with the edited points and the one
+        # mapped by the surface process
+        self.surface = 2 * nvoxels * sample
+
+        self.disk = 0
+        if out_of_core:
+            # The surface process maps its input file
+            self.surface = nvoxels * sample
+            self.disk = self.volume + self.masks + self.raycasting + \
+                    self.surface
+            self.volume = self.masks = self.raycasting = self.surface = 0
+
+    def GetItems(self):
+        items = [(_("Volume"), self.volume),
+                 (_("Masks"), self.masks),
+                 (_("Slices"), self.slice),
+                 (_("Raycasting"), self.raycasting),
+                 (_("Surface"), self.surface)]
+        if self.out_of_core:
+            items = [item for item in items if item[1]]
+        return items
+
+    def GetTotal(self):
+        return sum(value for name, value in self.GetItems())
+
+    def __str__(self):
+        items = ", ".join("%s %s" % (name, FormatBytes(value))
+                          for name, value in self.GetItems())
+        text = "Working set %dx%dx%d (factor %.2f): %s; total %s" % \
+                (self.size[0], self.size[1], self.nslices, self.factor,
+                 items, FormatBytes(self.GetTotal()))
+        if self.out_of_core:
+            text += "; out of core %s" % FormatBytes(self.disk)
+        return text
+
+
+def GetAvailableMemory():
+    """
+    Return the memory (in bytes) a project may use: a fraction
+    (const.MEMORY_BUDGET_USAGE) of the RAM not used by other processes,
+    limited by the address space in 32 bits systems.
+    """
+    available = utils.get_available_memory()
+    if platform.architecture()[0] == '32bit':
+        available = min(available, ADDRESS_SPACE_32BITS)
+    return int(available * const.MEMORY_BUDGET_USAGE)
+
+
+def ChooseResampleFactor(size, nslices, bits, available=None):
+    """
+    Return the minimum factor (>= 1.0) the slices must be downsampled
+    by so the project fits in the available memory, and the WorkingSet
+    using this factor. If it doesn't fit and const.OUT_OF_CORE is set,
+    the project is kept out of core (see WorkingSet.out_of_core), which
+    is downsampled only if the slice images don't fit either. The
+    images are never reduced to less than const.MEMORY_BUDGET_MIN_SIZE
+    pixels, even if they don't fit.
+    """
+    if available is None:
+        available = GetAvailableMemory()
+
+    factor = 1.0
+    working_set = WorkingSet(size, nslices, bits, factor)
+    out_of_core = bool(const.OUT_OF_CORE) and \
+            working_set.GetTotal() > available
+    if out_of_core:
+        working_set = WorkingSet(size, nslices, bits, factor,
+                                 out_of_core=True)
+
+    while working_set.GetTotal() > available:
+        next_factor = factor + FACTOR_STEP
+        if min(size) / next_factor < const.MEMORY_BUDGET_MIN_SIZE:
+            break
+        factor = next_factor
+        working_set = WorkingSet(size, nslices, bits, factor,
+                                 out_of_core=out_of_core)
+
+    return factor, working_set
+
+
+def PredictSize(size, nslices, bits):
+    """
+    Return the size (px, py) the slices must be resampled to so the
+    project fits in the available memory, and if it must be kept out
+    of core. It's the given size if there is no need to resample.
+    """
+    available = GetAvailableMemory()
+    factor, working_set = ChooseResampleFactor(size, nslices, bits,
+                                               available)
+    utils.debug("%s; available %s" % (working_set, FormatBytes(available)))
+
+    x, y = size
+    if factor == 1.0:
+        return x, y, working_set.out_of_core
+    return x / factor, y / factor, working_set.out_of_core
+
+
+def FormatBytes(value):
+    for unit in ('bytes', 'KB', 'MB'):
+        if value < 1024:
+            break
+        value /= 1024.0
+    else:
+        unit = 'GB'
+    if unit == 'bytes':
+        return "%d %s" % (value, unit)
+    return "%.1f %s" % (value, unit)
@@ -33,7 +33,9 @@ import constants as const
 import data.imagedata_utils as iu
 import data.mask as msk
 import data.polydata_utils as pu
+import data.reorientation as reorientation
 import data.surface as srf
+import data.volume_store as volume_store
 from presets import Presets
 from reader import dicom
 from utils import Singleton, debug
@@ -50,12 +52,16 @@ class Project(object):
         self.dicom_sample = ''
         self.modality = ''
         self.original_orientation = ''
+        # Directions (patient coordinates) of the x, y and z axes of the
+        # volume, reoriented at import (see data.reorientation)
+        self.direction = ''
         self.min_threshold = ''
         self.max_threshold = ''
         self.window = ''
         self.level = ''
 
-        # Original imagedata (shouldn't be changed)
+        # Original imagedata (shouldn't be changed), kept by the
+        # VolumeStore
         self.imagedata = ''
 
         # Masks (vtkImageData)
@@ -92,6 +98,14 @@ class Project(object):
         # TODO: Future +
         # Allow insertion of new surface quality modes
 
+    def _GetImageData(self):
+        return volume_store.VolumeStore().GetImageData() or ''
+
+    def _SetImageData(self, imagedata):
+        volume_store.VolumeStore().SetImageData(imagedata)
+
+    imagedata = property(_GetImageData, _SetImageData)
+
     def Close(self):
         for name in self.__dict__:
             attr = getattr(self, name)
@@ -221,7 +235,7 @@ class Project(object):
                                 self.__dict__[key].SavePlist(filename_tmp).decode('utf-8')}
             elif key == 'dicom_sample':
                 sample_path = os.path.join(dir_temp, 'sample.dcm')
-                shutil.copy(self.dicom_sample.parser.filename,sample_path)
+                shutil.copy(self.dicom_sample.image.file,sample_path)
                 os.chmod(sample_path, stat.S_IREAD|stat.S_IWRITE)
                 
                 project[key] = 'sample.dcm'
@@ -271,7 +285,7 @@ class Project(object):
             if key == 'imagedata':
                 filepath = os.path.split(project[key]["$vti"])[-1]
                 path = os.path.join(dirpath, filepath)
-                self.imagedata = iu.Import(path)
+                self.imagedata = iu.ImportVolume(path)
             elif key == 'presets':
                 filepath = os.path.split(project[key]["#plist"])[-1]
                 path = os.path.join(dirpath, filepath)
@@ -312,6 +326,53 @@ class Project(object):
             else: 
                 setattr(self, key, project[key])
 
+        if not self.direction:
+            self.ReorientLegacyProject()
+
+    def ReorientLegacyProject(self):
+        """
+        Reorient the volume, masks, surfaces and measures of a project
+        saved before volumes were reoriented at import (it has no
+        direction) to the canonical layout (see data.reorientation).
+        """
+        directions = reorientation.LEGACY_DIRECTIONS.get(
+                self.original_orientation,
+                reorientation.LEGACY_DIRECTIONS[const.AXIAL])
+        reorient = reorientation.Reorientation(directions,
+                                        self.imagedata.GetDimensions())
+        self.direction = reorient.direction
+        debug("Reorienting project saved with no direction")
+
+        self.imagedata = iu.ReorientImage(self.imagedata, directions)
+
+        for mask in self.mask_dict.values():
+            mask.imagedata = iu.ReorientImage(mask.imagedata, directions)
+            mask.edited_points = dict(
+                    (tuple(float(i) for i in reorient.ReorientIndex(point)),
+                     colour)
+                    for point, colour in mask.edited_points.iteritems())
+
+        # Surfaces (and points picked in the volume viewer) were mirrored
+        # in y, but the coronal ones, as the volume was shown flipped
+        surface_transform = vtk.vtkTransform()
+        surface_transform.SetMatrix(reorient.GetMatrix())
+        if self.original_orientation != const.CORONAL:
+            surface_transform.Scale(1, -1, 1)
+        for surface in self.surface_dict.values():
+            surface.polydata = pu.ApplyTransform(surface.polydata,
+                                                 surface_transform)
+
+        slice_axes = {const.SAGITAL: 0, const.CORONAL: 1, const.AXIAL: 2}
+        for measure in self.measurement_dict.values():
+            if measure.location == const.SURFACE:
+                measure.points = [list(surface_transform.TransformPoint(point))
+                                  for point in measure.points]
+            else:
+                measure.points = [reorient.ReorientPoint(point)
+                                  for point in measure.points]
+                measure.slice_number = reorient.ReorientSliceNumber(
+                        slice_axes[measure.location], measure.slice_number)
+
 
 def Compress(folder, filename):
     tmpdir, tmpdir_ = os.path.split(folder)
@@ -17,51 +17,190 @@
 #    detalhes.
 #--------------------------------------------------------------------------
 
+"""
+Analyze 7.5 (.hdr/.img) and NIfTI-1 (.nii, .nii.gz, .hdr/.img pair)
+reader.
+
+Headers are read by nibabel. The file is memory mapped (copy-on-write,
+the file is never changed), unless it's compressed, and its slices are
+copied one at a time into a single buffer, reoriented to the canonical
+layout (see data.reorientation) and converted when the data can't be
+used as it is in the file: byte order other than the machine one,
+scaled data (scl_slope/scl_inter) or types VTK doesn't support. The
+buffer is kept out of core if the volume doesn't fit in the available
+memory (see memory_budget).
+
+Rows are stored from the lower left corner, as Analyze files are
+written, so they are reversed by the reorientation.
+"""
+
+import gzip
 import os
-import multiprocessing
-import tempfile
 
-import vtk
+import numpy
+
+from nibabel import AnalyzeHeader, Nifti1Header
+
+import data.imagedata_utils as iu
+import data.reorientation as reorientation
+import data.volume_store as volume_store
+import memory_budget
+import utils
+
+# Types which are given to VTK as they are, other types are converted
+# to float32
+VTK_DTYPES = ('uint8', 'int8', 'uint16', 'int16', 'uint32', 'int32',
+              'float32', 'float64')
+
+# Size of the Analyze/NIfTI-1 header and position of the NIfTI magic
+HEADER_SIZE = 348
+NIFTI_MAGIC_OFFSET = 344
+NIFTI_PAIR_MAGIC = 'ni1'
+
+
+def _IsCompressed(filename):
+    return filename.lower().endswith('.gz')
+
+
+def _Open(filename):
+    if _IsCompressed(filename):
+        return gzip.open(filename, 'rb')
+    return open(filename, 'rb')
+
+
+def GetFileNames(filename):
+    """
+    Return the header and the image file names given the name of any
+    of them (.hdr, .img, .nii or .nii.gz).
+    """
+    lower = filename.lower()
+    if lower.endswith('.nii') or lower.endswith('.nii.gz'):
+        return filename, filename
+    root, ext = os.path.splitext(filename)
+    if ext.isupper():
+        return root + '.HDR', root + '.IMG'
+    return root + '.hdr', root + '.img'
+
+
+def ReadHeader(header_filename):
+    """
+    Return the nibabel header (Nifti1Header or AnalyzeHeader) of given
+    file.
+    """
+    header_file = _Open(header_filename)
+    try:
+        binary = header_file.read(HEADER_SIZE)
+    finally:
+        header_file.close()
+
+    magic = binary[NIFTI_MAGIC_OFFSET:NIFTI_MAGIC_OFFSET + 4].strip('\x00')
+    if header_filename.lower().endswith(('.nii', '.nii.gz')) or \
+       magic == NIFTI_PAIR_MAGIC:
+        return Nifti1Header(binary)
+    return AnalyzeHeader(binary)
+
+
+def GetSlopeInter(header):
+    """
+    Return the slope and the intercept data must be scaled by, (1.0,
+    0.0) if it must not be scaled.
+    """
+    try:
+        slope, inter = header.get_slope_inter()
+    except AttributeError:
+        # Old nibabel, Analyze has no scaling
+        return 1.0, 0.0
+    if slope is None or not numpy.isfinite(slope) or slope == 0:
+        slope = 1.0
+    if inter is None or not numpy.isfinite(inter):
+        inter = 0.0
+    return float(slope), float(inter)
 
-from nibabel import AnalyzeHeader
 
 def ReadAnalyze(filename):
-    print "Reading analyze file:", filename
-
-    # Reading info from analyze header
-    header_file = open(filename)
-    header = AnalyzeHeader.from_fileobj(header_file)
-    xf, yf, zf = header.get_data_shape()[:3]
-    data_type = header.get_data_dtype().name
-    pixel_spacing = header.get_zooms()[:3]
-
-    # Mapping from numpy type to vtk type.
-    anlz_2_vtk_type = {
-                       'int16': 'SetDataScalarTypeToShort',
-                       'uint16': 'SetDataScalarTypeToUnsignedShort',
-                       'float32': 'SetDataScalarTypeToFloat'
-                      }
-
-    print header
-
-    reader = vtk.vtkImageReader()
-    reader.SetFileName(filename[:-3] + 'img')
-
-    # Setting the endiannes based on the analyze header.
-    if header.endianness == '<':
-        reader.SetDataByteOrderToLittleEndian()
-    elif header.endianness == '>':
-        reader.SetDataByteOrderToBigEndian()
-
-    reader.SetFileDimensionality(3)
-    reader.SetDataExtent(0, xf-1, 0, yf-1, 0, zf-1)
-    reader.SetDataSpacing(pixel_spacing)
-    reader.SetHeaderSize(0)
-    # reader.SetTransform(transform)
-    getattr(reader, anlz_2_vtk_type[data_type])()
-    reader.Update()
-
-    return reader.GetOutput()
+    """
+    Return the vtkImageData of given Analyze or NIfTI-1 file, or None
+    if its type isn't supported. Only the first volume of 4D images is
+    read.
+    """
+    utils.debug("Reading analyze file: %s" % filename)
+    header_filename, image_filename = GetFileNames(filename)
+    header = ReadHeader(header_filename)
+    utils.debug(str(header))
+
+    dtype = header.get_data_dtype()
+    if dtype.fields or dtype.kind == 'c':
+        utils.debug("Analyze: type %s is not supported" % dtype)
+        return None
+
+    # x, y, z of the first volume
+    shape = (tuple(header.get_data_shape()[:3]) + (1, 1))[:3]
+    spacing = (tuple(header.get_zooms()[:3]) + (1.0, 1.0))[:3]
+    offset = int(header.get_data_offset())
+    slope, inter = GetSlopeInter(header)
+
+    native = dtype.newbyteorder('=')
+    if slope != 1.0 or inter != 0.0 or native.name not in VTK_DTYPES:
+        out_dtype = numpy.dtype('float32')
+    else:
+        out_dtype = native
+
+    if _IsCompressed(image_filename):
+        data = None
+    else:
+        # Files are stored x fastest, so the transpose of the Fortran
+        # ordered (x, y, z) array is the (z, y, x) volume, no copy.
+        data = numpy.memmap(image_filename, dtype, 'c', offset, shape,
+                            order='F').T
+
+    reorient = reorientation.Reorientation(reorientation.ANALYZE_DIRECTIONS,
+                                           shape)
+    factor, working_set = memory_budget.ChooseResampleFactor(
+            shape[:2], shape[2], out_dtype.itemsize * 8)
+    utils.debug("Analyze: %s" % working_set)
+    volume = volume_store.CreateArray(reorient.GetShape(shape[::-1]),
+                                      out_dtype, working_set.out_of_core)
+
+    _CopyVolume(image_filename, data, dtype, offset, shape, slope, inter,
+                reorient.GetAcquisitionView(volume))
+
+    return iu.ArrayToImageData(volume, reorient.GetSpacing(spacing),
+                               reorient.GetOrigin((0.0, 0.0, 0.0), spacing))
+
+
+def _CopyVolume(image_filename, data, dtype, offset, shape, slope, inter,
+                volume):
+    """
+    Copy the (z, y, x) volume into given array (converted to its dtype
+    and scaled). It's read one slice at a time from data (the mapped
+    file) or from the file, if it's compressed (data is None).
+    """
+    nx, ny, nz = shape
+    scale = slope != 1.0 or inter != 0.0
+    slice_size = nx * ny * dtype.itemsize
+
+    image_file = None
+    if data is None:
+        image_file = _Open(image_filename)
+        image_file.seek(offset)
+    try:
+        for z in xrange(nz):
+            if image_file is None:
+                image = data[z]
+            else:
+                binary = image_file.read(slice_size)
+                if len(binary) < slice_size:
+                    raise IOError("%s: unexpected end of file" % image_filename)
+                image = numpy.frombuffer(binary, dtype).reshape(ny, nx)
+            if scale:
+                numpy.multiply(image, slope, volume[z])
+                volume[z] += inter
+            else:
+                volume[z] = image
+    finally:
+        if image_file is not None:
+            image_file.close()
+
 
 def ReadDirectory(dir_):
     """ 
@@ -70,7 +209,8 @@ def ReadDirectory(dir_):
     imagedata = None
     for root, sub_folders, files in os.walk(dir_):
         for file in files:
-            if file.split(".")[-1] == "hdr":
+            lower = file.lower()
+            if lower.endswith(('.hdr', '.nii', '.nii.gz')):
                 filename = os.path.join(root,file)
                 imagedata = ReadAnalyze(filename)
                 return imagedata
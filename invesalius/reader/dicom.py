@@ -17,9 +17,11 @@
 #    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
 #    detalhes.
 #---------------------------------------------------------------------
+import struct
 import time
 
 import gdcm
+import vtk
 import vtkgdcm
 import sys
 
@@ -73,6 +75,180 @@ INFO_KEYS = \
  'StudyAdmittingDiagnosis',
  ]
 
+# Header parsing stops before this element (PixelData)
+PIXEL_DATA_TAG = gdcm.Tag(0x7fe0, 0x0010)
+
+# DICOM Part 10 files have a 128 bytes preamble followed by "DICM"
+PREAMBLE_SIZE = 128
+DICOM_MAGIC = "DICM"
+# Files without preamble (ACR-NEMA, or DICOM written without it) start
+# with an element of one of these groups
+ACR_NEMA_GROUPS = (0x0000, 0x0002, 0x0008)
+# Length of the first element of a file without preamble must be less
+# than this
+ACR_NEMA_MAX_LENGTH = 1024
+
+
+def IsDicomFile(filename):
+    """
+    Cheap test of whether given file may be DICOM (or ACR-NEMA), reading
+    only its first bytes, so files which surely aren't (eg. JPEG, PDF)
+    are not given to gdcm. A file passing this test may still not be
+    read by Parser.
+    """
+    try:
+        dicom_file = open(filename, 'rb')
+        try:
+            header = dicom_file.read(PREAMBLE_SIZE + len(DICOM_MAGIC))
+        finally:
+            dicom_file.close()
+    except IOError:
+        return False
+
+    if header[PREAMBLE_SIZE:] == DICOM_MAGIC:
+        return True
+
+    # No preamble: the file must start with a data element (group,
+    # element, then either explicit VR and its length or implicit VR
+    # length), little or big endian.
+    if len(header) < 8:
+        return False
+    for byte_order in ('<', '>'):
+        group, element = struct.unpack(byte_order + 'HH', header[:4])
+        if group not in ACR_NEMA_GROUPS:
+            continue
+        vr = header[4:6]
+        if vr.isalpha() and vr.isupper():
+            return True
+        length = struct.unpack(byte_order + 'I', header[4:8])[0]
+        if length < ACR_NEMA_MAX_LENGTH:
+            return True
+    return False
+
+
+# Header elements read by Parser. They are all extracted at once, when
+# the file is parsed (see HeaderRecord); elements with binary values
+# (eg. US) are read as text through gdcm.StringFilter.
+HEADER_TAGS = ((0x0008, 0x0005), (0x0008, 0x0008), (0x0008, 0x0016),
+               (0x0008, 0x0018), (0x0008, 0x0022), (0x0008, 0x0032),
+               (0x0008, 0x0033), (0x0008, 0x0050), (0x0008, 0x0060),
+               (0x0008, 0x0080), (0x0008, 0x0081), (0x0008, 0x0090),
+               (0x0008, 0x0092), (0x0008, 0x0094), (0x0008, 0x1010),
+               (0x0008, 0x1030), (0x0008, 0x103E), (0x0008, 0x1090),
+               (0x0008, 0x2110), (0x0010, 0x0010), (0x0010, 0x0020),
+               (0x0010, 0x0030), (0x0010, 0x0040), (0x0010, 0x1010),
+               (0x0010, 0x1020), (0x0010, 0x1030), (0x0010, 0x1040),
+               (0x0010, 0x1080), (0x0010, 0x1081), (0x0010, 0x2000),
+               (0x0010, 0x2150), (0x0010, 0x2152), (0x0010, 0x2154),
+               (0x0010, 0x2180), (0x0010, 0x2297), (0x0010, 0x2298),
+               (0x0010, 0x2299), (0x0018, 0x0020), (0x0018, 0x0050),
+               (0x0018, 0x0060), (0x0018, 0x1030), (0x0018, 0x1120),
+               (0x0018, 0x1151), (0x0018, 0x1152), (0x0018, 0x1210),
+               (0x0020, 0x000D), (0x0020, 0x0010), (0x0020, 0x0011),
+               (0x0020, 0x0012), (0x0020, 0x0013), (0x0020, 0x0032),
+               (0x0020, 0x0037), (0x0020, 0x0052), (0x0020, 0x1041),
+               (0x0028, 0x0008), (0x0028, 0x0030), (0x0028, 0x1050),
+               (0x0028, 0x1051))
+FILTERED_HEADER_TAGS = ((0x0008, 0x1080), (0x0028, 0x0002),
+                        (0x0028, 0x0004), (0x0028, 0x0010),
+                        (0x0028, 0x0011), (0x0028, 0x0100),
+                        (0x0028, 0x0101), (0x0028, 0x0102),
+                        (0x0028, 0x0103))
+
+
+class HeaderRecord(object):
+    """
+    Values of the header elements Parser uses (HEADER_TAGS and
+    FILTERED_HEADER_TAGS), extracted in a single pass over the dataset.
+    Values are strings, or None if the element isn't in the file. It
+    doesn't keep any gdcm object, so it's small and may be pickled.
+    """
+    __slots__ = ('values', 'filtered_values')
+
+    _index = dict((tag, i) for i, tag in enumerate(HEADER_TAGS))
+    _filtered_index = dict((tag, i) for i, tag in
+                           enumerate(FILTERED_HEADER_TAGS))
+
+    def __init__(self, values=(), filtered_values=()):
+        self.values = values
+        self.filtered_values = filtered_values
+
+    def __getstate__(self):
+        return self.values, self.filtered_values
+
+    def __setstate__(self, state):
+        self.values, self.filtered_values = state
+
+    def GetValue(self, group, element):
+        """
+        Return the value of given element (str of its gdcm value), or
+        None if it isn't in the file.
+        """
+        return self.values[self._index[(group, element)]]
+
+    def GetFilteredValue(self, group, element):
+        """
+        Return the value of given element as given by gdcm.StringFilter,
+        "" if it isn't in the file.
+        """
+        return self.filtered_values[self._filtered_index[(group, element)]]
+
+
+def ReadHeaderRecord(gdcm_file):
+    """
+    Return the HeaderRecord of given gdcm.File.
+    """
+    ds = gdcm_file.GetDataSet()
+    values = []
+    for group, element in HEADER_TAGS:
+        tag = gdcm.Tag(group, element)
+        if ds.FindDataElement(tag):
+            values.append(str(ds.GetDataElement(tag).GetValue()))
+        else:
+            values.append(None)
+
+    sf = gdcm.StringFilter()
+    sf.SetFile(gdcm_file)
+    filtered_values = [sf.ToStringPair(gdcm.Tag(group, element))[1]
+                       for group, element in FILTERED_HEADER_TAGS]
+
+    return HeaderRecord(tuple(values), tuple(filtered_values))
+
+
+class PixelHandle(object):
+    """
+    Lazy access to the pixel data of a DICOM file. The parser only reads
+    the header, the image itself is decoded (using vtkGDCMImageReader)
+    the first time GetImageData is called.
+
+    How to use:
+      >>> handle = PixelHandle("/home/usr/0.dcm")
+      >>> imagedata = handle.GetImageData() # decoded here
+      >>> handle.Release() # decoded image may be garbage collected
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._imagedata = None
+
+    def IsLoaded(self):
+        return self._imagedata is not None
+
+    def GetImageData(self):
+        if self._imagedata is None:
+            reader = vtkgdcm.vtkGDCMImageReader()
+            reader.SetFileName(self.filename)
+            reader.Update()
+
+            imagedata = vtk.vtkImageData()
+            imagedata.ShallowCopy(reader.GetOutput())
+            self._imagedata = imagedata
+        return self._imagedata
+
+    def Release(self):
+        self._imagedata = None
+
+
 class Parser():
     """
     Medical image parser. Used to parse medical image tags.
@@ -92,13 +268,19 @@ class Parser():
     def __init__(self):
         self.filename = ""
         self.encoding = ""
-        self.vtkgdcm_reader = vtkgdcm.vtkGDCMImageReader()
+        self.pixels = None
 
     def SetFileName(self, filename):
         """
         Set file name to be parsed given its filename (this should
         include the full path of the file of interest).
 
+        Only the header is read: parsing stops before the PixelData
+        element, so no image is decoded here. Pixel access is given by
+        the lazy handle returned by GetPixelHandle. The values of all
+        elements used by the getters are extracted at once (see
+        HeaderRecord).
+
         Return True/False if file could be read.
         """
         import os.path as path
@@ -110,34 +292,47 @@ class Parser():
             filename = filename.encode('latin-1')
 
         if path.isfile(filename):
-            # Several information can be acquired from DICOM using
-            # vtkgdcm.vtkGDCMImageReader.GetMedicalImageProperties()
-            # but some tags (such as spacing) can only be achieved
-            # with gdcm.ImageReader()
             # used to parse DICOM files - similar to vtkDICOMParser
-            gdcm_reader = gdcm.ImageReader()
+            gdcm_reader = gdcm.Reader()
             #filename = filename.encode('utf-8')
 
             gdcm_reader.SetFileName(filename)
 
-            # if DICOM file is null vtkGDCMImageReader raises vtk
-            # exception
-            if not gdcm_reader.Read():
+            # Header only: stop reading when the PixelData element is
+            # reached
+            if not gdcm_reader.ReadUpToTag(PIXEL_DATA_TAG,
+                                           gdcm.TagSetType()):
                 return False
 
-            vtkgdcm_reader = self.vtkgdcm_reader
-            vtkgdcm_reader.SetFileName(filename)
-            vtkgdcm_reader.Update()
+            # Files without image dimensions (structured reports,
+            # presentation states, etc) are not images.
+            ds = gdcm_reader.GetFile().GetDataSet()
+            if not (ds.FindDataElement(gdcm.Tag(0x0028, 0x0010)) and
+                    ds.FindDataElement(gdcm.Tag(0x0028, 0x0011))):
+                return False
 
             self.filename = filename
-            self.gdcm_reader = gdcm_reader
-            self.vtkgdcm_reader = vtkgdcm_reader
+            # All the getters read the values from here, the gdcm
+            # objects aren't kept
+            self.header = ReadHeaderRecord(gdcm_reader.GetFile())
+            self.pixels = PixelHandle(filename)
             return True
 
         return False
 
+    def GetPixelHandle(self):
+        """
+        Return the lazy handle (PixelHandle) to the pixel data of the
+        parsed file.
+        """
+        return self.pixels
+
     def GetImageData(self):
-        return self.vtkgdcm_reader.GetOutput()
+        """
+        Return vtkImageData with the decoded pixel data. The file is
+        decoded the first time this is called.
+        """
+        return self.pixels.GetImageData()
 
     def __format_time(self,value):
         sp1 = value.split(".")
@@ -182,8 +377,7 @@ class Parser():
         an image. (AXIAL, SAGITTAL, CORONAL,
         OBLIQUE or UNKNOWN)
         """
-        img = self.gdcm_reader.GetImage()
-        direc_cosines = img.GetDirectionCosines()
+        direc_cosines = self.GetImagePatientOrientation()
         orientation = gdcm.Orientation()
         try:
             type = orientation.GetType(tuple(direc_cosines))
@@ -202,11 +396,7 @@ class Parser():
         to the number of columns on the image.
         Return "" if not defined.
         """
-        tag = gdcm.Tag(0x0028, 0x0011)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        sf = gdcm.StringFilter()
-        sf.SetFile(self.gdcm_reader.GetFile())
-        data = sf.ToStringPair(tag)[1]
+        data = self.header.GetFilteredValue(0x0028, 0x0011)
     
         if (data):
             return int(str(data))
@@ -219,11 +409,7 @@ class Parser():
         to the number of rows on the image.
         Return "" if not defined.
         """
-        tag = gdcm.Tag(0x0028, 0x0010)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        sf = gdcm.StringFilter()
-        sf.SetFile(self.gdcm_reader.GetFile())
-        data = sf.ToStringPair(tag)[1]
+        data = self.header.GetFilteredValue(0x0028, 0x0010)
     
         if (data):
             return int(str(data))
@@ -232,14 +418,17 @@ class Parser():
 
     def GetDimensionZ(self):
         """
-        Return float value associated to Z dimension.
-        Return "" if not defined.
+        Return float value associated to Z dimension. This is related
+        to the number of frames on the image.
+        Return 1.0 (a single frame) if not defined.
+
+        DICOM standard tag (0x0028, 0x0008) was used.
         """
-        data = self.vtkgdcm_reader.GetOutput()\
-                            .GetDimensions()[2]
-        if (data):
-            return float(data)
-        return ""
+        data = self.header.GetValue(0x0028, 0x0008)
+        if data is not None:
+            if (data):
+                return float(data)
+        return 1.0
 
     def GetImageDataType(self):
         """
@@ -310,10 +499,8 @@ class Parser():
         DICOM standard tag (0x0008,0x0022) was used.
         """
         # TODO: internationalize data
-        tag = gdcm.Tag(0x0008, 0x0022)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            date =  ds.GetDataElement(tag).GetValue()
+        date = self.header.GetValue(0x0008, 0x0022)
+        if date is not None:
             if (date) and (date != ''):
                 return self.__format_date(str(date))
         return ""
@@ -325,10 +512,8 @@ class Parser():
 
         DICOM standard tag (0x0020, 0x0012) was used.
         """
-        tag = gdcm.Tag(0x0020, 0x0012)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data =  ds.GetDataElement(tag).GetValue()
+        data = self.header.GetValue(0x0020, 0x0012)
+        if data is not None:
             if (data):
                 return int(str(data))
         return ""
@@ -339,10 +524,8 @@ class Parser():
 
         DICOM standard tag (0x0008, 0x0050) was used.
         """
-        tag = gdcm.Tag(0x0008, 0x0050)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data =  ds.GetDataElement(tag).GetValue()
+        data = self.header.GetValue(0x0008, 0x0050)
+        if data is not None:
             if (data):
                 try:
                     value = int(str(data))
@@ -359,10 +542,8 @@ class Parser():
 
         DICOM standard tag (0x0008,0x0032) was used.
         """
-        tag = gdcm.Tag(0x0008, 0x0032)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data =  ds.GetDataElement(tag).GetValue()
+        data = self.header.GetValue(0x0008, 0x0032)
+        if data is not None:
             if (data) and (data != ''):
                 return self.__format_time(str(data))
         return ""
@@ -374,13 +555,10 @@ class Parser():
 
         DICOM standard tag (0x0008,0x1080) was used.
         """
-        tag = gdcm.Tag(0x0008, 0x1080)
-        sf = gdcm.StringFilter()
-        sf.SetFile(self.gdcm_reader.GetFile())
-        res = sf.ToStringPair(tag)
+        res = self.header.GetFilteredValue(0x0008, 0x1080)
 
-        if (res[1]):
-            return int(res[1])
+        if (res):
+            return int(res)
         return ""
 
 
@@ -400,11 +578,8 @@ class Parser():
         DICOM standard tag (0x0028,0x1050) was used.
         """
 
-        tag = gdcm.Tag(0x0028, 0x1050)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0028, 0x1050)
+        if data is not None:
             if (data):
                 # Usually 'data' is a number. However, in some DICOM
                 # files, there are several values separated by '\'.
@@ -434,11 +609,8 @@ class Parser():
         DICOM standard tag (0x0028,0x1051) was used.
         """
 
-        tag = gdcm.Tag(0x0028,0x1051)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0028, 0x1051)
+        if data is not None:
             if (data):
                 # Usually 'data' is a number. However, in some DICOM
                 # files, there are several values separated by '\'.
@@ -463,10 +635,8 @@ class Parser():
 
         DICOM standard tag (0x0020, 0x0032) was used.
         """
-        tag = gdcm.Tag(0x0020, 0x0032)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data =  str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0020, 0x0032)
+        if data is not None:
             if (data):
                 return [eval(value) for value in data.split('\\')]
         return ""
@@ -479,30 +649,12 @@ class Parser():
 
         DICOM standard tag (0x0020, 0x0032) was used.
         """
-        tag = gdcm.Tag(0x0020, 0x1041)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data =  str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0020, 0x1041)
+        if data is not None:
             if (data):
                 return eval(data)
         return ""
 
-    def GetImageOffset(self):
-        """
-        Return image pixel offset (memory position).
-        Return "" if field is not defined.
-
-        DICOM standard tag (0x7fe0, 0x0010) was used.
-        """
-        tag = gdcm.Tag(0x7fe0, 0x0010)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data =  str(ds.GetDataElement(tag).GetValue())
-            if (data):
-                return int(data.split(':')[1])
-        return ""
-
-
     def GetImageSeriesNumber(self):
         """
         Return integer related to acquisition series where this
@@ -511,10 +663,8 @@ class Parser():
 
         DICOM standard tag (0x0020, 0x0011) was used.
         """
-        tag = gdcm.Tag(0x0020, 0x0011)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data =  str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0020, 0x0011)
+        if data is not None:
             if (data) and (data != '""') and (data != "None"):
                 return int(data)
         return ""
@@ -530,10 +680,8 @@ class Parser():
 
         DICOM standard tag (0x0028, 0x0030) was used.
         """
-        tag = gdcm.Tag(0x0028, 0x0030)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0028, 0x0030)
+        if data is not None:
             if (data):
                 return [eval(value) for value in data.split('\\')]
         return ""
@@ -545,10 +693,8 @@ class Parser():
 
         DICOM standard tag (0x0010, 0x1030) was used.
         """
-        tag = gdcm.Tag(0x0010, 0x1030)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0010, 0x1030)
+        if data is not None:
             if (data):
                 return float(data)
         return ""
@@ -560,10 +706,8 @@ class Parser():
 
         DICOM standard tag (0x0010, 0x1030) was used.
         """
-        tag = gdcm.Tag(0x0010, 0x1020)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0010, 0x1020)
+        if data is not None:
             if (data):
                 return float(data)
         return ""
@@ -574,10 +718,8 @@ class Parser():
 
         DICOM standard tag (0x0010, 0x1040) was used.
         """
-        tag = gdcm.Tag(0x0010, 0x1040)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0010, 0x1040)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -589,10 +731,8 @@ class Parser():
 
         DICOM standard tag (0x0010, 0x1080) was used.
         """
-        tag = gdcm.Tag(0x0010,0x1080)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0010, 0x1080)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -606,10 +746,8 @@ class Parser():
 
         DICOM standard tag (0x0010, 0x1081) was used.
         """
-        tag = gdcm.Tag(0x0010,0x1081)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0010, 0x1081)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -622,10 +760,8 @@ class Parser():
 
         DICOM standard tag (0x0010, 0x2150) was used.
         """
-        tag = gdcm.Tag(0x0010,0x2150)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0010, 0x2150)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -638,10 +774,8 @@ class Parser():
 
         DICOM standard tag (0x0010, 0x2152) was used.
         """
-        tag = gdcm.Tag(0x0010,0x2152)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0010, 0x2152)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -653,10 +787,8 @@ class Parser():
 
         DICOM standard tag (0x0010, 0x2154) was used.
         """
-        tag = gdcm.Tag(0x0010,0x2154)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0010, 0x2154)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -669,10 +801,8 @@ class Parser():
 
         DICOM standard tag (0x0010, 0x2297) was used.
         """
-        tag = gdcm.Tag(0x0010,0x2297)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0010, 0x2297)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -685,10 +815,8 @@ class Parser():
 
         DICOM standard tag (0x0010, 0x2298) was used.
         """
-        tag = gdcm.Tag(0x0010,0x2298)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0010, 0x2298)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -701,10 +829,8 @@ class Parser():
 
         DICOM standard tag (0x0010, 0x2299) was used.
         """
-        tag = gdcm.Tag(0x0010,0x2299)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0010, 0x2299)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -717,10 +843,8 @@ class Parser():
 
         DICOM standard tag (0x0010, 0x2000) was used.
         """
-        tag = gdcm.Tag(0x0010,0x2000)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0010, 0x2000)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -733,10 +857,8 @@ class Parser():
 
         DICOM standard tag (0x0008, 0x2110) was used.
         """
-        tag = gdcm.Tag(0x0008, 0x2110)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0008, 0x2110)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -750,10 +872,8 @@ class Parser():
 
         DICOM standard tag (0x0008, 0x0090) was used.
         """
-        tag = gdcm.Tag(0x0008,0x0090)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0008, 0x0090)
+        if data is not None:
             if data == "None":
                 return ""
             if (data):
@@ -768,10 +888,8 @@ class Parser():
 
         DICOM standard tag (0x0008, 0x0092) was used.
         """
-        tag = gdcm.Tag(0x0008, 0x0092)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0008, 0x0092)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -783,10 +901,8 @@ class Parser():
 
         DICOM standard tag (0x0008, 0x0094) was used.
         """
-        tag = gdcm.Tag(0x0008, 0x0094)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0008, 0x0094)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -798,10 +914,8 @@ class Parser():
 
         DICOM standard tag (0x0018, 0x1030) was used.
         """
-        tag = gdcm.Tag(0x0018, 0x1030)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0018, 0x1030)
+        if data is not None:
             if (data):
                 return data
         return None
@@ -815,10 +929,8 @@ class Parser():
 
         Critical DICOM tag (0x0008, 0x0008). Cannot be editted.
         """
-        tag = gdcm.Tag(0x0008, 0x0008)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0008, 0x0008)
+        if data is not None:
             if (data):
                 try:
                     return data.split('\\')
@@ -834,10 +946,8 @@ class Parser():
 
         Critical DICOM tag (0x0008, 0x0016). Cannot be edited.
         """
-        tag = gdcm.Tag(0x0008, 0x0016)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0008, 0x0016)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -850,10 +960,8 @@ class Parser():
 
         Critical DICOM tag (0x0008, 0x0018). Cannot be edited.
         """
-        tag = gdcm.Tag(0x0008, 0x0018)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0008, 0x0018)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -864,10 +972,8 @@ class Parser():
 
         DICOM tag (0x0008, 0x1030). Cannot be edited.
         """
-        tag = gdcm.Tag(0x0008, 0x1030)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0008, 0x1030)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -880,10 +986,8 @@ class Parser():
 
         Critical DICOM Tag (0x0020,0x000D). Cannot be edited.
         """
-        tag = gdcm.Tag(0x0020,0x000D)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0020, 0x000D)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -899,10 +1003,8 @@ class Parser():
 
         Critical DICOM tag (0x0020,0x0037). Cannot be edited.
         """
-        tag = gdcm.Tag(0x0020,0x0037)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0020, 0x0037)
+        if data is not None:
             if (data):
                 return [float(value) for value in data.split('\\')]
         return [1.0, 0.0, 0.0, 0.0, 1.0, 0.0]
@@ -916,10 +1018,8 @@ class Parser():
 
         Critical DICOM tag (0x0020,0x0037). Cannot be edited.
         """
-        tag = gdcm.Tag(0x0020,0x0037)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0020, 0x0037)
+        if data is not None:
             if (data):
                 return [float(value) for value in data.split('\\')[3:6]]
         return [0.0, 1.0, 0.0]
@@ -933,10 +1033,8 @@ class Parser():
 
         Critical DICOM tag (0x0020,0x0037). Cannot be edited.
         """
-        tag = gdcm.Tag(0x0020,0x0037)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0020, 0x0037)
+        if data is not None:
             if (data):
                 return [float(value) for value in data.split('\\')[0:3]]
         return [1.0, 0.0, 0.0]
@@ -948,10 +1046,8 @@ class Parser():
 
         Critical DICOM tag (0x0020,0x0052). Cannot be edited.
         """
-        tag = gdcm.Tag(0x0020,0x0052)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0020, 0x0052)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -963,12 +1059,9 @@ class Parser():
 
         Critical DICOM tag (0x0028,0x0002). Cannot be edited.
         """
-        tag = gdcm.Tag(0x0028, 0x0002)
-        sf = gdcm.StringFilter()
-        sf.SetFile(self.gdcm_reader.GetFile())
-        res = sf.ToStringPair(tag)
-        if (res[1]):
-            return int(res[1])
+        res = self.header.GetFilteredValue(0x0028, 0x0002)
+        if (res):
+            return int(res)
         return ""
 
     def GetPhotometricInterpretation(self):
@@ -979,12 +1072,9 @@ class Parser():
 
         Critical DICOM tag (0x0028,0x0004). Cannot be edited.
         """
-        tag = gdcm.Tag(0x0028, 0x0004)
-        sf = gdcm.StringFilter()
-        sf.SetFile(self.gdcm_reader.GetFile())
-        res = sf.ToStringPair(tag)
-        if (res[1]):
-            return res[1]
+        res = self.header.GetFilteredValue(0x0028, 0x0004)
+        if (res):
+            return res
         return ""
 
     def GetBitsStored(self):
@@ -995,12 +1085,9 @@ class Parser():
 
         Critical DICOM tag (0x0028,0x0101). Cannot be edited.
         """
-        tag = gdcm.Tag(0x0028, 0x0101)
-        sf = gdcm.StringFilter()
-        sf.SetFile(self.gdcm_reader.GetFile())
-        res = sf.ToStringPair(tag)
-        if (res[1]):
-            return int(res[1])
+        res = self.header.GetFilteredValue(0x0028, 0x0101)
+        if (res):
+            return int(res)
         return ""
 
     def GetHighBit(self):
@@ -1010,12 +1097,9 @@ class Parser():
 
         Critical DICOM tag (0x0028,0x0102). Cannot be edited.
         """
-        tag = gdcm.Tag(0x0028, 0x0102)
-        sf = gdcm.StringFilter()
-        sf.SetFile(self.gdcm_reader.GetFile())
-        res = sf.ToStringPair(tag)
-        if (res[1]):
-            return int(res[1])
+        res = self.header.GetFilteredValue(0x0028, 0x0102)
+        if (res):
+            return int(res)
         return ""
 
     def GetProtocolName(self):
@@ -1027,10 +1111,8 @@ class Parser():
 
         DICOM standard tag (0x0018, 0x1030) was used.
         """
-        tag = gdcm.Tag(0x0018, 0x1030)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0018, 0x1030)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -1051,10 +1133,8 @@ class Parser():
 
         Critical DICOM tag (0x0018, 0x0020). Cannot be edited.
         """
-        tag = gdcm.Tag(0x0018, 0x0020)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0018, 0x0020)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -1066,10 +1146,8 @@ class Parser():
 
         DICOM standard tag (0x0008, 0x0080) was used.
         """
-        tag = gdcm.Tag(0x0008, 0x0080)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data =  str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0008, 0x0080)
+        if data is not None:
             if (data):
                 return data
 
@@ -1084,10 +1162,8 @@ class Parser():
 
         DICOM standard tag (0x0008, 0x0081) was used.
         """
-        tag = gdcm.Tag(0x0008, 0x0081)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data =  str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0008, 0x0081)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -1100,10 +1176,8 @@ class Parser():
 
         Critical DICOM tag (0x0020, 0x000D). Cannot be edited.
         """
-        tag = gdcm.Tag(0x0020, 0x000D)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0020, 0x000D)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -1115,10 +1189,8 @@ class Parser():
 
         DICOM standard tag (0x0010,0x2180) was used.
         """
-        tag = gdcm.Tag(0x0010, 0x2180)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0010, 0x2180)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -1132,12 +1204,9 @@ class Parser():
 
         DICOM standard tag (0x0028, 0x0103) was used.
         """
-        tag = gdcm.Tag(0x0028, 0x0103)
-        sf = gdcm.StringFilter()
-        sf.SetFile(self.gdcm_reader.GetFile())
-        res = sf.ToStringPair(tag)
-        if (res[1]):
-            return int(res[1])
+        res = self.header.GetFilteredValue(0x0028, 0x0103)
+        if (res):
+            return int(res)
         return ""
 
     def _GetBitsAllocated(self):
@@ -1148,13 +1217,10 @@ class Parser():
 
         DICOM standard tag (0x0028, 0x0100) was used.
         """
-        tag = gdcm.Tag(0x0028, 0x0100)
-        sf = gdcm.StringFilter()
-        sf.SetFile(self.gdcm_reader.GetFile())
-        res = sf.ToStringPair(tag)
+        res = self.header.GetFilteredValue(0x0028, 0x0100)
 
-        if (res[1]):
-            return int(res[1])
+        if (res):
+            return int(res)
         return ""
     
     
@@ -1167,10 +1233,8 @@ class Parser():
         DICOM standard tag (0x0010,0x0030) was used.
         """
         # TODO: internationalize data
-        tag = gdcm.Tag(0x0010, 0x0030)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data =  ds.GetDataElement(tag).GetValue()
+        data = self.header.GetValue(0x0010, 0x0030)
+        if data is not None:
             if (data) and (data != 'None'):
                 return self.__format_date(str(data))
         return ""
@@ -1183,10 +1247,8 @@ class Parser():
 
         DICOM standard tag (0x0020,0x0010) was used.
         """
-        tag = gdcm.Tag(0x0020, 0x0010)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data =  ds.GetDataElement(tag).GetValue()
+        data = self.header.GetValue(0x0020, 0x0010)
+        if data is not None:
             if (data):
                 return str(data)
         return ""
@@ -1199,10 +1261,8 @@ class Parser():
 
         DICOM standard tag (0x0018,0x1120) was used.
         """
-        tag = gdcm.Tag(0x0018, 0x1120)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = ds.GetDataElement(tag).GetValue()
+        data = self.header.GetValue(0x0018, 0x1120)
+        if data is not None:
     
             if (data):
                 return float(str(data))
@@ -1219,10 +1279,8 @@ class Parser():
 
         DICOM standard tag (0x0010,0x0040) was used.
         """
-        tag = gdcm.Tag(0x0010, 0x0040)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = ds.GetDataElement(tag).GetValue()
+        data = self.header.GetValue(0x0010, 0x0040)
+        if data is not None:
 
             if (data):
                 return str(data)
@@ -1236,10 +1294,8 @@ class Parser():
 
         DICOM standard tag (0x0010, 0x1010) was used.
         """
-        tag = gdcm.Tag(0x0010, 0x1010)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0010, 0x1010)
+        if data is not None:
     
             if (data):
                 age = (data.split('Y')[0])
@@ -1256,10 +1312,8 @@ class Parser():
 
         DICOM standard tag (0x0010,0x0010) was used.
         """
-        tag = gdcm.Tag(0x0010, 0x0010)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0010, 0x0010)
+        if data is not None:
 
             if (data):
                 name = data.strip()
@@ -1276,10 +1330,8 @@ class Parser():
 
         DICOM standard tag (0x0010,0x0020) was used.
         """
-        tag = gdcm.Tag(0x0010, 0x0020)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0010, 0x0020)
+        if data is not None:
 
             if (data):
                 encoding = self.GetEncoding()
@@ -1296,10 +1348,8 @@ class Parser():
 
         DICOM standard tag (0x0018,0x1151) was used.
         """
-        tag = gdcm.Tag(0x0018, 0x1151)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0018, 0x1151)
+        if data is not None:
             
             if (data):
                 return data
@@ -1313,10 +1363,8 @@ class Parser():
 
         DICOM standard tag (0x0018, 0x1152) was used.
         """
-        tag = gdcm.Tag(0x0018, 0x1152)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0018, 0x1152)
+        if data is not None:
 
             if (data):
                 return float(data)
@@ -1330,10 +1378,8 @@ class Parser():
 
         DICOM standard tag (0x0018,0x0060) was used.
         """
-        tag = gdcm.Tag(0x0018, 0x0060)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0018, 0x0060)
+        if data is not None:
 
             if (data):
                 return float(data)
@@ -1347,10 +1393,8 @@ class Parser():
 
         DICOM standard tag (0x0018,0x0050) was used.
         """
-        tag = gdcm.Tag(0x0018, 0x0050)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0018, 0x0050)
+        if data is not None:
             if (data):
                 return float(data)
         return 0
@@ -1365,10 +1409,8 @@ class Parser():
 
         DICOM standard tag (0x0018,0x1210) was used.
         """
-        tag = gdcm.Tag(0x0018, 0x1210)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0018, 0x1210)
+        if data is not None:
 
             if (data):
                 return data
@@ -1382,10 +1424,8 @@ class Parser():
 
         DICOM standard tag (0x0008,0x0080) was used.
         """
-        tag = gdcm.Tag(0x0008, 0x0080)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0008, 0x0080)
+        if data is not None:
 
             if (data):
                 return data
@@ -1399,10 +1439,8 @@ class Parser():
 
         DICOM standard tag (0x0008, 0x1010) was used.
         """
-        tag = gdcm.Tag(0x0008, 0x1010)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0008, 0x1010)
+        if data is not None:
 
             if (data):
                 return data
@@ -1416,10 +1454,8 @@ class Parser():
 
         DICOM standard tag (0x0008,0x1090) was used.
         """
-        tag = gdcm.Tag(0x0008, 0x1090)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0008, 0x1090)
+        if data is not None:
 
             if (data):
                 return data
@@ -1432,10 +1468,8 @@ class Parser():
 
         DICOM standard tag (0x0008, 0x1010) was used.
         """
-        tag = gdcm.Tag(0x0008, 0x1010)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0008, 0x1010)
+        if data is not None:
 
             if (data):
                 return data
@@ -1450,10 +1484,8 @@ class Parser():
 
         DICOM standard tag (0x0008,0x0060) was used.
         """
-        tag = gdcm.Tag(0x0008, 0x0060)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0008, 0x0060)
+        if data is not None:
 
             if (data):
                 return data
@@ -1467,10 +1499,8 @@ class Parser():
 
         DICOM standard tag (0x0020,0x0013) was used.
         """
-        tag = gdcm.Tag(0x0020, 0x0013)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0020, 0x0013)
+        if data is not None:
 
             if (data):
                 return int(data)
@@ -1483,10 +1513,8 @@ class Parser():
 
         DICOM standard tag (0x0008,0x1030) was used.
         """
-        tag = gdcm.Tag(0x0008, 0x1030)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0008, 0x1030)
+        if data is not None:
 
             if (data):
                 encoding = self.GetEncoding()
@@ -1501,13 +1529,10 @@ class Parser():
         DICOM standard tag (0x0008,0x1080) was used.
         """
 
-        tag = gdcm.Tag(0x0008, 0x1080)
-        sf = gdcm.StringFilter()
-        sf.SetFile(self.gdcm_reader.GetFile())
-        res = sf.ToStringPair(tag)
+        res = self.header.GetFilteredValue(0x0008, 0x1080)
 
-        if (res[1]):
-            return str(res[1])
+        if (res):
+            return str(res)
         return ""
 
     
@@ -1516,10 +1541,8 @@ class Parser():
         Return a string with a description of the series.
         DICOM standard tag (0x0008, 0x103E) was used.
         """
-        tag = gdcm.Tag(0x0008, 0x103E)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data =  str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0008, 0x103E)
+        if data is not None:
             if data == "None":
                 return _("unnamed")
             if (data):
@@ -1531,10 +1554,8 @@ class Parser():
         Return the image time.
         DICOM standard tag (0x0008,0x0033) was used.
         """
-        tag = gdcm.Tag(0x0008, 0x0033)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            date = str(ds.GetDataElement(tag).GetValue())
+        date = self.header.GetValue(0x0008, 0x0033)
+        if date is not None:
             if (date) and (date != 'None'):
                 return  self.__format_time(date)
         return ""
@@ -1544,10 +1565,8 @@ class Parser():
         Return the acquisition time.
         DICOM standard tag (0x0008,0x032) was used.
         """
-        tag = gdcm.Tag(0x0008, 0x0032)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0008, 0x0032)
+        if data is not None:
             if (data):
                 return self.__format_time(data)
         return ""
@@ -1557,10 +1576,8 @@ class Parser():
         Return the serie number
         DICOM standard tag (0x0020, 0x0011) was used.
         """
-        tag = gdcm.Tag(0x0020, 0x0011)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            data = str(ds.GetDataElement(tag).GetValue())
+        data = self.header.GetValue(0x0020, 0x0011)
+        if data is not None:
             if (data):
                 return data
         return ""
@@ -1570,10 +1587,8 @@ class Parser():
         Return the dicom encoding
         DICOM standard tag (0x0008, 0x0005) was used.
         """
-        tag = gdcm.Tag(0x0008, 0x0005)
-        ds = self.gdcm_reader.GetFile().GetDataSet()
-        if ds.FindDataElement(tag):
-            encoding = str(ds.GetDataElement(tag).GetValue())
+        encoding = self.header.GetValue(0x0008, 0x0005)
+        if encoding is not None:
 
             if encoding != None and encoding != "None":
 
@@ -1855,6 +1870,34 @@ class Dicom(object):
         self.LoadAcquisitionInfo()
         #self.LoadStudyInfo()
 
+    def GetRecord(self):
+        """
+        Return the parsed information as a dictionary containing only
+        builtin types, so it may be pickled (eg. to be stored on the
+        DICOM index). Use SetRecord to load it back.
+        """
+        image = dict(self.image.__dict__)
+        del image['pixels']
+        return {'patient': dict(self.patient.__dict__),
+                'acquisition': dict(self.acquisition.__dict__),
+                'image': image}
+
+    def SetRecord(self, record):
+        """
+        Load information given by GetRecord, without parsing the file.
+        """
+        self.parser = None
+
+        self.patient = Patient()
+        self.patient.__dict__.update(record['patient'])
+
+        self.acquisition = Acquisition()
+        self.acquisition.__dict__.update(record['acquisition'])
+
+        self.image = Image()
+        self.image.__dict__.update(record['image'])
+        self.image.pixels = PixelHandle(self.image.file)
+
     def LoadImageInfo(self):
         self.image = Image()
         self.image.SetParser(self.parser)
@@ -1920,12 +1963,14 @@ class Image(object):
 
         self.number = parser.GetImageNumber()
         self.spacing = spacing = parser.GetPixelSpacing()
+        self.orientation = parser.GetImagePatientOrientation()
         self.orientation_label = parser.GetImageOrientationLabel()
         self.file = parser.filename
+        self.sop_instance_uid = parser.GetSOPInstanceUID()
         self.time = parser.GetImageTime()
         self.type = parser.GetImageType()
         self.size = (parser.GetDimensionX(), parser.GetDimensionY())
-        self.imagedata = parser.GetImageData()
+        self.pixels = parser.GetPixelHandle()
         self.bits_allocad = parser._GetBitsAllocated()
 
         if (parser.GetImageThickness()):
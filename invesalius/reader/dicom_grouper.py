@@ -51,12 +51,76 @@
 # <dicom.image.number> and <dicom.acquisition.series_number>
 # were swapped
 
-import gdcm
-
 import utils
 
 ORIENT_MAP = {"SAGITTAL":0, "CORONAL":1, "AXIAL":2, "OBLIQUE":2}
 
+# Maximum difference allowed between the spacings of adjacent slices
+# (and between orientation cosines) when sorting by position
+ZSPACING_TOLERANCE = 1e-10
+
+
+def GetSeriesKey(dicom):
+    """
+    Return the key of the series given dicom belongs to. Group keys are
+    this key plus an index, used to deal with Problem 2.
+    """
+    # WARN: This was defined after years of experience
+    # (2003-2009), so THINK TWICE before changing it
+    return (dicom.patient.name,
+            dicom.acquisition.id_study,
+            dicom.acquisition.serie_number,
+            dicom.image.orientation_label)
+
+
+def SortByPosition(dicom_list, tolerance=ZSPACING_TOLERANCE):
+    """
+    Sort slices by their position (Image Position Patient) along the
+    normal of the image plane, computed from the image orientation
+    cosines. This is what gdcm.IPPSorter does, but using the headers
+    already parsed instead of reading every file again.
+
+    Return (sorted_list, zspacing). As gdcm.IPPSorter, if slices have
+    different orientations, two slices are in the same position or
+    slices are not equally spaced (given tolerance), return ([], 0).
+    """
+    if not dicom_list:
+        return [], 0
+
+    orientation = dicom_list[0].image.orientation
+    for dicom in dicom_list:
+        for c1, c2 in zip(orientation, dicom.image.orientation):
+            if abs(c1 - c2) > tolerance:
+                utils.debug("SortByPosition: different orientations")
+                return [], 0
+
+    # Normal of the image plane: row cosines x column cosines
+    rx, ry, rz = orientation[:3]
+    cx, cy, cz = orientation[3:6]
+    nx = ry*cz - rz*cy
+    ny = rz*cx - rx*cz
+    nz = rx*cy - ry*cx
+
+    distances = []
+    for dicom in dicom_list:
+        x, y, z = dicom.image.position[:3]
+        distances.append((nx*x + ny*y + nz*z, dicom))
+    distances.sort(key=lambda item: item[0])
+
+    zspacing = 0
+    if len(distances) > 1:
+        zspacing = distances[1][0] - distances[0][0]
+        for (d1, dicom1), (d2, dicom2) in zip(distances, distances[1:]):
+            spacing = d2 - d1
+            if spacing <= tolerance:
+                utils.debug("SortByPosition: slices in the same position")
+                return [], 0
+            if abs(spacing - zspacing) > tolerance:
+                utils.debug("SortByPosition: slices not equally spaced")
+                return [], 0
+
+    return [dicom for distance, dicom in distances], zspacing
+
 
 class DicomGroup:
 
@@ -76,6 +140,8 @@ class DicomGroup:
         self.nslices = 0
         self.zspacing = 1
         self.dicom = None
+        # Cache of GetHandSortedList, None when slices were added
+        self._sorted_list = None
         
     def AddSlice(self, dicom):
         if not self.dicom:
@@ -88,15 +154,17 @@ class DicomGroup:
         #position, but 3D, leaving the same series.
         if not "DERIVED" in dicom.image.type:
             #if any dicom with the same position
-            if pos not in self.slices_dict.keys():
+            if pos not in self.slices_dict:
                 self.slices_dict[pos] = dicom
                 self.nslices += 1
+                self._sorted_list = None
                 return True
             else:
                 return False
         else:
             self.slices_dict[dicom.image.number] = dicom
             self.nslices += 1
+            self._sorted_list = None
             return True
 
     def GetList(self):
@@ -110,33 +178,30 @@ class DicomGroup:
         # This list will be used to create the vtkImageData
         # (interpolated)
 
-        filelist = [dicom.image.file for dicom in
-                self.slices_dict.values()]
-        
-        # Sort slices using GDCM
-        if (self.dicom.image.orientation_label <> "CORONAL"):
-            #Organize reversed image
-            sorter = gdcm.IPPSorter()
-            sorter.SetComputeZSpacing(True)
-            sorter.SetZSpacingTolerance(1e-10)
-            sorter.Sort(filelist)
-            filelist = sorter.GetFilenames()
-
-            #Getting organized image
-        return filelist
+        # Sort slices by position (using the parsed headers), any
+        # orientation: the volume is reoriented as it's loaded
+        dicom_list, zspacing = SortByPosition(self.slices_dict.values())
+        return [dicom.image.file for dicom in dicom_list]
 
 
     def GetHandSortedList(self):
         # This will be used to fix problem 1, after merging
         # single DicomGroups of same study_id and orientation
-        list_ = self.slices_dict.values()
-        dicom = list_[0]
-        axis = ORIENT_MAP[dicom.image.orientation_label]
-        #list_ = sorted(list_, key = lambda dicom:dicom.image.position[axis])
-        list_ = sorted(list_, key = lambda dicom:dicom.image.number)
-        return list_
+        if self._sorted_list is None:
+            list_ = self.slices_dict.values()
+            #list_ = sorted(list_, key = lambda dicom:dicom.image.position[axis])
+            self._sorted_list = sorted(list_,
+                                       key = lambda dicom:dicom.image.number)
+        return list(self._sorted_list)
+
+    def Load(self, update_progress=None):
+        # Slices of groups built by the grouper are already parsed, see
+        # dicomdir.DicomDirGroup
+        pass
 
     def UpdateZSpacing(self):
+        # As it sorts all slices, it's called only once per group, after
+        # all files were added (see DicomPatientGrouper.GetPatientsGroups)
         list_ = self.GetHandSortedList()
         
         if (len(list_) > 1):
@@ -162,11 +227,15 @@ class PatientGroup:
         # (dicom.patient.name, dicom.patient.id)
         self.key = ()
         self.groups_dict = {} # group_key: DicomGroup
+        # Used to deal with Problem 2 without trying each group:
+        # (series_key, slice_position): number of groups of this series
+        # which already have a slice in this position
+        self.positions_dict = {}
         self.nslices = 0
         self.ngroups = 0
         self.dicom = None
 
-    def AddFile(self, dicom, index=0):
+    def AddFile(self, dicom):
         # Given general DICOM information, we group slices according
         # to main series information (group_key)
 
@@ -174,36 +243,81 @@ class PatientGroup:
         # (2003-2009), so THINK TWICE before changing group_key
 
         # Problem 2 is being fixed by the way this method is
-        # implemented, dinamically during new dicom's addition
-        group_key = (dicom.patient.name,
-                     dicom.acquisition.id_study,
-                     dicom.acquisition.serie_number,
-                     dicom.image.orientation_label,
-                     index) # This will be used to deal with Problem 2
+        # implemented, dinamically during new dicom's addition: a slice
+        # whose position already exists in the series goes to the first
+        # group (index) of this series without that position
+        series_key = GetSeriesKey(dicom)
+        if "DERIVED" in dicom.image.type:
+            # Derived images are indexed by image number, there is no
+            # position conflict
+            index = 0
+        else:
+            position_key = (series_key, tuple(dicom.image.position))
+            index = self.positions_dict.get(position_key, 0)
+            self.positions_dict[position_key] = index + 1
+
+        group_key = series_key + (index,)
         if not self.dicom:
             self.dicom = dicom
 
         self.nslices += 1
         # Does this group exist? Best case ;)
-        if group_key not in self.groups_dict.keys():
+        group = self.groups_dict.get(group_key)
+        if group is None:
             group = DicomGroup()
             group.key = group_key
             group.title = dicom.acquisition.series_description
-            group.AddSlice(dicom)
             self.ngroups += 1
             self.groups_dict[group_key] = group
-        # Group exists... Lets try to add slice
-        else:
-            group = self.groups_dict[group_key]
-            slice_added =  group.AddSlice(dicom)
-            if not slice_added:
-                # If we're here, then Problem 2 occured
-                # TODO: Optimize recursion 
-                self.AddFile(dicom, index+1)
-                
-            #Getting the spacing in the Z axis
+        # Group exists or was created... Lets add the slice
+        group.AddSlice(dicom)
+
+    def AddGroup(self, group):
+        """
+        Add a group whose slices are already grouped (eg. a series
+        listed in a DICOMDIR).
+        """
+        index = 0
+        while group.key[:-1] + (index,) in self.groups_dict:
+            index += 1
+        group.key = group.key[:-1] + (index,)
+
+        self.groups_dict[group.key] = group
+        self.nslices += group.nslices
+        self.ngroups += 1
+        if not self.dicom:
+            self.dicom = group.GetDicomSample()
+
+    def UpdateZSpacing(self):
+        for group in self.groups_dict.values():
             group.UpdateZSpacing()
-                    
+
+    def Merge(self, patient):
+        """
+        Merge groups of another PatientGroup (of the same patient) into
+        this one.
+        """
+        series_keys = set(key[:-1] for key in self.groups_dict)
+        for group_key in sorted(patient.groups_dict,
+                                key=lambda key: key[-1]):
+            group = patient.groups_dict[group_key]
+            if group_key[:-1] not in series_keys:
+                # New series, groups and position index are taken as
+                # they are
+                self.groups_dict[group_key] = group
+                self.nslices += group.nslices
+                self.ngroups += 1
+            else:
+                # Slices may have the same position of slices already
+                # added (Problem 2), so they must be added one by one
+                for dicom in group.GetList():
+                    self.AddFile(dicom)
+        for position_key, ngroups in patient.positions_dict.iteritems():
+            if position_key[0] not in series_keys:
+                self.positions_dict[position_key] = ngroups
+        if not self.dicom:
+            self.dicom = patient.dicom
+
     def Update(self):
         # Ideally, AddFile would be sufficient for splitting DICOM
         # files into groups (series). However, this does not work for
@@ -267,7 +381,7 @@ class PatientGroup:
                 # If this method was called, there is only one slice
                 # in this group (dicom)
                 dicom = dict[group_key].GetList()[0]
-                if group_key_s not in dict_to_change.keys():
+                if group_key_s not in dict_to_change:
                     group = DicomGroup()
                     group.AddSlice(dicom)
                     dict_to_change[group_key_s] = group
@@ -332,7 +446,7 @@ class DicomPatientGrouper:
                        dicom.patient.id)
     
         # Does this patient exist?
-        if patient_key not in self.patients_dict.keys():
+        if patient_key not in self.patients_dict:
             patient = PatientGroup()
             patient.key = patient_key
             patient.AddFile(dicom)
@@ -342,6 +456,29 @@ class DicomPatientGrouper:
             patient = self.patients_dict[patient_key]
             patient.AddFile(dicom)
        
+    def AddGroup(self, group):
+        dicom = group.GetDicomSample()
+        patient_key = (dicom.patient.name,
+                       dicom.patient.id)
+
+        patient = self.patients_dict.get(patient_key)
+        if patient is None:
+            patient = PatientGroup()
+            patient.key = patient_key
+            self.patients_dict[patient_key] = patient
+        patient.AddGroup(group)
+
+    def Merge(self, grouper):
+        """
+        Merge patients and groups of another DicomPatientGrouper (eg.
+        built by a scanner worker process) into this one.
+        """
+        for patient_key, patient in grouper.patients_dict.iteritems():
+            if patient_key not in self.patients_dict:
+                self.patients_dict[patient_key] = patient
+            else:
+                self.patients_dict[patient_key].Merge(patient)
+
     def Update(self):
         for patient in self.patients_dict.values():
             patient.Update()
@@ -359,5 +496,8 @@ class DicomPatientGrouper:
         """
         plist = self.patients_dict.values()
         plist = sorted(plist, key = lambda patient:patient.key[0])
+        # Getting the spacing in the Z axis, now that all files were
+        # added
+        for patient in plist:
+            patient.UpdateZSpacing()
         return plist
-
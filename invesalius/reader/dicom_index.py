@@ -0,0 +1,185 @@
+#--------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+#--------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+#--------------------------------------------------------------------------
+"""
+Persistent index of parsed DICOM headers.
+
+Each scanned file is stored keyed by its path, size and modification
+time, so a new scan of the same folder only parses files which are new
+or were changed. Files which are not DICOM are stored too (without
+record), so they are not parsed again either.
+
+How to use:
+    index = DicomIndex()
+    cached = index.Lookup(directory)
+    # cached[filepath] -> (size, mtime, record or None)
+    ...
+    index.Store([(filepath, size, mtime, record), ...])
+    index.Close()
+"""
+
+import cPickle as pickle
+import os
+import sqlite3
+import time
+
+import constants as const
+import utils
+
+# Increase it every time the record format changes, all entries stored
+# with a different version are dropped.
+INDEX_VERSION = 4
+
+
+class DicomIndex(object):
+
+    def __init__(self, path=None, max_entries=None):
+        if path is None:
+            path = const.DICOM_INDEX_FILE
+        if max_entries is None:
+            max_entries = const.DICOM_INDEX_MAX_ENTRIES
+
+        self.path = path
+        self.max_entries = max_entries
+
+        self.conn = sqlite3.connect(path)
+        # Paths may have non-ascii characters in any encoding
+        self.conn.text_factory = str
+        self.__create_table()
+
+    def __create_table(self):
+        cursor = self.conn.cursor()
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version != INDEX_VERSION:
+            cursor.execute("DROP TABLE IF EXISTS headers")
+            cursor.execute("PRAGMA user_version = %d" % INDEX_VERSION)
+        cursor.execute("""CREATE TABLE IF NOT EXISTS headers (
+                              path TEXT PRIMARY KEY,
+                              size INTEGER,
+                              mtime REAL,
+                              accessed REAL,
+                              record BLOB)""")
+        cursor.execute("""CREATE INDEX IF NOT EXISTS headers_accessed
+                              ON headers (accessed)""")
+        self.conn.commit()
+
+    def Lookup(self, directory):
+        """
+        Return dictionary containing all entries of files inside given
+        directory (recursively). Each value is a tuple (size, mtime,
+        record), where record is None if the file isn't DICOM.
+        """
+        prefix = os.path.join(os.path.abspath(directory), '')
+        # Every path starting with prefix is between prefix and the
+        # prefix with its last character (separator) incremented.
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+        cursor = self.conn.cursor()
+        cursor.execute("""SELECT path, size, mtime, record FROM headers
+                          WHERE path >= ? AND path < ?""", (prefix, upper))
+
+        entries = {}
+        for path, size, mtime, record in cursor:
+            if record is not None:
+                try:
+                    record = pickle.loads(str(record))
+                except (pickle.UnpicklingError, EOFError, ValueError,
+                        AttributeError, ImportError):
+                    # Broken entry, it's going to be parsed again
+                    continue
+            entries[path] = (size, mtime, record)
+
+        cursor.execute("""UPDATE headers SET accessed = ?
+                          WHERE path >= ? AND path < ?""",
+                       (time.time(), prefix, upper))
+        self.conn.commit()
+        return entries
+
+    def Store(self, entries):
+        """
+        Insert or replace entries given a list of tuples (path, size,
+        mtime, record). Record is None to files that aren't DICOM.
+        """
+        now = time.time()
+        rows = []
+        for path, size, mtime, record in entries:
+            if record is not None:
+                record = sqlite3.Binary(pickle.dumps(record,
+                                                     pickle.HIGHEST_PROTOCOL))
+            rows.append((path, size, mtime, now, record))
+
+        self.conn.executemany("""INSERT OR REPLACE INTO headers
+                                 (path, size, mtime, accessed, record)
+                                 VALUES (?, ?, ?, ?, ?)""", rows)
+        self.conn.commit()
+        self.Prune()
+
+    def Remove(self, paths):
+        """
+        Remove entries of given paths (eg. files which no longer exist).
+        """
+        self.conn.executemany("DELETE FROM headers WHERE path = ?",
+                              [(path,) for path in paths])
+        self.conn.commit()
+
+    def Prune(self):
+        """
+        Keep the index with at most max_entries, removing the entries
+        which were accessed for the last time long ago.
+        """
+        cursor = self.conn.cursor()
+        nentries = cursor.execute("SELECT COUNT(*) FROM headers").fetchone()[0]
+        if nentries > self.max_entries:
+            utils.debug("DicomIndex: removing %d entries" %
+                        (nentries - self.max_entries))
+            cursor.execute("""DELETE FROM headers WHERE path IN
+                              (SELECT path FROM headers
+                               ORDER BY accessed LIMIT ?)""",
+                           (nentries - self.max_entries,))
+            self.conn.commit()
+
+    def Clear(self):
+        self.conn.execute("DELETE FROM headers")
+        self.conn.commit()
+
+    def Close(self):
+        self.conn.close()
+
+
+def OpenIndex():
+    """
+    Return the DicomIndex used by the importer, or None if the index is
+    disabled (const.DICOM_INDEX) or could not be opened.
+    """
+    if not const.DICOM_INDEX:
+        return None
+    try:
+        return DicomIndex()
+    except sqlite3.Error, e:
+        utils.debug("DicomIndex: could not open index (%s)" % e)
+        return None
+
+
+def ClearIndex():
+    """
+    Remove all entries from the index file used by the importer.
+    """
+    if os.path.isfile(const.DICOM_INDEX_FILE):
+        index = DicomIndex()
+        index.Clear()
+        index.Close()
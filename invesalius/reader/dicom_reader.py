@@ -16,27 +16,32 @@
 #    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
 #    detalhes.
 #--------------------------------------------------------------------------
+import itertools
+import multiprocessing
 import os
-import Queue
-import threading
+import time
 
 from multiprocessing import cpu_count
 
 import vtk
-import gdcm
 import wx.lib.pubsub as ps
 
 import constants as const
 import dicom
 import dicom_grouper
+import dicom_index
+import dicomdir
 import session
+import utils
 
 def ReadDicomGroup(dir_):
 
     patient_group = GetDicomGroups(dir_)
     if len(patient_group) > 0:
-        filelist, dicom, zspacing = SelectLargerDicomGroup(patient_group)
-        filelist = SortFiles(filelist, dicom)
+        group = SelectLargerDicomGroup(patient_group)
+        dicom = group.GetDicomSample()
+        zspacing = group.zspacing
+        filelist = SortFiles(group.GetList(), dicom)
         size = dicom.image.size
         bits = dicom.image.bits_allocad
 
@@ -58,92 +63,218 @@ def SelectLargerDicomGroup(patient_group):
 
     return larger_group
 
-def SortFiles(filelist, dicom):
+def SortFiles(dicom_list, dicom):
+    """
+    Given a list of dicom.Dicom, return the list of their filenames
+    sorted by position (the files aren't read again).
+    """
     # Sort slices
-    # FIXME: Coronal Crash. necessary verify
-    if (dicom.image.orientation_label <> "CORONAL"):
-        #Organize reversed image
-        sorter = gdcm.IPPSorter()
-        sorter.SetComputeZSpacing(True)
-        sorter.SetZSpacingTolerance(1e-10)
-        sorter.Sort(filelist)
-
-        #Getting organized image
-        filelist = sorter.GetFilenames()
-
-    return filelist
-
-class LoadDicom(threading.Thread):
-    def __init__(self, grouper, q, l):
-        threading.Thread.__init__(self)
-        self.grouper = grouper
-        self.q = q
-        self.l = l
-    def run(self):
-        grouper = self.grouper
-        q = self.q
-        while 1:
-            filepath = q.get()
-            if not filepath:
-                break
-            parser = dicom.Parser()
-            if parser.SetFileName(filepath):
-                dcm = dicom.Dicom()
-                self.l.acquire()
-                dcm.SetParser(parser)
-                grouper.AddFile(dcm)
-                self.l.release()
+    dicom_list, zspacing = dicom_grouper.SortByPosition(dicom_list)
+    return [dcm.image.file for dcm in dicom_list]
+
+def ParseFiles(batch):
+    """
+    Parse a batch of files, given as a list of (filepath, stat) tuples.
+    This runs inside the scanner worker processes.
+
+    Return a list of (filepath, stat, record) - record is None if the
+    file isn't DICOM -, the grouping (DicomPatientGrouper) of the DICOM
+    files in this batch, to be merged by the main process, and the
+    number of files rejected without parsing (see dicom.IsDicomFile).
+    """
+    grouper = dicom_grouper.DicomPatientGrouper()
+    parsed = []
+    nskipped = 0
+    for filepath, stat in batch:
+        if const.DICOM_SCAN_PREFILTER and not dicom.IsDicomFile(filepath):
+            nskipped += 1
+            parsed.append((filepath, stat, None))
+            continue
+        parser = dicom.Parser()
+        if parser.SetFileName(filepath):
+            dcm = dicom.Dicom()
+            dcm.SetParser(parser)
+            # gdcm objects can't be sent back to the main process
+            dcm.parser = None
+            grouper.AddFile(dcm)
+            parsed.append((filepath, stat, dcm.GetRecord()))
+        else:
+            parsed.append((filepath, stat, None))
+    return parsed, grouper, nskipped
+
+
+def ListFiles(directory, recursive=True):
+    """
+    Return the full path of all files inside given directory.
+    """
+    filepaths = []
+    if recursive:
+        walker = os.walk(directory)
+    else:
+        walker = [os.walk(directory).next()]
+    for dirpath, dirnames, filenames in walker:
+        for name in filenames:
+            filepaths.append(os.path.abspath(os.path.join(dirpath, name)))
+    return filepaths
 
 
 def yGetDicomGroups(directory, recursive=True, gui=True):
     """
     Return all full paths to DICOM files inside given directory.
+
+    If the directory has a DICOMDIR, series are taken from it (see
+    dicomdir module). Otherwise all its files are parsed and grouped by
+    yParseFiles, which gives progress (counter, nfiles, nskipped).
     """
-    nfiles = 0
-    # Find total number of files
-    if recursive:
-        for dirpath, dirnames, filenames in os.walk(directory):
-            nfiles += len(filenames)
+    # Series listed in a DICOMDIR don't need a scan
+    dicomdir_path = const.DICOMDIR_FAST_PATH and dicomdir.FindDicomDir(directory)
+    if dicomdir_path:
+        for value in dicomdir.yGetDicomDirGroups(dicomdir_path):
+            if isinstance(value, tuple):
+                if gui:
+                    yield value
+            elif value:
+                yield value
+                return
+        utils.debug("DICOMDIR couldn't be used, scanning %s" % directory)
+
+    filepaths = ListFiles(directory, recursive)
+
+    # Files already parsed in previous scans are taken from the index
+    index = dicom_index.OpenIndex()
+    if index:
+        cached = index.Lookup(directory)
     else:
-        dirpath, dirnames, filenames = os.walk(directory)
-        nfiles = len(filenames)
+        cached = {}
+
+    for value in yParseFiles(filepaths, index, cached, gui):
+        if isinstance(value, tuple):
+            yield value
+        else:
+            grouper = value
+
+    if index:
+        # Remaining entries are from files that were removed
+        if recursive:
+            removed = cached.keys()
+        else:
+            dirpath = os.path.abspath(directory)
+            removed = [path for path in cached
+                       if os.path.dirname(path) == dirpath]
+        index.Remove(removed)
+        index.Close()
+
+    #TODO: Is this commented update necessary?
+    #grouper.Update()
+    yield grouper.GetPatientsGroups()
+
+def yParseFiles(filepaths, index=None, cached=None, gui=True):
+    """
+    Parse and group given files, yielding progress (counter, nfiles,
+    nskipped) once per batch and then the DicomPatientGrouper, where
+    nskipped is the number of files not parsed because they surely
+    aren't DICOM.
+
+    Files not changed since they were stored in the index are taken
+    from cached (see dicom_index.DicomIndex.Lookup), their entries are
+    popped, and the files parsed now are stored in the index. The other
+    files are parsed by a pool of worker processes, each one parsing
+    and grouping batches of const.DICOM_SCAN_BATCH files. Partial
+    groupings are merged here.
+    """
+    t0 = time.time()
+    nfiles = len(filepaths)
+    if cached is None:
+        cached = {}
+    parsed_records = []
 
     counter = 0
+    ncached = 0
+    nskipped = 0
+    ignored_extensions = const.DICOM_SCAN_IGNORED_EXTENSIONS
+    ignored_names = const.DICOM_SCAN_IGNORED_NAMES
     grouper = dicom_grouper.DicomPatientGrouper()
-    q = Queue.Queue()
-    l = threading.Lock()
-    threads = []
-    for i in xrange(cpu_count()):
-        t = LoadDicom(grouper, q, l)
-        t.start()
-        threads.append(t)
-    # Retrieve only DICOM files, splited into groups
-    if recursive:
-        for dirpath, dirnames, filenames in os.walk(directory):
-            for name in filenames:
-                filepath = os.path.join(dirpath, name)
+    batch_size = const.DICOM_SCAN_BATCH
+    batches = []
+    batch = []
+    for filepath in filepaths:
+        name = os.path.basename(filepath).lower()
+        if os.path.splitext(name)[1] in ignored_extensions or \
+                name in ignored_names:
+            counter += 1
+            nskipped += 1
+            continue
+
+        if index is None:
+            stat = None
+        else:
+            try:
+                st = os.stat(filepath)
+            except OSError:
                 counter += 1
-                if gui:
-                    yield (counter,nfiles)
-                q.put(filepath)
-    else:
-        dirpath, dirnames, filenames = os.walk(directory)
-        for name in filenames:
-            filepath = str(os.path.join(dirpath, name))
+                continue
+            stat = (st.st_size, st.st_mtime)
+
+        entry = cached.pop(filepath, None)
+        if entry and (entry[0], entry[1]) == stat:
             counter += 1
+            ncached += 1
+            record = entry[2]
+            # Not a DICOM file
+            if record is not None:
+                dcm = dicom.Dicom()
+                dcm.SetRecord(record)
+                grouper.AddFile(dcm)
+            if gui and not (counter % batch_size):
+                yield (counter, nfiles, nskipped)
+        else:
+            batch.append((filepath, stat))
+            if len(batch) == batch_size:
+                batches.append(batch)
+                batch = []
+    if batch:
+        batches.append(batch)
+
+    nprocesses = min(const.DICOM_SCAN_PROCESSES or cpu_count(),
+                     len(batches))
+    pool = None
+    if nprocesses > 1:
+        try:
+            pool = multiprocessing.Pool(nprocesses)
+        except OSError, e:
+            utils.debug("Not possible to create the scanner pool: %s" % e)
+    if pool:
+        results = pool.imap_unordered(ParseFiles, batches)
+    else:
+        results = itertools.imap(ParseFiles, batches)
+
+    try:
+        for parsed, partial_grouper, batch_skipped in results:
+            counter += len(parsed)
+            nskipped += batch_skipped
+            grouper.Merge(partial_grouper)
+            if index:
+                parsed_records.extend((filepath, stat[0], stat[1], record)
+                                      for filepath, stat, record in parsed)
             if gui:
-                yield (counter,nfiles)
-            q.put(filepath)
+                yield (counter, nfiles, nskipped)
+        if pool:
+            pool.close()
+            pool.join()
+    finally:
+        # In case the scan was canceled
+        if pool:
+            pool.terminate()
 
-    for t in threads:
-        q.put(0)
+    utils.debug("Scanned %d files (%d from index, %d skipped) in %.2f s "
+                "using %d process(es)" % (nfiles, ncached, nskipped,
+                                          time.time() - t0,
+                                          max(nprocesses, 1)))
 
-    for t in threads:
-        t.join()
+    if index:
+        index.Store(parsed_records)
 
-    #TODO: Is this commented update necessary?
-    #grouper.Update()
-    yield grouper.GetPatientsGroups()
+    yield grouper
 
 def GetDicomGroups(directory, recursive=True):
     return yGetDicomGroups(directory, recursive, gui=False).next()
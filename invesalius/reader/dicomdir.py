@@ -0,0 +1,270 @@
+#--------------------------------------------------------------------------
+# Software:     InVesalius - Software de Reconstrucao 3D de Imagens Medicas
+# Copyright:    (C) 2001  Centro de Pesquisas Renato Archer
+# Homepage:     http://www.softwarepublico.gov.br
+# Contact:      invesalius@cti.gov.br
+# License:      GNU - GPL 2 (LICENSE.txt/LICENCA.txt)
+#--------------------------------------------------------------------------
+#    Este programa e software livre; voce pode redistribui-lo e/ou
+#    modifica-lo sob os termos da Licenca Publica Geral GNU, conforme
+#    publicada pela Free Software Foundation; de acordo com a versao 2
+#    da Licenca.
+#
+#    Este programa eh distribuido na expectativa de ser util, mas SEM
+#    QUALQUER GARANTIA; sem mesmo a garantia implicita de
+#    COMERCIALIZACAO ou de ADEQUACAO A QUALQUER PROPOSITO EM
+#    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
+#    detalhes.
+#--------------------------------------------------------------------------
+"""
+Fast path to import directories containing a DICOMDIR (eg. CDs and
+PACS exports).
+
+The DICOMDIR lists the patients, studies, series and the files of each
+series, so the directory doesn't need to be scanned: only one file of
+each series (its sample, shown in the import panel) is parsed. The
+other files of a series are parsed only when it's needed (see
+DicomDirGroup.Load), as the files of a directory scan: taken from the
+DICOM index or parsed by the scanner pool (see dicom_reader.yParseFiles).
+
+How to use:
+    path = FindDicomDir(directory)
+    if path:
+        for value in yGetDicomDirGroups(path):
+            ...
+"""
+
+import os
+import time
+
+import gdcm
+
+import dicom
+import dicom_grouper
+import dicom_index
+import utils
+
+# DICOMDIR elements
+DIRECTORY_RECORD_SEQUENCE = (0x0004, 0x1220)
+DIRECTORY_RECORD_TYPE = (0x0004, 0x1430)
+REFERENCED_FILE_ID = (0x0004, 0x1500)
+
+# Record types whose files are slices of the series
+IMAGE_RECORDS = ("IMAGE",)
+
+
+def FindDicomDir(directory):
+    """
+    Return the path of the DICOMDIR file in given directory (not in its
+    subdirectories), or None if there isn't one.
+    """
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return None
+    for name in names:
+        path = os.path.join(directory, name)
+        if name.upper() == "DICOMDIR" and os.path.isfile(path):
+            return path
+    return None
+
+
+def _GetValue(dataset, tag):
+    tag = gdcm.Tag(*tag)
+    if not dataset.FindDataElement(tag):
+        return ""
+    value = dataset.GetDataElement(tag).GetByteValue()
+    if value is None:
+        return ""
+    return str(value.GetBuffer())[:value.GetLength()].strip("\x00 ")
+
+
+def _GetFilePath(directory, file_id):
+    """
+    Return the full path of a Referenced File ID (path components
+    separated by backslash) relative to the DICOMDIR directory, or None
+    if the file doesn't exist. Some systems show CD file names in lower
+    case, so this is tried too.
+    """
+    components = [c.strip() for c in file_id.split("\\") if c.strip()]
+    if not components:
+        return None
+    path = os.path.join(directory, *components)
+    if os.path.isfile(path):
+        return path
+    path = os.path.join(directory, *[c.lower() for c in components])
+    if os.path.isfile(path):
+        return path
+    return None
+
+
+def ReadDicomDir(filepath):
+    """
+    Return the series listed in given DICOMDIR as a list of lists of
+    file paths, or None if it couldn't be read.
+
+    Records are read in the order they are stored, where each IMAGE
+    record is after the SERIES record it belongs to.
+    """
+    reader = gdcm.Reader()
+    reader.SetFileName(filepath)
+    if not reader.Read():
+        return None
+
+    dataset = reader.GetFile().GetDataSet()
+    tag = gdcm.Tag(*DIRECTORY_RECORD_SEQUENCE)
+    if not dataset.FindDataElement(tag):
+        return None
+    sequence = dataset.GetDataElement(tag).GetValueAsSQ()
+    if sequence is None:
+        return None
+
+    directory = os.path.dirname(os.path.abspath(filepath))
+    series_list = []
+    series = None
+    for i in xrange(1, sequence.GetNumberOfItems() + 1):
+        record = sequence.GetItem(i).GetNestedDataSet()
+        record_type = _GetValue(record, DIRECTORY_RECORD_TYPE).upper()
+        if record_type in ("PATIENT", "STUDY"):
+            series = None
+        elif record_type == "SERIES":
+            series = []
+            series_list.append(series)
+        elif record_type in IMAGE_RECORDS and series is not None:
+            path = _GetFilePath(directory,
+                                _GetValue(record, REFERENCED_FILE_ID))
+            if path:
+                series.append(path)
+
+    return [filepaths for filepaths in series_list if filepaths]
+
+
+class DicomDirGroup(dicom_grouper.DicomGroup):
+    """
+    Series listed in a DICOMDIR. Only its sample is parsed until its
+    slices are needed, when Load parses all its files. Until then its
+    number of slices (and its patient's, see patient) is the number of
+    files listed.
+    """
+
+    def __init__(self, filepaths, sample):
+        dicom_grouper.DicomGroup.__init__(self)
+        self.filepaths = filepaths
+        self.loaded = False
+        # PatientGroup this series belongs to
+        self.patient = None
+        self.dicom = sample
+        self.nslices = len(filepaths)
+        self.key = dicom_grouper.GetSeriesKey(sample) + (0,)
+        self.title = sample.acquisition.series_description
+
+    def Load(self, update_progress=None):
+        """
+        Parse the files of the series, as a directory scan does (see
+        dicom_reader.yParseFiles). update_progress, if given, is called
+        with the fraction of files parsed.
+        """
+        if self.loaded:
+            return
+        self.loaded = True
+
+        # dicom_reader imports this module
+        import dicom_reader
+
+        t0 = time.time()
+        directory = os.path.commonprefix(self.filepaths)
+        if not os.path.isdir(directory):
+            directory = os.path.dirname(directory)
+        index = dicom_index.OpenIndex()
+        if index:
+            cached = index.Lookup(directory)
+        else:
+            cached = {}
+
+        try:
+            for value in dicom_reader.yParseFiles(self.filepaths, index,
+                                    cached, update_progress is not None):
+                if isinstance(value, tuple):
+                    counter, nfiles, nskipped = value
+                    update_progress(counter / float(nfiles))
+                else:
+                    grouper = value
+        finally:
+            if index:
+                index.Close()
+
+        groups = [group for patient in grouper.GetPatientsGroups()
+                  for group in patient.GetGroups()]
+        utils.debug("DICOMDIR: loaded %d files of series %s in %.2f s" %
+                    (len(self.filepaths), self.title, time.time() - t0))
+        if not groups:
+            return
+
+        # As in a directory scan, slices in the same position or with
+        # distinct orientations are split into more groups; the larger
+        # one is the series.
+        group = max(groups, key=lambda group: group.nslices)
+        if self.patient:
+            self.patient.nslices += group.nslices - self.nslices
+        self.slices_dict = group.slices_dict
+        self.nslices = group.nslices
+        self.zspacing = group.zspacing
+        self._sorted_list = None
+
+    def GetList(self):
+        self.Load()
+        return dicom_grouper.DicomGroup.GetList(self)
+
+    def GetFilenameList(self):
+        self.Load()
+        return dicom_grouper.DicomGroup.GetFilenameList(self)
+
+    def GetHandSortedList(self):
+        self.Load()
+        return dicom_grouper.DicomGroup.GetHandSortedList(self)
+
+    def UpdateZSpacing(self):
+        if self.loaded:
+            dicom_grouper.DicomGroup.UpdateZSpacing(self)
+
+    def GetDicomSample(self):
+        if self.loaded and self.slices_dict:
+            return dicom_grouper.DicomGroup.GetDicomSample(self)
+        return self.dicom
+
+
+def yGetDicomDirGroups(filepath):
+    """
+    Group the series listed in given DICOMDIR, parsing only the sample
+    file of each series. Yield progress (counter, nfiles), as the files
+    listed by the series read, after each series and then the list of
+    PatientGroup, which is empty if the DICOMDIR couldn't be used.
+    """
+    t0 = time.time()
+    series_list = ReadDicomDir(filepath)
+    if not series_list:
+        utils.debug("DICOMDIR: no series in %s" % filepath)
+        yield []
+        return
+
+    nfiles = sum(len(filepaths) for filepaths in series_list)
+    counter = 0
+    grouper = dicom_grouper.DicomPatientGrouper()
+    for filepaths in series_list:
+        # The middle file of the series, as DicomGroup.GetDicomSample
+        parser = dicom.Parser()
+        if parser.SetFileName(filepaths[len(filepaths) / 2]):
+            sample = dicom.Dicom()
+            sample.SetParser(parser)
+            sample.parser = None
+            grouper.AddGroup(DicomDirGroup(filepaths, sample))
+        counter += len(filepaths)
+        yield (counter, nfiles)
+
+    utils.debug("DICOMDIR: %d series read in %.2f s" % (len(series_list),
+                                                       time.time() - t0))
+    patients = grouper.GetPatientsGroups()
+    for patient in patients:
+        for group in patient.GetGroups():
+            group.patient = patient
+    yield patients
@@ -16,7 +16,6 @@
 #    PARTICULAR. Consulte a Licenca Publica Geral GNU para obter mais
 #    detalhes.
 #--------------------------------------------------------------------------
-import platform
 import sigar
 import sys
 
@@ -145,77 +144,6 @@ def frange(start, end=None, inc=None):
     return L
 
 
-def predict_memory(nfiles, x, y, p):
-    """
-    Predict how much memory will be used, giving the following
-    information:
-        nfiles: number of dicom files
-        x, y: dicom image size
-        p: bits allocated for each pixel sample
-    """
-    m = nfiles * (x * y * p)
-    #physical_memory in Byte
-    physical_memory = get_physical_memory()
-
-    if (sys.platform == 'win32'):
-
-        if (platform.architecture()[0] == '32bit'):
-            #(314859200 = 300 MB)
-            #(26999999 = 25 MB)
-
-            #case occupy more than 300 MB image is reduced to 1.5,
-            #and 25 MB each image is resized 0.04.
-            if (m >= 314859200):
-                porcent = 1.5 + (m - 314859200) / 26999999 * 0.04
-            else:
-                return (x, y)
-        else: #64 bits architecture
-
-            #2147483648 byte = 2.0 GB
-            #4294967296 byte = 4.0 GB
-
-            if (physical_memory <= 2147483648) and (nfiles <= 1200):
-                porcent = 1.5 + (m - 314859200) / 26999999 * 0.04
-
-            elif(physical_memory <= 2147483648) and (nfiles > 1200):
-                 porcent = 1.5 + (m - 314859200) / 26999999 * 0.05
-
-            elif(physical_memory > 2147483648) and \
-                    (physical_memory <= 4294967296) and (nfiles <= 1200):
-                porcent = 1.5 + (m - 314859200) / 26999999 * 0.02
-
-            else:
-                return (x,y)
-
-        return (x/porcent, y/porcent)
-
-    elif(sys.platform == 'linux2'):
-
-        if (platform.architecture()[0] == '32bit'):
-            # 839000000 = 800 MB
-            if (m <= 839000000) and (physical_memory <= 2147483648):
-                return (x,y)
-            elif (m > 839000000) and (physical_memory <= 2147483648) and (nfiles <= 1200):
-                porcent = 1.5 + (m - 314859200) / 26999999 * 0.02
-            else:
-                return (x,y)
-
-        else:
-
-            if (m <= 839000000) and (physical_memory <= 2147483648):
-                return (x, y)
-            elif (m > 839000000) and (physical_memory <= 2147483648) and (nfiles <= 1200):
-                porcent = 1.5 + (m - 314859200) / 26999999 * 0.02
-            else:
-                return (x,y)
-
-        return (x/porcent, y/porcent)
-
-    elif(sys.platform == 'darwin'):
-        return (x/2,y/2)
-
-
-
 #def convert_bytes(bytes):
 #    if bytes >= 1073741824:
 #        return str(bytes / 1024 / 1024 / 1024) + ' GB'
@@ -237,5 +165,12 @@ def get_physical_memory():
     return int(mem.total())
 
 
-
-
+def get_available_memory():
+    """
+    Return memory in bytes not used by any process (buffers and caches
+    included, since the system frees them when needed)
+    """
+    sg = sigar.open()
+    mem = sg.mem()
+    sg.close()
+    return int(mem.actual_free())
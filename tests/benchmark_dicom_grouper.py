@@ -0,0 +1,89 @@
+"""
+Benchmark of the grouping of DICOM files (reader/dicom_grouper.py): the
+time to group n synthetic slices (2 series of one patient, 10% of the
+slices in an already used position). The time per file should be about
+constant, the grouping scaling linearly with the number of files.
+
+Run from the repository root:
+    python tests/benchmark_dicom_grouper.py [nfiles ...]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'invesalius'))
+
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+# constants uses gettext at import time
+builtins.__dict__.setdefault('_', lambda message: message)
+from reader import dicom_grouper
+
+SIZES = (1000, 10000, 20000)
+
+
+class Record(object):
+    pass
+
+
+def CreateDicoms(nfiles, seed=0):
+    """
+    Return nfiles synthetic dicoms, with the attributes used by the
+    grouper (see dicom.Dicom).
+    """
+    rand = random.Random(seed)
+    dicoms = []
+    for i in xrange(nfiles):
+        dicom = Record()
+        dicom.patient = Record()
+        dicom.patient.name = "Patient"
+        dicom.patient.id = "1"
+        dicom.acquisition = Record()
+        dicom.acquisition.id_study = "1"
+        dicom.acquisition.serie_number = i % 2
+        dicom.acquisition.series_number = i % 2
+        dicom.acquisition.series_description = "Series %d" % (i % 2)
+        dicom.image = Record()
+        dicom.image.file = "/benchmark/%06d.dcm" % i
+        dicom.image.orientation_label = "AXIAL"
+        dicom.image.orientation = [1.0, 0.0, 0.0, 0.0, 1.0, 0.0]
+        dicom.image.type = ["ORIGINAL", "PRIMARY", "AXIAL"]
+        dicom.image.number = i / 2
+        # 10% of the slices are in an already used position
+        if rand.random() > 0.1:
+            z = i / 2
+        else:
+            z = rand.randint(0, i / 2)
+        dicom.image.position = [0.0, 0.0, z * 0.5]
+        dicoms.append(dicom)
+    return dicoms
+
+
+def Benchmark(nfiles):
+    """
+    Return the time (s) to group nfiles synthetic dicoms.
+    """
+    dicoms = CreateDicoms(nfiles)
+    t0 = time.time()
+    grouper = dicom_grouper.DicomPatientGrouper()
+    for dicom in dicoms:
+        grouper.AddFile(dicom)
+    grouper.GetPatientsGroups()
+    return time.time() - t0
+
+
+def main(sizes):
+    for nfiles in sizes:
+        elapsed = Benchmark(nfiles)
+        print "%6d files: %.3f s (%.1f us/file)" % (nfiles, elapsed,
+                                                     elapsed / nfiles * 1e6)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or SIZES)
@@ -0,0 +1,91 @@
+"""
+Tests of the reorientation of volumes to the canonical layout
+(data/reorientation.py).
+
+Run from the repository root:
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'invesalius'))
+
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+try:
+    import numpy
+    # constants uses gettext at import time
+    builtins.__dict__.setdefault('_', lambda message: message)
+    import constants as const
+    from data import reorientation
+except ImportError:
+    reorientation = None
+
+
+@unittest.skipIf(reorientation is None, "InVesalius dependencies missing")
+class ReorientationTest(unittest.TestCase):
+
+    def Reorient(self, directions, volume):
+        "Copy volume (z, y, x) into the canonical layout."
+        nz, ny, nx = volume.shape
+        reorient = reorientation.Reorientation(directions, (nx, ny, nz))
+        canonical = numpy.zeros(reorient.GetShape(volume.shape), volume.dtype)
+        reorient.GetAcquisitionView(canonical)[:] = volume
+        return reorient, canonical
+
+    def testAxial(self):
+        volume = numpy.arange(24).reshape(2, 3, 4)
+        directions = reorientation.GetDicomDirections([1, 0, 0, 0, 1, 0],
+                                                      [0, 0, 0], [0, 0, 5])
+        reorient, canonical = self.Reorient(directions, volume)
+        self.assertTrue(reorient.IsIdentity())
+        self.assertTrue((canonical == volume).all())
+
+    def testReversedSlices(self):
+        volume = numpy.arange(24).reshape(2, 3, 4)
+        directions = reorientation.GetDicomDirections([1, 0, 0, 0, 1, 0],
+                                                      [0, 0, 5], [0, 0, 0])
+        reorient, canonical = self.Reorient(directions, volume)
+        self.assertTrue((canonical == volume[::-1]).all())
+        self.assertEqual(reorient.GetOrigin((0, 0, 5), (1, 1, 5)),
+                         (0.0, 0.0, -10.0))
+
+    def testSagittal(self):
+        # Rows to posterior, columns to inferior, slices to the left
+        volume = numpy.arange(60).reshape(3, 4, 5)
+        directions = reorientation.GetDicomDirections([0, 1, 0, 0, 0, -1],
+                                                      [0, 0, 0], [2, 0, 0])
+        reorient, canonical = self.Reorient(directions, volume)
+        self.assertEqual(canonical.shape, (4, 5, 3))
+        self.assertEqual(reorient.GetSpacing((0.5, 0.7, 2.0)),
+                         (2.0, 0.5, 0.7))
+        for z, y, x in ((0, 0, 0), (2, 3, 4), (1, 2, 3)):
+            cx, cy, cz = reorient.ReorientIndex((x, y, z))
+            self.assertEqual(canonical[cz, cy, cx], volume[z, y, x])
+        self.assertEqual(reorient.direction,
+                         [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+
+    def testPointsFollowVoxels(self):
+        directions = reorientation.LEGACY_DIRECTIONS[const.SAGITAL]
+        reorient = reorientation.Reorientation(directions, (5, 4, 3))
+        spacing = (0.5, 0.7, 2.0)
+        origin = (1.0, 2.0, 3.0)
+        canonical_spacing = reorient.GetSpacing(spacing)
+        canonical_origin = reorient.GetOrigin(origin, spacing)
+        index = (4, 1, 2)
+        point = [o + i * s for o, i, s in zip(origin, index, spacing)]
+        expected = [o + i * s for o, i, s in zip(canonical_origin,
+                                                 reorient.ReorientIndex(index),
+                                                 canonical_spacing)]
+        self.assertTrue(numpy.allclose(reorient.ReorientPoint(point),
+                                       expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+Tests of the assembly of DICOM volumes (data/imagedata_utils.py).
+
+Run from the repository root:
+    python -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'invesalius'))
+
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+try:
+    import numpy
+    import vtk
+    import vtkgdcm
+    # constants uses gettext at import time
+    builtins.__dict__.setdefault('_', lambda message: message)
+    from data import imagedata_utils as iu
+except ImportError:
+    iu = None
+
+
+def WriteDicom(filename, nframes, value):
+    """
+    Write a DICOM file with nframes frames of 8x6 unsigned short pixels,
+    frame z of them filled with value + z.
+    """
+    array = numpy.empty((nframes, 6, 8), numpy.uint16)
+    for z in xrange(nframes):
+        array[z] = value + z
+    image = iu.ArrayToImageData(array)
+
+    writer = vtkgdcm.vtkGDCMImageWriter()
+    writer.SetInput(image)
+    # One file with all the frames (multi-frame)
+    writer.SetFileDimensionality(3)
+    writer.SetFileName(filename)
+    writer.Write()
+
+
+@unittest.skipIf(iu is None, "InVesalius dependencies missing")
+class VolumeAssemblerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, True)
+
+    def Expected(self, filelist):
+        arrays = [iu.ImageDataToArray(iu.ReadSlice(filename))
+                  for filename in filelist]
+        return numpy.concatenate(arrays)
+
+    def testMultiFrame(self):
+        filename = os.path.join(self.folder, 'multiframe.dcm')
+        WriteDicom(filename, 4, 100)
+
+        imagedata = iu.AssembleVolume([filename])
+        self.assertEqual(imagedata.GetDimensions(), (8, 6, 4))
+        self.assertTrue((iu.ImageDataToArray(imagedata) ==
+                         self.Expected([filename])).all())
+
+    def testMultiFrameFiles(self):
+        filelist = []
+        for n, nframes in enumerate((3, 1, 2)):
+            filename = os.path.join(self.folder, '%d.dcm' % n)
+            WriteDicom(filename, nframes, 100 * n)
+            filelist.append(filename)
+
+        imagedata = iu.AssembleVolume(filelist)
+        self.assertEqual(imagedata.GetDimensions(), (8, 6, 6))
+        self.assertTrue((iu.ImageDataToArray(imagedata) ==
+                         self.Expected(filelist)).all())
+
+    def testMultiFramePreview(self):
+        filelist = []
+        for n in xrange(4):
+            filename = os.path.join(self.folder, '%d.dcm' % n)
+            WriteDicom(filename, 2, 100 * n)
+            filelist.append(filename)
+
+        assembler = iu.VolumeAssembler(filelist)
+        try:
+            list(assembler.Decode([2]))
+            assembler.FillMissing()
+        finally:
+            assembler.Close()
+        volume = iu.ImageDataToArray(assembler.imagedata)
+        expected = self.Expected(filelist)
+        # Files 0 and 2 are decoded, the others copy their nearest plane
+        self.assertTrue((volume[:2] == expected[:2]).all())
+        self.assertTrue((volume[2] == expected[1]).all())
+        self.assertTrue((volume[4:6] == expected[4:6]).all())
+        self.assertTrue((volume[6] == expected[5]).all())
+
+    def testReorientation(self):
+        filelist = []
+        for n in xrange(3):
+            filename = os.path.join(self.folder, '%d.dcm' % n)
+            WriteDicom(filename, 1, 100 * n)
+            filelist.append(filename)
+
+        # Rows and slices reversed in the canonical layout
+        directions = ((1, 0, 0), (0, -1, 0), (0, 0, -1))
+        imagedata = iu.AssembleVolume(filelist, zspacing=2.0,
+                                      directions=directions)
+        self.assertEqual(imagedata.GetDimensions(), (8, 6, 3))
+        self.assertEqual(imagedata.GetSpacing()[2], 2.0)
+        self.assertTrue((iu.ImageDataToArray(imagedata) ==
+                         self.Expected(filelist)[::-1, ::-1]).all())
+
+
+if __name__ == '__main__':
+    unittest.main()